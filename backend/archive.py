@@ -0,0 +1,109 @@
+"""
+诊断历史与已完成提醒的归档任务
+
+diagnosis_histories 随每次 /predict 增长，water_plant 每次浇水都会完成旧提醒并插入新提醒，
+两张表都会无限增长。归档任务定期把超过保留期的行按批（INSERT ... SELECT + DELETE，
+每批一个事务）迁移到 *_archive 表，使热表只保留近期数据。
+
+  - 诊断历史：创建时间早于 HISTORY_ARCHIVE_DAYS 天（my_plants.last_diagnosis_id 为软引用，
+    归档后详情接口仍可从归档表读取）
+  - 提醒：已完成且计划时间早于 REMINDER_ARCHIVE_DAYS 天
+
+选择待归档行时使用 FOR UPDATE SKIP LOCKED，多个 worker 同时运行也不会重复迁移。
+归档严格按时间截断，归档表中的记录总是早于热表，/diagnosis-history 因此可以先读热表、
+再接着读归档表完成分页。没有使用 MySQL 分区表，因为 InnoDB 分区表不支持外键。
+
+除应用启动时的后台任务外，也可以单独运行（例如由 cron 调度）：
+    python archive.py
+"""
+import asyncio
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, insert, delete, update
+
+from database import AsyncSessionLocal
+from models import User, DiagnosisHistory, DiagnosisHistoryArchive, Reminder, ReminderArchive
+
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() == "true"
+HISTORY_ARCHIVE_DAYS = int(os.getenv("HISTORY_ARCHIVE_DAYS", "180"))  # 诊断历史热表保留天数
+REMINDER_ARCHIVE_DAYS = int(os.getenv("REMINDER_ARCHIVE_DAYS", "30"))  # 已完成提醒热表保留天数
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))  # 每个事务迁移的行数
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))  # 归档任务运行间隔
+
+
+async def archive_batch(model, archive_model, conditions, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """迁移一批满足条件的行到归档表，返回迁移的行数"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(
+            select(model.id).where(*conditions).order_by(model.id).limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        ids = result.scalars().all()
+        if not ids:
+            return 0
+        
+        columns = [column.key for column in model.__table__.columns]
+        await db.execute(
+            insert(archive_model).from_select(
+                columns,
+                select(*[getattr(model, column) for column in columns]).where(model.id.in_(ids))
+            )
+        )
+        if model is DiagnosisHistory:
+            # 标记有归档历史的用户，列表接口据此决定是否需要查询归档表
+            await db.execute(
+                update(User).where(
+                    User.id.in_(select(model.user_id).where(model.id.in_(ids))),
+                    User.has_archived_histories == False
+                ).values(has_archived_histories=True, updated_at=User.updated_at)
+            )
+        await db.execute(delete(model).where(model.id.in_(ids)))
+        await db.commit()
+        return len(ids)
+
+
+async def archive_all(model, archive_model, conditions, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """分批迁移直到没有满足条件的行，批次之间让出事件循环"""
+    total = 0
+    while True:
+        moved = await archive_batch(model, archive_model, conditions, batch_size)
+        total += moved
+        if moved < batch_size:
+            return total
+        await asyncio.sleep(0)
+
+
+async def run_archive_once() -> dict:
+    """执行一轮归档"""
+    now = datetime.now()
+    histories = await archive_all(
+        DiagnosisHistory,
+        DiagnosisHistoryArchive,
+        [DiagnosisHistory.created_at < now - timedelta(days=HISTORY_ARCHIVE_DAYS)],
+    )
+    reminders = await archive_all(
+        Reminder,
+        ReminderArchive,
+        [
+            Reminder.is_completed == True,
+            Reminder.scheduled_date < now - timedelta(days=REMINDER_ARCHIVE_DAYS),
+        ],
+    )
+    return {"diagnosis_histories": histories, "reminders": reminders}
+
+
+async def archive_loop():
+    """后台定期归档"""
+    while True:
+        try:
+            moved = await run_archive_once()
+            if any(moved.values()):
+                print(f"归档完成: {moved}")
+        except Exception as e:
+            print(f"归档任务失败，稍后重试: {e}")
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+
+
+if __name__ == "__main__":
+    print(asyncio.run(run_archive_once()))
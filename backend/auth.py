@@ -4,11 +4,13 @@ from jose import JWTError, jwt
 import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 import os
 from dotenv import load_dotenv
 
-from database import get_db
+from database import get_async_db, AsyncReadSessionLocal, recently_wrote
 from models import User
 from schemas import TokenData
 
@@ -58,7 +60,7 @@ def authenticate_user(db: Session, username: str, password: str):
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     """获取当前用户（从 token 中解析）"""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -74,7 +76,21 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(User).filter(User.username == token_data.username).first()
+    result = await db.execute(select(User).where(User.username == token_data.username))
+    user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    # 记录会话所属用户，提交写入后据此开启读己之写窗口
+    db.info["user_id"] = user.id
     return user
+
+async def get_read_db(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取当前用户的读会话：配置了只读副本且用户不在读己之写窗口内时使用副本，否则使用主库"""
+    if AsyncReadSessionLocal is None or recently_wrote(current_user.id):
+        yield db
+        return
+    async with AsyncReadSessionLocal() as read_db:
+        yield read_db
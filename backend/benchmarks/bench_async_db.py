@@ -0,0 +1,88 @@
+"""
+异步数据库访问基准测试
+
+对比两种写法在单个事件循环（即单个 uvicorn worker）内的并发吞吐量：
+  - sync:  在 async 路由中直接使用同步 SessionLocal（改造前的写法，会阻塞事件循环）
+  - async: 使用 AsyncSessionLocal（aiomysql 驱动）
+
+用法（在 backend 目录下运行，数据库配置读取 .env）：
+    python -m benchmarks.bench_async_db --requests 2000 --concurrency 50
+
+MySQL 下默认每次查询执行 SELECT SLEEP(0.005) 以模拟 5ms 的数据库往返延迟；
+SQLite 没有网络往返，结果不能反映异步驱动的收益。
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text
+
+from database import DATABASE_URL, SessionLocal, AsyncSessionLocal, async_engine, engine
+
+
+def default_query() -> str:
+    if DATABASE_URL.startswith("sqlite"):
+        return "SELECT 1"
+    return "SELECT SLEEP(0.005)"
+
+
+async def sync_handler(query: str):
+    """模拟改造前的路由：async def 中调用同步会话"""
+    db = SessionLocal()
+    try:
+        db.execute(text(query)).all()
+    finally:
+        db.close()
+
+
+async def async_handler(query: str):
+    """模拟改造后的路由：使用异步会话"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(text(query))
+        result.all()
+
+
+async def run(handler, query: str, total: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one():
+        async with semaphore:
+            await handler(query)
+
+    # 预热连接池
+    await asyncio.gather(*(one() for _ in range(concurrency)))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="同步/异步数据库会话并发吞吐量对比")
+    parser.add_argument("--requests", type=int, default=2000, help="总请求数")
+    parser.add_argument("--concurrency", type=int, default=50, help="并发数")
+    parser.add_argument("--query", default=default_query(), help="每个请求执行的 SQL")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    print(f"请求数: {args.requests}  并发数: {args.concurrency}  查询: {args.query}")
+    print(f"{'模式':<8}{'耗时(s)':>10}{'吞吐量(req/s)':>16}")
+
+    results = {}
+    for name, handler in (("sync", sync_handler), ("async", async_handler)):
+        elapsed = await run(handler, args.query, args.requests, args.concurrency)
+        results[name] = args.requests / elapsed
+        print(f"{name:<8}{elapsed:>10.3f}{results[name]:>16.1f}")
+
+    print(f"async / sync 吞吐量比: {results['async'] / results['sync']:.2f}x")
+
+    await async_engine.dispose()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
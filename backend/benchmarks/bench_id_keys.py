@@ -0,0 +1,87 @@
+"""
+随机键 vs 时间有序键的插入吞吐量基准测试
+
+在与 orders.order_number 相同结构的表（自增主键 + VARCHAR(50) 唯一索引）中分别插入：
+  - legacy: 原订单号写法（日期 + uuid4 前 8 位，同一天内索引位置随机）
+  - uuid4:  原图片文件名使用的完整 uuid4
+  - ulid:   ids.new_order_number() 生成的时间有序订单号
+
+用法（在 backend 目录下运行，数据库配置读取 .env）：
+    python -m benchmarks.bench_id_keys --rows 200000 --batch 1000
+
+随机键在索引变大、超出缓冲池后会造成大量页分裂与随机 IO，行数越多差距越明显。
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, insert, text
+
+from database import engine
+from ids import new_order_number
+
+KEY_STRATEGIES = {
+    "legacy": lambda: f"ORD{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}",
+    "uuid4": lambda: str(uuid.uuid4()),
+    "ulid": new_order_number,
+}
+
+
+def run(name: str, make_key, rows: int, batch: int) -> dict:
+    metadata = MetaData()
+    table = Table(
+        f"bench_keys_{name}",
+        metadata,
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("key", String(50), unique=True, nullable=False),
+    )
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+    try:
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for offset in range(0, rows, batch):
+                conn.execute(insert(table), [{"key": make_key()} for _ in range(min(batch, rows - offset))])
+        elapsed = time.perf_counter() - start
+
+        index_bytes = None
+        if engine.dialect.name == "mysql":
+            with engine.connect() as conn:
+                conn.execute(text(f"ANALYZE TABLE {table.name}"))
+                index_bytes = conn.execute(
+                    text(
+                        "SELECT index_length FROM information_schema.tables "
+                        "WHERE table_schema = DATABASE() AND table_name = :name"
+                    ),
+                    {"name": table.name},
+                ).scalar()
+        return {"elapsed": elapsed, "rows_per_sec": rows / elapsed, "index_bytes": index_bytes}
+    finally:
+        metadata.drop_all(engine)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="随机键与时间有序键的插入吞吐量对比")
+    parser.add_argument("--rows", type=int, default=200000, help="每种键插入的行数")
+    parser.add_argument("--batch", type=int, default=1000, help="每批插入的行数")
+    parser.add_argument("--keys", default=",".join(KEY_STRATEGIES), help="要测试的键类型（逗号分隔）")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    print(f"行数: {args.rows}  批大小: {args.batch}")
+    print(f"{'键类型':<10}{'耗时(s)':>10}{'吞吐量(rows/s)':>18}{'索引大小(KB)':>16}")
+    for name in args.keys.split(","):
+        result = run(name, KEY_STRATEGIES[name], args.rows, args.batch)
+        index_kb = f"{result['index_bytes'] / 1024:.0f}" if result["index_bytes"] is not None else "-"
+        print(f"{name:<10}{result['elapsed']:>10.3f}{result['rows_per_sec']:>18.1f}{index_kb:>16}")
+
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
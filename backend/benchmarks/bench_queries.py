@@ -0,0 +1,208 @@
+"""
+端点查询基准测试
+
+在 generate_dataset 生成的数据上，以进程内 ASGI 调用的方式逐个请求各个读取端点，
+分别对重度 / 中位 / 轻度用户统计延迟（p50 / p95 / 平均），结果写入 benchmarks/results/，
+便于在修改索引或查询之前和之后对比。
+
+用法（在 backend 目录下运行；DATABASE_URL 与 ASYNC_DATABASE_URL 需指向同一个库）：
+    python -m benchmarks.generate_dataset --users 1000 --histories 50000
+    python -m benchmarks.bench_queries --iterations 50
+    python -m benchmarks.bench_queries --iterations 50 --compare benchmarks/results/<上次结果>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_ECHO", "false")
+os.environ.setdefault("ARCHIVE_ENABLED", "false")
+
+from sqlalchemy import func, select
+
+from database import AsyncSessionLocal, async_engine
+from models import User, Membership, DiagnosisHistory, MyPlant, Reminder, Product, Order
+from auth import create_access_token
+from main import app
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+# (名称, 路径模板)；{history_id} / {plant_id} 替换为该用户最新的一条记录
+ENDPOINTS = [
+    ("users_me", "/users/me"),
+    ("membership_status", "/membership/status"),
+    ("history_list", "/diagnosis-history?limit=20"),
+    ("history_list_summary", "/diagnosis-history?limit=20&fields=plant_name,scientific_name,status,problem_judgment,created_at"),
+    ("history_list_deep_page", "/diagnosis-history?skip=1000&limit=20"),
+    ("history_detail", "/diagnosis-history/{history_id}"),
+    ("my_plants", "/my-plants"),
+    ("my_plant_detail", "/my-plants/{plant_id}"),
+    ("reminders", "/reminders"),
+    ("reminders_pending", "/reminders?is_completed=false"),
+    ("reminders_unread_count", "/reminders/unread-count"),
+    ("products", "/products"),
+    ("orders", "/orders"),
+]
+
+
+async def asgi_get(path: str, token: str) -> tuple:
+    """直接调用 ASGI 应用（不经过网络栈），返回 (状态码, 响应体)"""
+    raw_path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": raw_path, "raw_path": raw_path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": [(b"authorization", f"Bearer {token}".encode()), (b"host", b"bench")],
+        "client": ("127.0.0.1", 0), "server": ("bench", 80),
+    }
+    response = {"status": None, "body": bytearray()}
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            response["body"] += message.get("body", b"")
+
+    await app(scope, receive, send)
+    return response["status"], bytes(response["body"])
+
+
+async def pick_users() -> dict:
+    """按诊断历史数量挑选 VIP 重度 / 中位 / 轻度用户"""
+    async with AsyncSessionLocal() as db:
+        rows = (await db.execute(
+            select(User.id, User.username, func.count(DiagnosisHistory.id).label("histories"))
+            .join(Membership, Membership.user_id == User.id)
+            .join(DiagnosisHistory, DiagnosisHistory.user_id == User.id)
+            .where(Membership.is_vip == True)
+            .group_by(User.id, User.username)
+            .order_by(func.count(DiagnosisHistory.id).desc())
+        )).all()
+        if not rows:
+            raise SystemExit("没有找到带诊断历史的 VIP 用户，请先运行 benchmarks.generate_dataset")
+
+        tiers = {"heavy": rows[0], "median": rows[len(rows) // 2], "light": rows[-1]}
+        users = {}
+        for tier, row in tiers.items():
+            latest_history = (await db.execute(
+                select(DiagnosisHistory.id).where(DiagnosisHistory.user_id == row.id)
+                .order_by(DiagnosisHistory.created_at.desc()).limit(1)
+            )).scalar()
+            latest_plant = (await db.execute(
+                select(MyPlant.id).where(MyPlant.user_id == row.id).order_by(MyPlant.id.desc()).limit(1)
+            )).scalar()
+            reminders = (await db.execute(select(func.count(Reminder.id)).where(Reminder.user_id == row.id))).scalar()
+            orders = (await db.execute(select(func.count(Order.id)).where(Order.user_id == row.id))).scalar()
+            users[tier] = {
+                "user_id": row.id, "username": row.username, "histories": row.histories,
+                "reminders": reminders, "orders": orders,
+                "history_id": latest_history, "plant_id": latest_plant,
+            }
+        return users
+
+
+async def dataset_summary() -> dict:
+    async with AsyncSessionLocal() as db:
+        summary = {}
+        for model in (User, DiagnosisHistory, MyPlant, Reminder, Product, Order):
+            summary[model.__tablename__] = (await db.execute(select(func.count(model.id)))).scalar()
+        return summary
+
+
+async def bench_endpoint(path: str, token: str, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await asgi_get(path, token)
+    timings = []
+    status, body = None, b""
+    for _ in range(iterations):
+        start = time.perf_counter()
+        status, body = await asgi_get(path, token)
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        "status": status,
+        "bytes": len(body),
+        "p50_ms": round(statistics.median(timings), 3),
+        "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+        "mean_ms": round(statistics.fmean(timings), 3),
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_comparison(results: dict, baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n与 {baseline_path}（{baseline.get('git_revision')}）对比 p50：")
+    for tier, endpoints in results["results"].items():
+        for name, current in endpoints.items():
+            previous = baseline.get("results", {}).get(tier, {}).get(name)
+            if not previous:
+                continue
+            change = (current["p50_ms"] - previous["p50_ms"]) / previous["p50_ms"] * 100 if previous["p50_ms"] else 0
+            print(f"{tier:<7} {name:<24} {previous['p50_ms']:>9.2f}ms -> {current['p50_ms']:>9.2f}ms  ({change:+.1f}%)")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="按用户分层统计各读取端点的延迟")
+    parser.add_argument("--iterations", type=int, default=30, help="每个端点每个用户的请求次数")
+    parser.add_argument("--warmup", type=int, default=3, help="预热请求次数")
+    parser.add_argument("--output", help="结果文件路径（默认写入 benchmarks/results/）")
+    parser.add_argument("--compare", help="与之前的结果文件对比")
+    args = parser.parse_args()
+
+    users = await pick_users()
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "database": async_engine.url.render_as_string(hide_password=True),
+        "dataset": await dataset_summary(),
+        "users": users,
+        "iterations": args.iterations,
+        "results": {},
+    }
+    print(f"数据库: {results['database']}  数据量: {results['dataset']}")
+
+    for tier, user in users.items():
+        token = create_access_token({"sub": user["username"]})
+        print(f"\n[{tier}] user_id={user['user_id']} histories={user['histories']} "
+              f"reminders={user['reminders']} orders={user['orders']}")
+        tier_results = {}
+        for name, template in ENDPOINTS:
+            if ("{history_id}" in template and user["history_id"] is None) or ("{plant_id}" in template and user["plant_id"] is None):
+                continue
+            path = template.format(history_id=user["history_id"], plant_id=user["plant_id"])
+            tier_results[name] = await bench_endpoint(path, token, args.iterations, args.warmup)
+            r = tier_results[name]
+            print(f"  {name:<24} {r['status']}  p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  {r['bytes']:>9} bytes")
+        results["results"][tier] = tier_results
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_queries_{datetime.now():%Y%m%d_%H%M%S}_{results['git_revision']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+    await async_engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
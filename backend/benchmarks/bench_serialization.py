@@ -0,0 +1,190 @@
+"""
+响应序列化基准测试
+
+不访问数据库，在内存中为每个响应模型构造 --rows 行数据，比较序列化耗时（每 1000 行的毫秒数）：
+  - fastapi_stock:  原路径，ORM 对象经 from_attributes 校验为模型列表，再转换为 JSON 兼容对象，
+                    用标准库 json 编码（与 FastAPI 对 response_model 的处理相同）
+  - fastapi_orjson: 同上，最后一步改用 orjson 编码（ORJSONResponse，未改写的接口）
+  - typeadapter:    预先构建的 TypeAdapter 校验后直接 dump_json（在 pydantic-core 中编码）
+  - projection:     行字典直接用 orjson 编码（列表接口的新路径，见 fastjson.py）
+
+用法（在 backend 目录下运行）：
+    python -m benchmarks.bench_serialization --rows 1000 --repeat 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from models import DiagnosisHistory, MyPlant, Reminder, Product, Order, OrderItem
+from schemas import (
+    DiagnosisHistoryResponse, DiagnosisHistorySummary, MyPlantSummary, ReminderResponse,
+    ProductResponse, OrderResponse
+)
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+NOW = datetime(2026, 1, 1, 8, 30, 15, 123456)
+LONG_TEXT = "叶片边缘发黄、出现褐色斑点，可能与浇水过多和通风不良有关。" * 4
+
+
+def product_row(i: int) -> dict:
+    return {
+        "id": i, "name": f"植物营养液 {i}", "description": LONG_TEXT, "price": "¥29.9", "category": "肥料",
+        "tag": "适用: 缺肥", "icon_class": "fa-flask", "bg_gradient": "from-green-400 to-green-600", "created_at": NOW,
+    }
+
+
+def history_row(i: int) -> dict:
+    return {
+        "id": i, "user_id": 1, "plant_name": "绿萝", "scientific_name": "Epipremnum aureum", "status": "缺水",
+        "problem_judgment": LONG_TEXT, "severity": "中度", "severity_value": 45,
+        "handling_suggestions": json.dumps([LONG_TEXT, LONG_TEXT], ensure_ascii=False), "need_product": True,
+        "plant_introduction": LONG_TEXT, "image_url": f"/images/{i:026d}.jpg", "created_at": NOW - timedelta(minutes=i),
+    }
+
+
+def plant_row(i: int) -> dict:
+    return {
+        "id": i, "user_id": 1, "plant_name": "绿萝", "scientific_name": "Epipremnum aureum", "nickname": f"小绿{i}",
+        "status": "健康", "last_diagnosis_id": i, "image_url": f"/images/{i:026d}.jpg", "notes": LONG_TEXT,
+        "watering_frequency": 3, "last_watered": date(2026, 1, 1), "next_watering_date": date(2026, 1, 4),
+        "created_at": NOW, "updated_at": NOW,
+    }
+
+
+def reminder_row(i: int) -> dict:
+    return {
+        "id": i, "user_id": 1, "plant_id": i, "reminder_type": "re_examination", "title": "复查提醒: 绿萝",
+        "message": "该复查 绿萝 的状态了", "reminder_reason": LONG_TEXT, "scheduled_date": NOW + timedelta(hours=i),
+        "is_completed": False, "is_read": False, "created_at": NOW,
+    }
+
+
+def order_row(i: int) -> dict:
+    return {
+        "id": i, "user_id": 1, "order_number": f"01J{i:023d}", "total_amount": "¥89.7", "payment_method": "eth",
+        "transaction_hash": "0x" + "a" * 64, "wallet_address": "0x" + "b" * 40, "status": "paid",
+        "created_at": NOW, "updated_at": NOW,
+    }
+
+
+def orders_with_items(rows: int) -> tuple:
+    """每个订单 3 个订单项；返回 (ORM 对象, 行字典)"""
+    products = [Product(**product_row(i)) for i in range(1, 4)]
+    objects, dicts = [], []
+    for i in range(1, rows + 1):
+        order = Order(**order_row(i))
+        items = [
+            {"id": i * 3 + j, "order_id": i, "product_id": products[j].id, "quantity": 1, "price": "¥29.9"}
+            for j in range(3)
+        ]
+        order.items = [OrderItem(**item, product=products[j]) for j, item in enumerate(items)]
+        objects.append(order)
+        dicts.append({**order_row(i), "items": [{**item, "product": product_row(item["product_id"])} for item in items]})
+    return objects, dicts
+
+
+def build_cases(rows: int) -> dict:
+    """名称 -> (响应模型, ORM 对象列表, 行字典列表)"""
+    cases = {}
+    for name, schema, model, make_row in (
+        ("DiagnosisHistoryResponse", DiagnosisHistoryResponse, DiagnosisHistory, history_row),
+        ("DiagnosisHistorySummary", DiagnosisHistorySummary, DiagnosisHistory, history_row),
+        ("MyPlantSummary", MyPlantSummary, MyPlant, plant_row),
+        ("ReminderResponse", ReminderResponse, Reminder, reminder_row),
+        ("ProductResponse", ProductResponse, Product, product_row),
+    ):
+        dicts = [make_row(i) for i in range(1, rows + 1)]
+        cases[name] = (schema, [model(**row) for row in dicts], dicts)
+    objects, dicts = orders_with_items(rows)
+    cases["OrderResponse"] = (OrderResponse, objects, dicts)
+    return cases
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def measure(func, repeat: int) -> float:
+    func()  # 预热
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def strategies(schema, objects: list, dicts: list) -> dict:
+    adapter = TypeAdapter(List[schema])
+
+    def fastapi_stock():
+        content = jsonable_encoder(adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json"))
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def fastapi_orjson():
+        content = jsonable_encoder(adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json"))
+        return orjson.dumps(content)
+
+    def typeadapter():
+        return adapter.dump_json(adapter.validate_python(objects, from_attributes=True))
+
+    def projection():
+        return orjson.dumps(dicts)
+
+    return {
+        "fastapi_stock": fastapi_stock,
+        "fastapi_orjson": fastapi_orjson,
+        "typeadapter": typeadapter,
+        "projection": projection,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较各响应模型的序列化耗时")
+    parser.add_argument("--rows", type=int, default=1000, help="每个响应的行数")
+    parser.add_argument("--repeat", type=int, default=20, help="每种方式的重复次数（取中位数）")
+    parser.add_argument("--output", help="结果文件路径（默认写入 benchmarks/results/）")
+    args = parser.parse_args()
+
+    results = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "rows": args.rows,
+        "repeat": args.repeat,
+        "results": {},
+    }
+    scale = 1000 / args.rows
+    names = list(strategies(ProductResponse, [], []))
+    print(f"{'响应模型':<26}" + "".join(f"{name:>16}" for name in names) + "   (ms / 1000 行)")
+    for case, (schema, objects, dicts) in build_cases(args.rows).items():
+        funcs = strategies(schema, objects, dicts)
+        row = {name: round(measure(func, args.repeat) * scale, 3) for name, func in funcs.items()}
+        results["results"][case] = row
+        print(f"{case:<26}" + "".join(f"{row[name]:>16.2f}" for name in names))
+
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"bench_serialization_{datetime.now():%Y%m%d_%H%M%S}_{results['git_revision']}.json")
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已写入 {output}")
+
+
+if __name__ == "__main__":
+    main()
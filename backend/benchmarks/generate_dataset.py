@@ -0,0 +1,225 @@
+"""
+合成数据集生成器
+
+按 models.py 中的表结构批量生成用户、会员、诊断历史、我的植物、提醒、产品和订单，
+每个用户的数据量服从 Zipf 分布（少数重度用户拥有大部分数据），用于评估索引与查询改动。
+
+用法（在 backend 目录下运行；可通过 DATABASE_URL 指向 SQLite 或本地 MySQL）：
+    python -m benchmarks.generate_dataset --users 10000 --histories 500000 --skew 1.1
+    DATABASE_URL=sqlite:///bench.db python -m benchmarks.generate_dataset --users 1000
+
+所有生成用户的密码均为 benchmark（bcrypt 哈希只计算一次）。
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DB_ECHO", "false")
+
+from sqlalchemy import func, select, update
+
+from database import engine, Base
+from models import User, Membership, DiagnosisHistory, DiagnosisHistoryArchive, MyPlant, Reminder, Product, Order, OrderItem, IdSequence
+from auth import get_password_hash
+from ids import new_order_number
+
+BENCHMARK_PASSWORD = "benchmark"
+INSERT_CHUNK_SIZE = 5000
+
+PLANTS = [
+    ("绿萝", "Epipremnum aureum"), ("发财树", "Pachira aquatica"), ("月季", "Rosa chinensis"),
+    ("吊兰", "Chlorophytum comosum"), ("海芋", "Alocasia amazonica"), ("龟背竹", "Monstera deliciosa"),
+    ("多肉", "Echeveria"), ("虎皮兰", "Sansevieria trifasciata"), ("君子兰", "Clivia miniata"),
+]
+STATUSES = [("健康", "轻度", 30, False), ("缺水", "中度", 50, False), ("虫害", "中度", 50, True),
+            ("缺肥", "轻度", 30, True), ("光照不当", "轻度", 30, False), ("病害", "中度", 50, True)]
+PRODUCT_CATEGORIES = [("肥料", "适用: 缺肥"), ("杀虫剂", "适用: 虫害"), ("土壤改良", "土壤改良"), ("病害治疗", "病害治疗")]
+LONG_TEXT = "叶片出现不同程度的发黄与卷曲，伴随少量斑点，需要结合光照、浇水与通风情况综合判断。" * 4
+
+
+def zipf_counts(total: int, buckets: int, skew: float) -> list:
+    """把 total 按 Zipf 分布分配到 buckets 个名次上（第 1 名最多）"""
+    weights = [1.0 / (rank ** skew) for rank in range(1, buckets + 1)]
+    weight_sum = sum(weights)
+    counts = [int(total * weight / weight_sum) for weight in weights]
+    for i in range(total - sum(counts)):
+        counts[i % buckets] += 1
+    return counts
+
+
+def next_id(conn, model) -> int:
+    return (conn.execute(select(func.max(model.id))).scalar() or 0) + 1
+
+
+def bulk_insert(conn, model, rows: list):
+    for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+        conn.execute(model.__table__.insert(), rows[i:i + INSERT_CHUNK_SIZE])
+
+
+def generate(args) -> dict:
+    rng = random.Random(args.seed)
+    now = datetime.now()
+    hashed_password = get_password_hash(BENCHMARK_PASSWORD)
+    Base.metadata.create_all(bind=engine)
+    summary = {}
+
+    with engine.begin() as conn:
+        # 产品目录
+        product_start = next_id(conn, Product)
+        products = []
+        for i in range(args.products):
+            category, tag = PRODUCT_CATEGORIES[i % len(PRODUCT_CATEGORIES)]
+            products.append({
+                "id": product_start + i, "name": f"{category}商品{i}", "description": LONG_TEXT[:60],
+                "price": f"¥{rng.randint(99, 1999) / 10:.1f}", "category": category, "tag": tag,
+                "icon_class": "fa-leaf", "bg_gradient": "from-green-400 to-green-600", "created_at": now,
+            })
+        bulk_insert(conn, Product, products)
+        product_prices = {p["id"]: p["price"] for p in products}
+        summary["products"] = len(products)
+
+        # 用户与会员
+        user_start = next_id(conn, User)
+        users = [{
+            "id": user_start + i, "username": f"bench_{user_start + i}", "email": f"bench_{user_start + i}@example.com",
+            "hashed_password": hashed_password, "created_at": now - timedelta(days=rng.randint(0, args.days)),
+        } for i in range(args.users)]
+        bulk_insert(conn, User, users)
+        user_ids = [u["id"] for u in users]
+        # 同一个重度排名用于所有表：重度用户的历史、植物、提醒、订单都多；打乱后重度用户不集中在低ID
+        ranked_user_ids = user_ids[:]
+        rng.shuffle(ranked_user_ids)
+        membership_start = next_id(conn, Membership)
+        bulk_insert(conn, Membership, [{
+            "id": membership_start + i, "user_id": user_id, "is_vip": rng.random() < args.vip_ratio,
+            "monthly_detections": rng.randint(0, 5), "last_reset_date": date.today(),
+        } for i, user_id in enumerate(user_ids)])
+        summary["users"] = len(users)
+
+        # 诊断历史（Zipf 分布）
+        history_id = max(next_id(conn, DiagnosisHistory), next_id(conn, DiagnosisHistoryArchive))
+        histories, history_ids_by_user = [], {}
+        for user_id, count in zip(ranked_user_ids, zipf_counts(args.histories, len(user_ids), args.skew)):
+            for _ in range(count):
+                plant_name, scientific_name = rng.choice(PLANTS)
+                status, severity, severity_value, need_product = rng.choice(STATUSES)
+                histories.append({
+                    "id": history_id, "user_id": user_id, "plant_name": plant_name, "scientific_name": scientific_name,
+                    "status": status, "problem_judgment": LONG_TEXT, "severity": severity, "severity_value": severity_value,
+                    "handling_suggestions": json.dumps(["施加适量的液体肥料", "增加光照时间", "保持土壤微湿"], ensure_ascii=False),
+                    "need_product": need_product, "plant_introduction": LONG_TEXT,
+                    "image_url": f"/images/{history_id}.jpg",
+                    "created_at": now - timedelta(seconds=rng.randint(0, args.days * 86400)),
+                })
+                history_ids_by_user.setdefault(user_id, []).append(history_id)
+                history_id += 1
+        bulk_insert(conn, DiagnosisHistory, histories)
+        # 推进 write-behind 使用的ID序列，避免与生成的ID冲突
+        conn.execute(
+            update(IdSequence).where(IdSequence.name == "diagnosis_histories", IdSequence.next_value < history_id)
+            .values(next_value=history_id)
+        )
+        summary["diagnosis_histories"] = len(histories)
+
+        # 我的植物（Zipf 分布）
+        plant_id = next_id(conn, MyPlant)
+        plants, plants_by_user = [], {}
+        for user_id, count in zip(ranked_user_ids, zipf_counts(args.plants, len(user_ids), args.skew)):
+            for _ in range(count):
+                plant_name, scientific_name = rng.choice(PLANTS)
+                frequency = rng.choice([None, 2, 3, 5, 7])
+                last_watered = date.today() - timedelta(days=rng.randint(0, 10))
+                user_histories = history_ids_by_user.get(user_id)
+                plants.append({
+                    "id": plant_id, "user_id": user_id, "plant_name": plant_name, "scientific_name": scientific_name,
+                    "nickname": f"小{plant_name}", "status": rng.choice(STATUSES)[0],
+                    "last_diagnosis_id": rng.choice(user_histories) if user_histories else None,
+                    "image_url": f"/images/plant_{plant_id}.jpg", "notes": LONG_TEXT,
+                    "watering_frequency": frequency, "last_watered": last_watered,
+                    "next_watering_date": last_watered + timedelta(days=frequency) if frequency else None,
+                    "created_at": now - timedelta(days=rng.randint(0, args.days)), "updated_at": now,
+                })
+                plants_by_user.setdefault(user_id, []).append(plant_id)
+                plant_id += 1
+        bulk_insert(conn, MyPlant, plants)
+        summary["my_plants"] = len(plants)
+
+        # 提醒（Zipf 分布，多数为已完成的历史浇水提醒）
+        reminder_id = next_id(conn, Reminder)
+        reminders = []
+        for user_id, count in zip(ranked_user_ids, zipf_counts(args.reminders, len(user_ids), args.skew)):
+            user_plants = plants_by_user.get(user_id)
+            for _ in range(count):
+                scheduled = now + timedelta(hours=rng.randint(-args.days * 24, 14 * 24))
+                reminder_type = "watering" if rng.random() < 0.7 else "re_examination"
+                reminders.append({
+                    "id": reminder_id, "user_id": user_id,
+                    # 植物的浇水提醒由浇水规则展开（见 watering.py），这里只为复查提醒关联植物
+                    "plant_id": rng.choice(user_plants) if user_plants and reminder_type != "watering" else None,
+                    "reminder_type": reminder_type, "title": "浇水提醒: 绿萝" if reminder_type == "watering" else "复查提醒: 月季",
+                    "message": "该给植物浇水了！", "reminder_reason": LONG_TEXT[:80],
+                    "scheduled_date": scheduled, "is_completed": scheduled < now and rng.random() < 0.9,
+                    "is_read": rng.random() < 0.5, "created_at": scheduled - timedelta(days=3),
+                })
+                reminder_id += 1
+        bulk_insert(conn, Reminder, reminders)
+        summary["reminders"] = len(reminders)
+
+        # 订单与订单项（Zipf 分布）
+        order_id = next_id(conn, Order)
+        order_item_id = next_id(conn, OrderItem)
+        orders, order_items = [], []
+        product_ids = list(product_prices)
+        for user_id, count in zip(ranked_user_ids, zipf_counts(args.orders, len(user_ids), args.skew)):
+            for _ in range(count):
+                total = 0.0
+                for product_id in rng.sample(product_ids, k=min(len(product_ids), rng.randint(1, 3))):
+                    quantity = rng.randint(1, 3)
+                    price = product_prices[product_id]
+                    total += float(price.replace("¥", "")) * quantity
+                    order_items.append({"id": order_item_id, "order_id": order_id, "product_id": product_id,
+                                        "quantity": quantity, "price": price})
+                    order_item_id += 1
+                created_at = now - timedelta(seconds=rng.randint(0, args.days * 86400))
+                orders.append({
+                    "id": order_id, "user_id": user_id, "order_number": new_order_number(), "total_amount": f"¥{total:.1f}",
+                    "payment_method": rng.choice(["eth", "ckb"]), "transaction_hash": "0x" + "0" * 64,
+                    "wallet_address": "0x" + "0" * 40, "status": "paid", "created_at": created_at, "updated_at": created_at,
+                })
+                order_id += 1
+        bulk_insert(conn, Order, orders)
+        bulk_insert(conn, OrderItem, order_items)
+        summary["orders"] = len(orders)
+        summary["order_items"] = len(order_items)
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="生成带倾斜分布的合成数据集")
+    parser.add_argument("--users", type=int, default=1000, help="用户数")
+    parser.add_argument("--vip-ratio", type=float, default=0.3, help="VIP 用户比例")
+    parser.add_argument("--histories", type=int, default=50000, help="诊断历史总数")
+    parser.add_argument("--plants", type=int, default=5000, help="我的植物总数")
+    parser.add_argument("--reminders", type=int, default=50000, help="提醒总数")
+    parser.add_argument("--products", type=int, default=40, help="产品数")
+    parser.add_argument("--orders", type=int, default=10000, help="订单总数")
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf 分布指数，越大数据越集中在少数用户")
+    parser.add_argument("--days", type=int, default=365, help="数据时间跨度（天）")
+    parser.add_argument("--seed", type=int, default=42, help="随机种子")
+    args = parser.parse_args()
+
+    print(f"数据库: {engine.url.render_as_string(hide_password=True)}")
+    start = time.perf_counter()
+    summary = generate(args)
+    print(f"生成完成，用时 {time.perf_counter() - start:.1f}s: {summary}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+商品目录的内存缓存
+
+商品很少变化，/products 与 /products/{id} 不再每次查询 products 表：启动时整体加载到内存，
+并预先生成各分类的 JSON 响应体和 ETag；create_order 使用预解析为整数分的价格，不再逐项查询和解析价格字符串。
+加载时同时构建"诊断状态 -> 推荐商品"的排序索引，/predict 直接在结果中返回推荐商品。
+
+商品变更时 catalog_versions 表中 products 行的版本号递增：
+  - 经主库会话写入 products 表时，在同一事务内递增
+  - 直接修改数据库时由 migration_add_catalog_version.sql 创建的触发器递增（或手动执行 UPDATE）
+各 worker 每隔 CATALOG_REFRESH_SECONDS 查询一次版本号（单行主键查询），变化时重新加载。
+"""
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from typing import Optional
+
+from pydantic import TypeAdapter
+from sqlalchemy import event, select, update
+
+from database import AsyncSessionLocal, PrimarySession
+from models import Product, CatalogVersion
+from schemas import ProductResponse
+
+CATALOG_REFRESH_SECONDS = float(os.getenv("CATALOG_REFRESH_SECONDS", "30"))  # 检查版本号的间隔
+CATALOG_MAX_AGE_SECONDS = int(os.getenv("CATALOG_MAX_AGE_SECONDS", "60"))  # 客户端可直接使用缓存的时间
+
+RECOMMENDATION_LIMIT = int(os.getenv("RECOMMENDATION_LIMIT", "3"))  # 诊断结果中最多推荐的商品数
+
+CATALOG_NAME = Product.__tablename__
+ALL_CATEGORIES = "全部商品"
+
+# 诊断状态 -> 对应的商品分类（按相关程度排序），作为商品标签之外的补充匹配
+STATUS_CATEGORIES = {
+    "缺肥": ("肥料", "土壤改良"),
+    "虫害": ("杀虫剂",),
+    "病害": ("病害治疗",),
+}
+TAG_PREFIX = "适用:"
+
+_products_adapter = TypeAdapter(list[ProductResponse])
+
+
+def parse_price_cents(price: str) -> Optional[int]:
+    """把 "¥29.9" 这样的价格字符串解析为整数分，格式无效返回 None"""
+    try:
+        value = Decimal(price.replace("¥", "").strip())
+    except (InvalidOperation, AttributeError):
+        return None
+    if not value.is_finite() or value < 0:
+        return None
+    return int((value * 100).to_integral_value())
+
+
+def recommendation_score(product: ProductResponse, status: str) -> int:
+    """商品与诊断状态的匹配分：标签"适用: <状态>" > 标签包含状态 > 对应分类（按分类顺序），0 表示不匹配"""
+    tag = (product.tag or "").replace("：", ":")
+    if tag.startswith(TAG_PREFIX) and status in [t.strip() for t in tag[len(TAG_PREFIX):].split("/")]:
+        return 100
+    if status in tag:
+        return 50
+    categories = STATUS_CATEGORIES.get(status, ())
+    if product.category in categories:
+        return 10 - categories.index(product.category)
+    return 0
+
+
+def build_recommendation_index(products: list) -> dict:
+    """诊断状态 -> 按匹配分降序排列的商品ID列表（状态取自 STATUS_CATEGORIES 与商品标签）"""
+    statuses = set(STATUS_CATEGORIES)
+    for product in products:
+        tag = (product.tag or "").replace("：", ":")
+        if tag.startswith(TAG_PREFIX):
+            statuses.update(t.strip() for t in tag[len(TAG_PREFIX):].split("/") if t.strip())
+    index = {}
+    for status in statuses:
+        scored = [(recommendation_score(p, status), p.id) for p in products]
+        ranked = [product_id for score, product_id in sorted(scored, key=lambda x: (-x[0], x[1])) if score > 0]
+        if ranked:
+            index[status] = ranked
+    return index
+
+
+def format_price(cents: int) -> str:
+    """整数分格式化为价格字符串（与订单金额的既有格式一致，保留一位小数）"""
+    return f"¥{Decimal(cents) / 100:.1f}"
+
+
+class ProductCatalog:
+    """商品目录缓存：商品、分类索引、整数分价格与预序列化的响应体"""
+
+    def __init__(self, refresh_interval: float = CATALOG_REFRESH_SECONDS):
+        self.refresh_interval = refresh_interval
+        self.version: Optional[int] = None
+        self.updated_at: Optional[datetime] = None
+        self._products = {}  # product_id -> ProductResponse
+        self._price_cents = {}  # product_id -> 价格（分），价格格式无效的商品不在其中
+        self._by_category = {}  # 分类 -> 商品ID列表（ALL_CATEGORIES 为全部）
+        self._bodies = {}  # 分类 -> 列表响应体（JSON 字节）
+        self._product_bodies = {}  # product_id -> 详情响应体
+        self._product_dicts = {}  # product_id -> 响应字典（嵌入订单项）
+        self._recommendations = {}  # 诊断状态 -> 排序后的商品ID列表
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    def etag(self, variant: str = "") -> str:
+        digest = hashlib.sha1(f"{CATALOG_NAME}:{self.version}:{variant}".encode()).hexdigest()[:16]
+        return f'W/"{digest}"'
+
+    # ---------- 查询 ----------
+
+    def get(self, product_id: int) -> Optional[ProductResponse]:
+        return self._products.get(product_id)
+
+    def price_cents(self, product_id: int) -> Optional[int]:
+        return self._price_cents.get(product_id)
+
+    def list_body(self, category: Optional[str] = None) -> bytes:
+        """分类商品列表的 JSON 响应体；不存在的分类返回空列表"""
+        return self._bodies.get(category or ALL_CATEGORIES, b"[]")
+
+    def product_body(self, product_id: int) -> Optional[bytes]:
+        return self._product_bodies.get(product_id)
+
+    def list_dicts(self, category: Optional[str] = None) -> list:
+        return [self._product_dicts[i] for i in self._by_category.get(category or ALL_CATEGORIES, ())]
+
+    def product_dict(self, product_id: int) -> Optional[dict]:
+        return self._product_dicts.get(product_id)
+
+    def recommend(self, status: str, limit: int = RECOMMENDATION_LIMIT) -> list:
+        """与诊断状态匹配的商品（按匹配程度排序）"""
+        return [self._products[i] for i in self._recommendations.get(status, ())[:limit]]
+
+    # ---------- 加载 ----------
+
+    async def _read_version(self, db) -> tuple:
+        result = await db.execute(
+            select(CatalogVersion.version, CatalogVersion.updated_at).where(CatalogVersion.name == CATALOG_NAME)
+        )
+        row = result.first()
+        return (row.version, row.updated_at) if row else (0, None)
+
+    async def load(self):
+        """从数据库整体加载（版本号与商品在同一会话中读取）"""
+        async with AsyncSessionLocal() as db:
+            version, updated_at = await self._read_version(db)
+            result = await db.execute(select(Product).order_by(Product.id))
+            products = [ProductResponse.model_validate(p) for p in result.scalars().all()]
+        by_category = {ALL_CATEGORIES: [p.id for p in products]}
+        for product in products:
+            if product.category:
+                by_category.setdefault(product.category, []).append(product.id)
+        price_cents = {}
+        for product in products:
+            cents = parse_price_cents(product.price)
+            if cents is None:
+                print(f"商品 {product.id} 的价格格式无效: {product.price!r}")
+            else:
+                price_cents[product.id] = cents
+        self._products = {p.id: p for p in products}
+        self._price_cents = price_cents
+        self._by_category = by_category
+        self._bodies = {
+            category: _products_adapter.dump_json([self._products[i] for i in ids])
+            for category, ids in by_category.items()
+        }
+        self._product_bodies = {p.id: p.model_dump_json().encode() for p in products}
+        self._product_dicts = {p.id: p.model_dump() for p in products}
+        self._recommendations = build_recommendation_index(products)
+        self.version, self.updated_at = version, updated_at
+
+    async def refresh(self) -> bool:
+        """版本号变化时重新加载，返回是否重新加载"""
+        async with self._lock:
+            async with AsyncSessionLocal() as db:
+                version, _ = await self._read_version(db)
+            if version == self.version:
+                return False
+            await self.load()
+            return True
+
+    async def ensure_loaded(self):
+        """启动时加载失败（数据库暂不可用）的情况下，在首次使用时加载"""
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self.load()
+
+    # ---------- 生命周期 ----------
+
+    async def start(self):
+        self._lock = asyncio.Lock()
+        try:
+            await self.load()
+        except Exception as e:
+            print(f"商品目录加载失败，稍后重试: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"商品目录刷新失败，稍后重试: {e}")
+
+
+product_catalog = ProductCatalog()
+
+
+# ==================== 版本号 ====================
+# 经主库会话写入 products 表时，在提交前递增版本号（与商品变更同一事务）。
+
+def _flag_catalog_write(session):
+    session.info["catalog_changed"] = True
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _track_flushed_products(session, flush_context):
+    if any(isinstance(obj, Product) for obj in list(session.new) + list(session.dirty) + list(session.deleted)):
+        _flag_catalog_write(session)
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _track_product_statements(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is not None and mapper.local_table.name == Product.__tablename__:
+        _flag_catalog_write(orm_execute_state.session)
+
+
+@event.listens_for(PrimarySession, "before_commit")
+def _bump_catalog_version(session):
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    if not session.info.pop("catalog_changed", False):
+        return
+    now = datetime.now()
+    result = session.execute(
+        update(CatalogVersion).where(CatalogVersion.name == CATALOG_NAME)
+        .values(version=CatalogVersion.version + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        session.add(CatalogVersion(name=CATALOG_NAME, version=1, updated_at=now))
+        session.flush()
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_catalog_tracking(session):
+    session.info.pop("catalog_changed", None)
@@ -0,0 +1,132 @@
+"""
+响应压缩中间件
+
+按客户端 Accept-Encoding 协商 brotli（安装了 brotli 包时）或 gzip，只压缩文本类响应：
+  - 只压缩 COMPRESSIBLE_TYPES 中的内容类型（JSON、iCalendar 等）；图片本身已压缩，SSE 需要逐条即时送达，均不压缩
+  - 一次性发送的响应体小于 COMPRESSION_MIN_SIZE 字节时不压缩（压缩收益抵不过开销）
+  - 流式响应（如日历订阅源）逐块压缩
+  - 已带 Content-Encoding 的响应、304 等无响应体的响应原样透传
+"""
+import gzip
+import os
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # 未安装 brotli 时只使用 gzip
+    brotli = None
+
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))  # 小于该字节数的响应不压缩
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))  # 动态内容使用较低的质量等级，兼顾 CPU
+
+COMPRESSIBLE_TYPES = ("application/json", "text/calendar", "text/plain", "text/html", "text/css", "application/javascript")
+
+
+def _accepted_encodings(headers: Headers) -> set:
+    encodings = set()
+    for part in headers.get("accept-encoding", "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+class _GzipStream:
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class _BrotliStream:
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compressor.process(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def compress_body(encoding: str, body: bytes) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class CompressionMiddleware:
+    """按大小阈值压缩文本类响应（gzip / brotli）"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        accepted = _accepted_encodings(Headers(scope=scope))
+        encoding = "br" if brotli is not None and "br" in accepted else "gzip" if "gzip" in accepted else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        stream = None  # 流式压缩器；None 表示尚未决定或不压缩
+        passthrough = False
+
+        async def wrapped_send(message):
+            nonlocal start_message, stream, passthrough
+            if message["type"] == "http.response.start":
+                start_message = message
+                headers = Headers(raw=message["headers"])
+                content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                passthrough = (
+                    "content-encoding" in headers
+                    or content_type not in COMPRESSIBLE_TYPES
+                    or message["status"] < 200 or message["status"] in (204, 304)
+                )
+                if passthrough:
+                    await send(message)
+                return
+            if message["type"] != "http.response.body" or passthrough:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if stream is None and start_message is not None:
+                # 第一块响应体：决定是否压缩
+                headers = MutableHeaders(raw=start_message["headers"])
+                if not more_body and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    body = compress_body(encoding, body)
+                    headers["Content-Length"] = str(len(body))
+                    await send(start_message)
+                    await send({"type": "http.response.body", "body": body})
+                    return
+                del headers["Content-Length"]
+                stream = _BrotliStream() if encoding == "br" else _GzipStream()
+                await send(start_message)
+                start_message = None
+            data = stream.compress(body)
+            if not more_body:
+                data += stream.finish()
+            if data or not more_body:
+                await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, wrapped_send)
@@ -1,7 +1,9 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
 import os
+import time
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -12,23 +14,163 @@ DB_PORT = os.getenv("DB_PORT", "3306")
 DB_USER = os.getenv("DB_USER", "root")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "zjjiang819")
 DB_NAME = os.getenv("DB_NAME", "plant_health_db")
+DB_ECHO = os.getenv("DB_ECHO", "true").lower() == "true"  # 是否输出 SQL 日志
 
-# 创建数据库连接 URL
-DATABASE_URL = f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+# 连接池配置（同步与异步引擎共用）
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+
+# 创建数据库连接 URL（可通过环境变量直接覆盖，便于本地基准测试）
+DATABASE_URL = os.getenv(
+    "DATABASE_URL",
+    f"mysql+pymysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+)
+# 异步驱动（aiomysql），供 async 路由使用，避免阻塞事件循环
+ASYNC_DATABASE_URL = os.getenv(
+    "ASYNC_DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_NAME}?charset=utf8mb4"
+)
+
+def engine_options(url: str) -> dict:
+    """按数据库类型生成引擎参数（SQLite 不支持连接池大小配置）"""
+    options = {"echo": DB_ECHO}
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+            pool_recycle=3600,
+        )
+    return options
+
+# 只读副本配置（可选）：设置 DB_READ_HOST 或 ASYNC_READ_DATABASE_URL 后启用
+DB_READ_HOST = os.getenv("DB_READ_HOST")
+DB_READ_PORT = os.getenv("DB_READ_PORT", DB_PORT)
+ASYNC_READ_DATABASE_URL = os.getenv(
+    "ASYNC_READ_DATABASE_URL",
+    f"mysql+aiomysql://{DB_USER}:{DB_PASSWORD}@{DB_READ_HOST}:{DB_READ_PORT}/{DB_NAME}?charset=utf8mb4"
+    if DB_READ_HOST else None
+)
+# 用户写入后在该时间窗口内的读取仍走主库，保证读到自己的写入（副本复制延迟）
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
 
 # 创建数据库引擎
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+
+# 创建异步数据库引擎
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL))
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite 默认不执行外键约束，开启后 ON DELETE CASCADE 行为与 MySQL 一致
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _enable_sqlite_foreign_keys)
+if ASYNC_DATABASE_URL.startswith("sqlite"):
+    event.listen(async_engine.sync_engine, "connect", _enable_sqlite_foreign_keys)
+
+# 创建只读副本引擎（未配置时为 None，读请求回落到主库）
+async_read_engine = (
+    create_async_engine(ASYNC_READ_DATABASE_URL, **engine_options(ASYNC_READ_DATABASE_URL))
+    if ASYNC_READ_DATABASE_URL else None
+)
+
+# ==================== 读己之写跟踪 ====================
+# 记录每个用户最近一次提交写入的时间（进程内）。多 worker 部署时各进程独立记录，
+# 窗口只需覆盖副本复制延迟，同一用户的后续请求落到其他 worker 的影响有限。
+_last_write_at = {}
+
+def mark_user_write(user_id: int):
+    """记录用户刚刚提交了写入"""
+    _last_write_at[user_id] = time.monotonic()
+
+def recently_wrote(user_id: int) -> bool:
+    """用户是否仍处于读己之写窗口内"""
+    last = _last_write_at.get(user_id)
+    if last is None:
+        return False
+    if time.monotonic() - last > READ_YOUR_WRITES_SECONDS:
+        _last_write_at.pop(user_id, None)
+        return False
+    return True
+
+class PrimarySession(Session):
+    """主库会话：提交写入后自动记录 session.info["user_id"] 对应用户的写入时间"""
+
+@event.listens_for(PrimarySession, "after_flush")
+def _flag_flush_write(session, flush_context):
+    session.info["wrote"] = True
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _flag_statement_write(orm_execute_state):
+    # 批量 update()/delete()/insert() 语句不经过 flush，需要单独标记
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        orm_execute_state.session.info["wrote"] = True
+
+@event.listens_for(PrimarySession, "after_commit")
+def _record_user_write(session):
+    if session.info.pop("wrote", False) and session.info.get("user_id") is not None:
+        mark_user_write(session.info["user_id"])
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_write_flag(session):
+    session.info.pop("wrote", None)
+
+class ReadOnlySession(Session):
+    """只读副本会话：禁止写入"""
+
+@event.listens_for(ReadOnlySession, "before_flush")
+def _reject_replica_write(session, flush_context, instances):
+    raise RuntimeError("只读副本会话不允许写入")
 
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# 异步会话工厂：提交后不过期对象，避免在 async 环境下触发隐式懒加载
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    sync_session_class=PrimarySession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# 只读副本会话工厂
+AsyncReadSessionLocal = (
+    async_sessionmaker(
+        bind=async_read_engine,
+        class_=AsyncSession,
+        sync_session_class=ReadOnlySession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+    if async_read_engine is not None else None
+)
+
 # 创建基类
 Base = declarative_base()
 
-# 依赖项：获取数据库会话
+# 依赖项：获取数据库会话（同步，供 def 路由在线程池中使用）
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+# 依赖项：获取异步数据库会话（供 async def 路由使用）
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+# 依赖项：获取只读会话（无用户上下文的公共数据，如产品目录）
+# 未配置副本时回落到主库
+async def get_async_read_db():
+    if AsyncReadSessionLocal is None:
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
+    async with AsyncReadSessionLocal() as db:
+        yield db
@@ -0,0 +1,33 @@
+"""
+快速 JSON 响应
+
+FastAPI 默认对 response_model 逐项校验（ORM 对象经 from_attributes 构建 Pydantic 模型）、
+再经 jsonable_encoder 转换并用标准库 json 编码。列表接口改为：
+  - 查询时按响应字段直接投影为行字典，不构建 ORM 对象
+  - 用 orjson 直接编码行字典（datetime / date 的输出格式与 Pydantic 一致）
+
+这些接口仍保留 response_model 用于 OpenAPI 文档，但返回的 Response 不再经过校验，
+投影的列必须与响应模型的字段一致（见 response_columns）。其余接口默认使用 ORJSONResponse 编码。
+对比数据见 benchmarks/bench_serialization.py。
+"""
+from typing import Optional
+
+import orjson
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+__all__ = ["ORJSONResponse", "json_response", "response_columns"]
+
+
+def response_columns(model, schema) -> list:
+    """响应模型字段对应的 ORM 列（用于按响应字段投影查询）"""
+    return [getattr(model, name) for name in schema.model_fields if name in model.__table__.columns]
+
+
+def json_response(
+    content, response: Optional[Response] = None, status_code: int = 200, headers: Optional[dict] = None
+) -> Response:
+    """用 orjson 编码已投影的字典/列表；response 为 FastAPI 注入的响应对象时沿用其响应头（如 ETag）"""
+    merged = {k: v for k, v in response.headers.items() if k != "content-length"} if response is not None else {}
+    merged.update(headers or {})
+    return Response(orjson.dumps(content), status_code=status_code, media_type="application/json", headers=merged)
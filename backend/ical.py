@@ -0,0 +1,109 @@
+"""
+提醒的 iCalendar（RFC 5545）订阅源
+
+日历客户端按固定间隔轮询订阅地址，订阅地址中带有按用户签名的令牌，无需登录。
+  - 普通提醒：每条未完成提醒一个 VEVENT（计划时间为本地浮动时间，持续 30 分钟）
+  - 浇水提醒：每株设置了浇水规则的植物一个全天 VEVENT，以 RRULE:FREQ=DAILY;INTERVAL=<周期> 表示重复，
+    不逐次展开；当前一次发生已完成时从下一次发生开始
+"""
+import hmac
+from datetime import datetime, timedelta, timezone
+
+from versions import sign
+
+CRLF = "\r\n"
+MAX_LINE_OCTETS = 75
+REMINDER_DURATION = "PT30M"
+
+
+def calendar_token(user_id: int, secret: str) -> str:
+    return f"{user_id}.{sign(f'calendar:{user_id}', secret)}"
+
+
+def parse_calendar_token(token: str, secret: str):
+    """校验订阅令牌，返回用户ID；令牌无效返回 None"""
+    user_id, _, signature = token.partition(".")
+    if not user_id.isdigit() or not hmac.compare_digest(signature, sign(f"calendar:{user_id}", secret)):
+        return None
+    return int(user_id)
+
+
+def escape_text(value: str) -> str:
+    return (
+        (value or "").replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+        .replace("\r\n", "\\n").replace("\n", "\\n")
+    )
+
+
+def fold(line: str) -> str:
+    """按 75 个八位字节折行（不拆分多字节字符），续行以空格开头"""
+    encoded = line.encode("utf-8")
+    if len(encoded) <= MAX_LINE_OCTETS:
+        return line + CRLF
+    parts, current, size, limit = [], [], 0, MAX_LINE_OCTETS
+    for char in line:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > limit:
+            parts.append("".join(current))
+            current, size, limit = [], 0, MAX_LINE_OCTETS - 1
+        current.append(char)
+        size += char_size
+    parts.append("".join(current))
+    return CRLF.join(parts[:1] + [" " + part for part in parts[1:]]) + CRLF
+
+
+def _local_time(value: datetime) -> str:
+    return value.strftime("%Y%m%dT%H%M%S")
+
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def calendar_header(name: str) -> str:
+    return "".join(fold(line) for line in (
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        "PRODID:-//AI Plant Health//Reminders//ZH",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+        f"X-WR-CALNAME:{escape_text(name)}",
+    ))
+
+
+def calendar_footer() -> str:
+    return fold("END:VCALENDAR")
+
+
+def reminder_event(reminder, stamp: str = None) -> str:
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:reminder-{reminder.id}@plant-health",
+        f"DTSTAMP:{stamp or _utc_now()}",
+        f"DTSTART:{_local_time(reminder.scheduled_date)}",
+        f"DURATION:{REMINDER_DURATION}",
+        f"SUMMARY:{escape_text(reminder.title)}",
+    ]
+    if reminder.message:
+        lines.append(f"DESCRIPTION:{escape_text(reminder.message)}")
+    lines.append("END:VEVENT")
+    return "".join(fold(line) for line in lines)
+
+
+def watering_event(reminder: dict, watering_frequency: int, stamp: str = None) -> str:
+    """植物浇水规则的重复事件；reminder 为 load_watering_reminders 返回的当前一次发生"""
+    start = reminder["scheduled_date"]
+    if reminder["is_completed"]:
+        start += timedelta(days=watering_frequency)
+    lines = [
+        "BEGIN:VEVENT",
+        f"UID:watering-{reminder['plant_id']}@plant-health",
+        f"DTSTAMP:{stamp or _utc_now()}",
+        f"DTSTART;VALUE=DATE:{start.strftime('%Y%m%d')}",
+        f"RRULE:FREQ=DAILY;INTERVAL={watering_frequency}",
+        f"SUMMARY:{escape_text(reminder['title'])}",
+        f"DESCRIPTION:{escape_text(reminder['message'])}",
+        "TRANSP:TRANSPARENT",
+        "END:VEVENT",
+    ]
+    return "".join(fold(line) for line in lines)
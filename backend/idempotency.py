@@ -0,0 +1,139 @@
+"""
+幂等键（Idempotency-Key）
+
+移动端请求超时后会自动重试：/predict 重试会再次调用模型、再占用一次检测次数并再写一条诊断历史，
+/orders 重试会创建重复订单。客户端为同一次操作生成一个 Idempotency-Key 请求头并在重试时复用：
+  - 首个请求正常执行，成功的响应按 (用户, 接口, 键) 保存在内存中，保存 IDEMPOTENCY_TTL_SECONDS
+  - 之后带相同键的请求直接返回保存的响应（响应头 Idempotent-Replayed: true）
+  - 首个请求仍在执行时到达的重复请求等待其结果，不重复执行
+  - 首个请求失败（HTTPException 或其他异常）时不保存，等待中的重复请求收到同样的错误，之后的重试重新执行
+  - 同一个键用于请求体不同的请求时返回 422
+
+存储按最近使用顺序最多保留 IDEMPOTENCY_MAX_ENTRIES 个已完成的响应（执行中的请求不会被淘汰）。
+存储在各 worker 进程内；多 worker 部署时同一客户端的重试通常经由同一连接或粘性路由到达同一 worker，
+不同 worker 之间不共享。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
+
+from fastapi import HTTPException, Response
+
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))  # 响应保存时间
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))  # 最多保存的响应数
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+def request_fingerprint(payload) -> str:
+    """请求体指纹（可 JSON 序列化的对象），用于发现同一个键被用于不同的请求"""
+    return hashlib.sha256(
+        json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+class _Entry:
+    __slots__ = ("future", "fingerprint", "expires_at")
+
+    def __init__(self, fingerprint: Optional[str]):
+        self.future = asyncio.get_running_loop().create_future()
+        self.fingerprint = fingerprint
+        self.expires_at = None  # 完成后设置；None 表示仍在执行
+
+
+class IdempotencyStore:
+    """按 (用户ID, 接口, 幂等键) 保存首个请求的结果"""
+
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0  # 直接返回已保存响应的次数
+        self.waits = 0  # 等待执行中请求的次数
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self):
+        """从最久未使用的一端删除过期的响应，超出上限时继续淘汰已完成的响应"""
+        now = time.monotonic()
+        overflow = len(self._entries) - self.max_entries
+        evicted = []
+        for k, e in self._entries.items():
+            if e.expires_at is None:
+                continue
+            if e.expires_at <= now or overflow > 0:
+                evicted.append(k)
+                overflow -= 1
+            else:
+                break
+        for k in evicted:
+            del self._entries[k]
+
+    async def run(
+        self,
+        user_id: int,
+        scope: str,
+        key: Optional[str],
+        work: Callable[[], Awaitable],
+        response: Optional[Response] = None,
+        fingerprint: Optional[str] = None,
+    ):
+        """
+        执行 work() 并返回其结果；key 为空时直接执行。
+        返回值会被保存并原样返回给重复请求，应为响应模型实例（不要返回绑定会话的 ORM 对象）。
+        """
+        if not key:
+            return await work()
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            raise HTTPException(status_code=400, detail=f"Idempotency-Key 长度不能超过{IDEMPOTENCY_KEY_MAX_LENGTH}")
+
+        entry_key = (user_id, scope, key)
+        entry = self._entries.get(entry_key)
+        if entry is not None and entry.expires_at is not None and entry.expires_at <= time.monotonic():
+            del self._entries[entry_key]
+            entry = None
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key 已用于另一个不同的请求")
+            self._entries.move_to_end(entry_key)
+            if entry.future.done():
+                self.hits += 1
+            else:
+                self.waits += 1
+            # shield：重复请求被取消（客户端断开）时不影响首个请求的结果
+            result = await asyncio.shield(entry.future)
+            if response is not None:
+                response.headers[REPLAYED_HEADER] = "true"
+            return result
+
+        entry = _Entry(fingerprint)
+        self._entries[entry_key] = entry
+        try:
+            result = await work()
+        except BaseException as e:
+            # 失败的请求不保存，之后的重试重新执行
+            if self._entries.get(entry_key) is entry:
+                del self._entries[entry_key]
+            if isinstance(e, Exception):
+                entry.future.set_exception(e)
+            else:
+                # 首个请求被取消（客户端断开、服务关闭），等待中的重复请求需要重试
+                entry.future.set_exception(
+                    HTTPException(status_code=409, detail="相同 Idempotency-Key 的请求已中断，请重试")
+                )
+            # 没有等待者时避免 "Future exception was never retrieved" 警告
+            entry.future.exception()
+            raise
+        entry.future.set_result(result)
+        entry.expires_at = time.monotonic() + self.ttl
+        self._evict()
+        return result
+
+
+idempotency_store = IdempotencyStore()
@@ -0,0 +1,95 @@
+"""
+时间有序的唯一ID生成器（ULID）
+
+格式：48 位毫秒时间戳 + 80 位随机数，使用 Crockford Base32 编码为 26 个字符，
+字符串的字典序即生成时间顺序，写入 B-tree 索引时总是追加到末尾，也支持按时间范围扫描。
+
+同一毫秒内在上一个ID的随机部分上递增，保证进程内严格单调；不同 worker 进程的随机
+部分相互独立（fork 出的子进程会重置状态），跨进程冲突概率可忽略。
+"""
+import os
+import threading
+import time
+from datetime import datetime
+
+_ENCODING = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_DECODING = {char: index for index, char in enumerate(_ENCODING)}
+_RANDOM_BITS = 80
+_RANDOM_MAX = (1 << _RANDOM_BITS) - 1
+ULID_LENGTH = 26
+
+# 订单号前缀
+ORDER_NUMBER_PREFIX = "ORD"
+
+
+def encode(value: int) -> str:
+    """将 128 位整数编码为 26 个字符的 Crockford Base32 字符串"""
+    chars = []
+    for _ in range(ULID_LENGTH):
+        chars.append(_ENCODING[value & 31])
+        value >>= 5
+    return "".join(reversed(chars))
+
+
+def decode(ulid: str) -> int:
+    value = 0
+    for char in ulid.upper():
+        value = (value << 5) | _DECODING[char]
+    return value
+
+
+class UlidGenerator:
+    """线程安全、进程内单调递增的 ULID 生成器"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._last_random = 0
+
+    def reset(self):
+        with self._lock:
+            self._last_ms = -1
+            self._last_random = 0
+
+    def new_int(self) -> int:
+        with self._lock:
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms <= self._last_ms:
+                # 同一毫秒内（或系统时钟回拨）：沿用上次的时间戳，随机部分加一
+                now_ms = self._last_ms
+                self._last_random += 1
+                if self._last_random > _RANDOM_MAX:
+                    now_ms += 1
+                    self._last_random = int.from_bytes(os.urandom(10), "big")
+            else:
+                self._last_random = int.from_bytes(os.urandom(10), "big")
+            self._last_ms = now_ms
+            return (now_ms << _RANDOM_BITS) | self._last_random
+
+    def new(self) -> str:
+        return encode(self.new_int())
+
+
+_generator = UlidGenerator()
+# 多进程部署（fork 启动 worker）时，子进程不能沿用父进程的单调状态
+os.register_at_fork(after_in_child=_generator.reset)
+
+
+def new_id() -> str:
+    """生成一个新的 ULID 字符串"""
+    return _generator.new()
+
+
+def timestamp_of(ulid: str) -> datetime:
+    """解析 ULID 中的生成时间"""
+    return datetime.fromtimestamp((decode(ulid) >> _RANDOM_BITS) / 1000)
+
+
+def min_id_at(moment: datetime) -> str:
+    """给定时间点对应的最小 ULID，可用作按时间范围扫描的下界"""
+    return encode(int(moment.timestamp() * 1000) << _RANDOM_BITS)
+
+
+def new_order_number() -> str:
+    """生成时间有序的订单号，如 ORD01J9Z3K8W5Q4M7N2X6V0T8R1BC"""
+    return f"{ORDER_NUMBER_PREFIX}{new_id()}"
@@ -0,0 +1,105 @@
+"""
+上传图片的静态文件服务
+
+图片文件以唯一文件名写入一次、之后不再修改，因此：
+  - 响应带 Cache-Control: public, max-age=一年, immutable，浏览器重新渲染列表时不再请求
+  - 支持条件请求（If-None-Match / If-Modified-Since → 304，由 StaticFiles 处理）
+  - 支持单区间 Range 请求（206 Partial Content；If-Range 不匹配时返回完整文件），
+    多区间请求按完整文件返回
+"""
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+RANGE_CHUNK_SIZE = 64 * 1024
+
+_RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(value: str, size: int):
+    """解析单个字节区间，返回 (start, end)（含 end）；格式不支持返回 None，区间无法满足返回 False"""
+    match = _RANGE_PATTERN.match(value.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # 后缀区间：最后 N 个字节
+        length = int(last)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+class PartialFileResponse(Response):
+    """文件的一个字节区间"""
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict):
+        super().__init__(status_code=206, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        self.headers["Content-Length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        remaining = self.end - self.start + 1
+        with open(self.path, "rb") as f:
+            f.seek(self.start)
+            while remaining > 0:
+                chunk = f.read(min(RANGE_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
+
+
+class ImageFiles(StaticFiles):
+    """带长期缓存与 Range 支持的图片目录"""
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope, status_code: int = 200) -> Response:
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        response.headers["Cache-Control"] = IMAGE_CACHE_CONTROL
+        if response.status_code != 200:
+            return response
+        response.headers["Accept-Ranges"] = "bytes"
+
+        request_headers = Headers(scope=scope)
+        range_header = request_headers.get("range")
+        if not range_header or not self._if_range_matches(request_headers, response.headers):
+            return response
+        size = stat_result.st_size
+        byte_range = parse_range(range_header, size)
+        if byte_range is None:
+            return response
+        headers = {
+            key: value for key, value in response.headers.items()
+            if key.lower() not in ("content-length", "content-range")
+        }
+        if byte_range is False:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        start, end = byte_range
+        return PartialFileResponse(str(full_path), start, end, size, headers)
+
+    @staticmethod
+    def _if_range_matches(request_headers: Headers, response_headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if if_range is None:
+            return True
+        return if_range in (response_headers.get("etag"), response_headers.get("last-modified"))
@@ -0,0 +1,239 @@
+"""
+上传图片的存储
+
+图片按内容寻址：键为内容的 SHA-256，按前两级十六进制分片存放，如
+  /images/3f/a2/3fa2…c9.jpg
+  - 同一张照片重复上传只保存一份（已存在时不再写入）
+  - 单个目录下的文件数受分片限制，列目录与备份不会随图片数量变慢
+  - 内容不变所以键不变，/images 下的响应可以长期缓存（见 image_files.py）
+
+数据库中的 image_url 始终是与存储后端无关的 /images/<键> 路径（旧版的 /images/<文件名> 同样有效），
+访问时经由存储解析：
+  - local（默认）：IMAGES_DIR 下的分片目录，由 /images 静态文件服务直接返回
+  - s3：S3 兼容的对象存储（AWS S3、MinIO 等），多个后端副本共享；/images/<键> 重定向到
+    IMAGE_PUBLIC_URL（CDN 或公开读的存储桶）下的地址，未配置时重定向到预签名地址
+
+因为去重，同一个键可能被多个用户的诊断历史和植物引用。注销账户时只删除不再被其他记录引用的图片，
+并且跳过删除检查之后又被上传过（写入时会刷新修改时间）的图片，避免删掉刚被其他用户引用的文件。
+"""
+import os
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from image_files import IMAGE_CACHE_CONTROL
+
+IMAGE_STORE = os.getenv("IMAGE_STORE", "local")  # local / s3
+IMAGES_DIR = Path(os.getenv("IMAGES_DIR", str(Path(__file__).parent / "images")))
+IMAGE_URL_PREFIX = "/images/"
+
+# S3 兼容存储（IMAGE_STORE=s3）
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # MinIO 等非 AWS 服务的地址，如 http://127.0.0.1:9000
+S3_BUCKET = os.getenv("S3_BUCKET", "plant-images")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+S3_ACCESS_KEY_ID = os.getenv("S3_ACCESS_KEY_ID")
+S3_SECRET_ACCESS_KEY = os.getenv("S3_SECRET_ACCESS_KEY")
+IMAGE_PUBLIC_URL = os.getenv("IMAGE_PUBLIC_URL", "")  # 对象的公开访问地址前缀（CDN），为空时使用预签名地址
+S3_PRESIGN_SECONDS = int(os.getenv("S3_PRESIGN_SECONDS", "3600"))
+
+# 同一格式的不同扩展名使用同一个键
+_EXTENSION_ALIASES = {".jpeg": ".jpg"}
+
+CONTENT_TYPES = {
+    ".jpg": "image/jpeg", ".png": "image/png", ".gif": "image/gif", ".webp": "image/webp", ".avif": "image/avif",
+}
+
+
+def normalize_extension(file_ext: str) -> str:
+    file_ext = file_ext.lower()
+    return _EXTENSION_ALIASES.get(file_ext, file_ext)
+
+
+def content_key(digest: str, file_ext: str) -> str:
+    """内容哈希对应的分片键，如 3f/a2/3fa2…c9.jpg"""
+    return f"{digest[:2]}/{digest[2:4]}/{digest}{normalize_extension(file_ext)}"
+
+
+def key_from_url(image_url: str) -> Optional[str]:
+    """/images/<键> 形式的URL对应的存储键；其他URL（用户填写的外部地址）或不安全的路径返回 None"""
+    if not image_url or not image_url.startswith(IMAGE_URL_PREFIX):
+        return None
+    key = image_url[len(IMAGE_URL_PREFIX):]
+    parts = key.split("/")
+    if not key or any(part in ("", ".", "..") or "\\" in part for part in parts):
+        return None
+    return key
+
+
+def image_url_for(key: str) -> str:
+    return f"{IMAGE_URL_PREFIX}{key}"
+
+
+class LocalImageStore:
+    """本地文件系统（IMAGES_DIR 下的分片目录）"""
+
+    def __init__(self, root: Path = IMAGES_DIR):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def incoming_dir(self) -> Path:
+        """上传临时文件目录（与存储位于同一文件系统，完成后可原子重命名）"""
+        path = self.root / ".incoming"
+        path.mkdir(exist_ok=True)
+        return path
+
+    def path(self, key: str) -> Path:
+        return self.root / key
+
+    def exists(self, key: str) -> bool:
+        return self.path(key).is_file()
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        """写入对象；已存在时只刷新修改时间（标记为最近被引用）"""
+        path = self.path(key)
+        if path.is_file():
+            os.utime(path)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 先写临时文件再原子重命名，并发写入同一内容时也不会读到不完整的文件
+        fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def put_file(self, key: str, source: Path):
+        """把本地临时文件原子地移动为对象；已存在时只刷新修改时间（临时文件由调用方删除）"""
+        path = self.path(key)
+        if path.is_file():
+            os.utime(path)
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(source, path)
+
+    def delete(self, key: str, unless_touched_since: Optional[datetime] = None) -> bool:
+        """删除对象；unless_touched_since 之后写入过的对象保留。返回是否删除"""
+        path = self.path(key)
+        try:
+            if unless_touched_since is not None and path.stat().st_mtime > unless_touched_since.timestamp():
+                return False
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    def public_url(self, key: str) -> str:
+        return image_url_for(key)
+
+
+class S3ImageStore:
+    """S3 兼容的对象存储（需要安装 boto3）"""
+
+    def __init__(self):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError as e:
+            raise RuntimeError("IMAGE_STORE=s3 需要安装 boto3：pip install boto3") from e
+        self._client_error = ClientError
+        self.bucket = S3_BUCKET
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL,
+            region_name=S3_REGION,
+            aws_access_key_id=S3_ACCESS_KEY_ID,
+            aws_secret_access_key=S3_SECRET_ACCESS_KEY,
+        )
+
+    def _head(self, key: str) -> Optional[dict]:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=key)
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def incoming_dir(self) -> Path:
+        return Path(tempfile.gettempdir())
+
+    def exists(self, key: str) -> bool:
+        return self._head(key) is not None
+
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except self._client_error as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+    def _touch(self, key: str) -> bool:
+        """对象已存在时原地复制一次以刷新 LastModified（服务端操作，不重新上传内容），返回是否存在"""
+        head = self._head(key)
+        if head is None:
+            return False
+        self.client.copy_object(
+            Bucket=self.bucket, Key=key, CopySource={"Bucket": self.bucket, "Key": key},
+            MetadataDirective="REPLACE", ContentType=head.get("ContentType", "application/octet-stream"),
+            CacheControl=IMAGE_CACHE_CONTROL,
+        )
+        return True
+
+    def _object_args(self, key: str) -> dict:
+        return {
+            "ContentType": CONTENT_TYPES.get(Path(key).suffix, "application/octet-stream"),
+            "CacheControl": IMAGE_CACHE_CONTROL,
+        }
+
+    def put(self, key: str, data: bytes):
+        """写入对象；已存在时只刷新 LastModified"""
+        if not self._touch(key):
+            self.client.put_object(Bucket=self.bucket, Key=key, Body=data, **self._object_args(key))
+
+    def put_file(self, key: str, source: Path):
+        """上传本地临时文件（大文件自动分段上传，不整体读入内存）；已存在时只刷新 LastModified"""
+        if not self._touch(key):
+            self.client.upload_file(str(source), self.bucket, key, ExtraArgs=self._object_args(key))
+
+    def delete(self, key: str, unless_touched_since: Optional[datetime] = None) -> bool:
+        head = self._head(key)
+        if head is None:
+            return False
+        if unless_touched_since is not None and head["LastModified"] > unless_touched_since.astimezone(timezone.utc):
+            return False
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+        return True
+
+    def public_url(self, key: str) -> str:
+        if IMAGE_PUBLIC_URL:
+            return f"{IMAGE_PUBLIC_URL.rstrip('/')}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object", Params={"Bucket": self.bucket, "Key": key}, ExpiresIn=S3_PRESIGN_SECONDS
+        )
+
+
+def create_image_store():
+    if IMAGE_STORE == "s3":
+        return S3ImageStore()
+    return LocalImageStore()
+
+
+image_store = create_image_store()
+
+
+def delete_image(image_url: str, unless_touched_since: Optional[datetime] = None) -> bool:
+    """删除 image_url 对应的图片（外部URL忽略）。会阻塞，在后台任务中调用"""
+    key = key_from_url(image_url)
+    if key is None:
+        return False
+    return image_store.delete(key, unless_touched_since)
@@ -0,0 +1,111 @@
+"""
+上传图片的头部校验
+
+此前 /predict 只检查 Content-Type、/upload-image 只检查扩展名，第一次真正的校验是完整解码，
+损坏的图片或尺寸巨大的"解压炸弹"要消耗大量 CPU 和内存后才会失败。现在上传流的开头先经过头部校验，
+通过后才送入解码器：
+  1. 魔数：按文件开头的字节识别格式，不在允许列表中的直接拒绝（与文件名、Content-Type 无关）
+  2. 头部：只解析图片头（Image.open 是惰性的，不解码像素），读取宽高
+  3. 尺寸：宽高乘积超过 MAX_IMAGE_PIXELS、或单边超过 MAX_IMAGE_SIDE 的直接拒绝
+头部在 HEADER_PROBE_LIMIT 字节内仍无法解析的视为损坏。
+
+Image.MAX_IMAGE_PIXELS 同时设为 MAX_IMAGE_PIXELS，其他经由 Pillow 打开图片的地方（如缩略图）也受同样的限制。
+拒绝原因按类别计数（rejection_counts），在 /health 中输出。
+"""
+import io
+import os
+from collections import Counter
+from typing import Optional
+
+from fastapi import HTTPException
+from PIL import Image
+
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", str(40_000_000)))  # 约 4000万像素（如 8000x5000）
+MAX_IMAGE_SIDE = int(os.getenv("MAX_IMAGE_SIDE", "16384"))  # 单边最大像素数
+HEADER_PROBE_LIMIT = int(os.getenv("HEADER_PROBE_LIMIT", str(256 * 1024)))  # 最多读取多少字节用于解析头部
+
+Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+
+# 格式 -> 存储扩展名
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "GIF": ".gif", "WEBP": ".webp"}
+
+# 拒绝原因
+NOT_AN_IMAGE = "not_an_image"
+FORMAT_NOT_ALLOWED = "format_not_allowed"
+CORRUPT_HEADER = "corrupt_header"
+TOO_MANY_PIXELS = "too_many_pixels"
+CORRUPT_DATA = "corrupt_data"  # 头部正常但像素数据无法解码
+TOO_LARGE = "too_large"  # 文件大小超限
+
+REJECTION_MESSAGES = {
+    NOT_AN_IMAGE: "无法识别的图片文件",
+    FORMAT_NOT_ALLOWED: "不支持的图片格式",
+    CORRUPT_HEADER: "图片文件已损坏",
+    TOO_MANY_PIXELS: "图片尺寸过大",
+    CORRUPT_DATA: "图片文件已损坏",
+}
+
+rejection_counts = Counter()
+
+
+def reject(reason: str, detail: Optional[str] = None, status_code: int = 400):
+    """计数并拒绝上传"""
+    rejection_counts[reason] += 1
+    raise HTTPException(status_code=status_code, detail=detail or REJECTION_MESSAGES[reason])
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """按魔数识别格式；数据不足或无法识别返回 None"""
+    if data.startswith(b"\xff\xd8\xff"):
+        return "JPEG"
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "PNG"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "GIF"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "WEBP"
+    return None
+
+
+class ImageHeader:
+    def __init__(self, format: str, width: int, height: int):
+        self.format = format
+        self.width = width
+        self.height = height
+
+    @property
+    def extension(self) -> str:
+        return FORMAT_EXTENSIONS[self.format]
+
+
+def probe_header(data: bytes, allowed_formats, final: bool = False) -> Optional[ImageHeader]:
+    """
+    校验文件开头的 data：通过时返回格式与宽高；需要更多数据时返回 None（final=True 表示已无更多数据）；
+    不通过时计数并抛出 HTTPException。
+    """
+    if len(data) < 12 and not final:
+        return None
+    fmt = sniff_format(data)
+    if fmt is None:
+        reject(NOT_AN_IMAGE)
+    if fmt not in allowed_formats:
+        reject(FORMAT_NOT_ALLOWED, f"不支持的图片格式 {fmt}。仅支持: {', '.join(sorted(allowed_formats))}")
+    try:
+        # 只解析头部，不解码像素；超过 MAX_IMAGE_PIXELS 两倍时 Pillow 直接抛出 DecompressionBombError
+        with Image.open(io.BytesIO(data), formats=[fmt]) as image:
+            width, height = image.size
+    except Image.DecompressionBombError:
+        reject(TOO_MANY_PIXELS)
+    except Exception:
+        # 头部尚未完整（如 JPEG 的 EXIF 段较大）时等待更多数据
+        if final or len(data) >= HEADER_PROBE_LIMIT:
+            reject(CORRUPT_HEADER)
+        return None
+    if width <= 0 or height <= 0:
+        reject(CORRUPT_HEADER)
+    if width * height > MAX_IMAGE_PIXELS or max(width, height) > MAX_IMAGE_SIDE:
+        reject(
+            TOO_MANY_PIXELS,
+            f"图片尺寸过大（{width}x{height}），最多 {MAX_IMAGE_PIXELS} 像素、单边不超过 {MAX_IMAGE_SIDE} 像素"
+        )
+    return ImageHeader(fmt, width, height)
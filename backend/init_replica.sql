@@ -0,0 +1,12 @@
+-- 只读副本初始化脚本（docker-compose.replica.yml 使用）
+-- 从主库（mysql 服务）按 GTID 自动定位开始复制
+
+CHANGE REPLICATION SOURCE TO
+    SOURCE_HOST = 'mysql',
+    SOURCE_PORT = 3306,
+    SOURCE_USER = 'root',
+    SOURCE_PASSWORD = 'root',
+    SOURCE_AUTO_POSITION = 1,
+    GET_SOURCE_PUBLIC_KEY = 1;
+
+START REPLICA;
@@ -1,34 +1,65 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
-from fastapi.staticfiles import StaticFiles
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, BackgroundTasks, Request, Response, Header
+from fastapi.responses import StreamingResponse, RedirectResponse, FileResponse
+from fastapi.concurrency import run_in_threadpool
 from PIL import Image
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update, delete, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, selectinload
 from datetime import timedelta, date, datetime, timezone
+import asyncio
 import io
 import random
 import os
 import base64
 import json
 import re
-import uuid
-from pathlib import Path
 from volcenginesdkarkruntime import Ark
 from typing import List, Optional
 
-from database import engine, get_db, Base
-from models import User, Membership, DiagnosisHistory, MyPlant, Reminder, Product, Order, OrderItem
+from database import engine, get_db, get_async_db, AsyncSessionLocal, Base
+from models import (
+    User, Membership, DiagnosisHistory, DiagnosisHistoryArchive, MyPlant, Reminder, ReminderArchive,
+    Order, OrderItem, UserVersion
+)
 from schemas import (
     UserRegister, UserLogin, Token, UserResponse, DetectionResult, 
     MembershipResponse, MembershipPurchaseRequest, MembershipPurchaseResponse,
-    DiagnosisHistoryResponse, MyPlantCreate, MyPlantUpdate, MyPlantResponse,
-    ReminderCreate, ReminderUpdate, ReminderResponse,
+    DiagnosisHistoryResponse, DiagnosisHistorySummary,
+    MyPlantCreate, MyPlantUpdate, MyPlantResponse, MyPlantSummary,
+    ReminderCreate, ReminderUpdate, ReminderResponse, ReminderBulkRequest, ReminderBulkResponse,
     ProductResponse, OrderCreateRequest, OrderResponse, OrderItemResponse
 )
+from write_behind import write_behind_queue, diagnosis_history_ids
+from ids import new_order_number
+from archive import ARCHIVE_ENABLED, archive_loop
+from reminder_scheduler import reminder_scheduler, REMINDER_SCHEDULER_ENABLED, REMINDER_DUE_WINDOW
+from reminder_counters import unread_counters
+from push import push_hub, event_stream
+from fastjson import ORJSONResponse, json_response, response_columns
+from compression import CompressionMiddleware
+from image_files import ImageFiles, IMAGE_CACHE_CONTROL
+from image_store import image_store, LocalImageStore, delete_image, key_from_url
+from uploads import UploadSizeLimitMiddleware, MAX_IMAGE_SIZE, receive_upload, store_upload, upload_digest
+from image_validation import rejection_counts
+from thumbnails import thumbnail_worker, delete_thumbnails, select_width, negotiate_format, FORMATS
+from idempotency import idempotency_store, request_fingerprint
+from catalog import product_catalog, format_price, ALL_CATEGORIES, CATALOG_MAX_AGE_SECONDS
+from watering import (
+    WATERING, WATERING_OVERRIDE, exclude_watering_overrides, live_rows, plant_id_of, next_occurrence,
+    load_watering_reminders, materialize_overrides, scheduled_plants_query
+)
+from versions import get_version, get_versions, make_etag, http_date, is_not_modified
+from ical import (
+    calendar_token, parse_calendar_token, calendar_header, calendar_footer, reminder_event, watering_event
+)
 from auth import (
     get_password_hash,
     authenticate_user,
     create_access_token,
     get_current_user,
+    get_read_db,
+    SECRET_KEY,
     ACCESS_TOKEN_EXPIRE_MINUTES
 )
 
@@ -44,19 +75,40 @@ REMINDER_TYPE_MAPPING = {
     "复查提醒": "re_examination"
 }
 
-# 图片存储配置
-IMAGES_DIR = Path(__file__).parent / "images"
-IMAGES_DIR.mkdir(exist_ok=True)
-ALLOWED_IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".gif"}
-MAX_IMAGE_SIZE = 10 * 1024 * 1024  # 10MB
+# 列表接口默认返回的字段（大文本列仅在详情接口返回，或通过 fields 参数显式请求）
+HISTORY_LARGE_FIELDS = {"problem_judgment", "handling_suggestions", "plant_introduction"}
+MY_PLANT_LARGE_FIELDS = {"notes"}
+HISTORY_LIST_FIELDS = [c.key for c in DiagnosisHistory.__table__.columns if c.key not in HISTORY_LARGE_FIELDS]
+MY_PLANT_LIST_FIELDS = [c.key for c in MyPlant.__table__.columns if c.key not in MY_PLANT_LARGE_FIELDS]
+
+# 按响应字段投影查询的列（列表接口跳过 ORM 对象构建，见 fastjson.py）
+REMINDER_COLUMNS = response_columns(Reminder, ReminderResponse)
+ORDER_COLUMNS = response_columns(Order, OrderResponse)
+ORDER_ITEM_COLUMNS = response_columns(OrderItem, OrderItemResponse)
+
+# 各上传接口允许的图片格式（按文件头的魔数识别，见 image_validation.py；存储见 image_store.py）
+UPLOAD_IMAGE_FORMATS = {"JPEG", "PNG", "GIF"}
+PREDICT_IMAGE_FORMATS = {"JPEG", "PNG"}
 
 # 创建数据库表
 Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="AI 植物健康检测 API")
+app = FastAPI(title="AI 植物健康检测 API", default_response_class=ORJSONResponse)
+
+# 图片访问：本地存储由静态文件服务直接返回（内容寻址、长期缓存，支持 Range / 条件请求），
+# 对象存储重定向到 CDN 或预签名地址
+if isinstance(image_store, LocalImageStore):
+    app.mount("/images", ImageFiles(directory=str(image_store.root)), name="images")
+else:
+    @app.get("/images/{key:path}", include_in_schema=False)
+    async def redirect_image(key: str):
+        if key_from_url(f"/images/{key}") is None:
+            raise HTTPException(status_code=404, detail="Not Found")
+        url = await run_in_threadpool(image_store.public_url, key)
+        return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=300"})
 
-# 静态文件服务（用于提供图片访问）
-app.mount("/images", StaticFiles(directory=str(IMAGES_DIR)), name="images")
+# 上传接口的请求体超过图片大小上限时尽早返回 413（放在 CORS 之内，错误响应同样带跨域头）
+app.add_middleware(UploadSizeLimitMiddleware)
 
 # 允许跨域请求
 app.add_middleware(
@@ -67,11 +119,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# JSON 等文本响应按大小阈值压缩（brotli / gzip）
+app.add_middleware(CompressionMiddleware)
+
+# ==================== 生命周期 ====================
+
+@app.on_event("startup")
+async def start_background_workers():
+    """启动后台任务"""
+    await write_behind_queue.start()
+    await push_hub.start()
+    await product_catalog.start()
+    await thumbnail_worker.start()
+    if REMINDER_SCHEDULER_ENABLED:
+        await reminder_scheduler.start()
+        app.state.unread_reconcile_task = asyncio.create_task(unread_counters.reconcile_loop())
+    if ARCHIVE_ENABLED:
+        app.state.archive_task = asyncio.create_task(archive_loop())
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    """停止后台任务并写出队列中剩余的数据"""
+    for name in ("archive_task", "unread_reconcile_task"):
+        task = getattr(app.state, name, None)
+        if task is not None:
+            task.cancel()
+    await reminder_scheduler.stop()
+    await write_behind_queue.stop()
+    await push_hub.stop()
+    await product_catalog.stop()
+    await thumbnail_worker.stop()
+
 # ==================== 辅助函数 ====================
 
-def get_or_create_membership(db: Session, user_id: int) -> Membership:
+async def get_or_create_membership(db: AsyncSession, user_id: int) -> Membership:
     """获取或创建用户会员记录"""
-    membership = db.query(Membership).filter(Membership.user_id == user_id).first()
+    result = await db.execute(select(Membership).where(Membership.user_id == user_id))
+    membership = result.scalars().first()
     
     if not membership:
         # 如果没有会员记录，创建一个默认的免费会员
@@ -81,78 +165,162 @@ def get_or_create_membership(db: Session, user_id: int) -> Membership:
             monthly_detections=0
         )
         db.add(membership)
-        db.commit()
-        db.refresh(membership)
+        await db.commit()
+        await db.refresh(membership)
     
     return membership
 
-def reset_monthly_detections_if_needed(db: Session, membership: Membership) -> Membership:
+async def reset_monthly_detections_if_needed(db: AsyncSession, membership: Membership) -> Membership:
     """检查并在需要时重置月度检测次数"""
     today = date.today()
     if membership.last_reset_date.month != today.month or membership.last_reset_date.year != today.year:
         membership.monthly_detections = 0
         membership.last_reset_date = today
-        db.commit()
-        db.refresh(membership)
+        await db.commit()
+        await db.refresh(membership)
     return membership
 
-def check_vip_access(db: Session, user_id: int) -> bool:
-    """检查用户是否为VIP"""
-    membership = get_or_create_membership(db, user_id)
-    if not membership.is_vip:
+def membership_etag_variant() -> str:
+    """会员状态的 ETag 变体：月度检测次数按月重置，ETag 随月份变化"""
+    return date.today().strftime("%Y-%m")
+
+async def load_membership_status(db: AsyncSession, user_id: int) -> MembershipResponse:
+    """会员状态和剩余检测次数（必要时创建会员记录、重置月度次数）"""
+    # 获取或创建会员记录
+    membership = await get_or_create_membership(db, user_id)
+    
+    # 检查并重置月度检测次数
+    membership = await reset_monthly_detections_if_needed(db, membership)
+    
+    # 计算剩余检测次数
+    if membership.is_vip:
+        remaining = UNLIMITED_DETECTIONS  # VIP用户无限检测
+    else:
+        remaining = max(0, FREE_USER_MONTHLY_LIMIT - membership.monthly_detections)
+    
+    return MembershipResponse(
+        is_vip=membership.is_vip,
+        monthly_detections=membership.monthly_detections,
+        remaining_detections=remaining
+    )
+
+async def check_vip_access(db: AsyncSession, user_id: int) -> bool:
+    """检查用户是否为VIP（只读查询，可在只读副本会话上调用；无会员记录视为免费用户）"""
+    result = await db.execute(select(Membership.is_vip).where(Membership.user_id == user_id))
+    if not result.scalar():
         raise HTTPException(
             status_code=403,
             detail="此功能仅限VIP用户使用，请升级为VIP获得完整功能访问权限。"
         )
     return True
 
-async def save_image(file: UploadFile) -> str:
-    """保存上传的图片并返回URL"""
-    # 验证文件扩展名
-    file_ext = Path(file.filename).suffix.lower()
-    if file_ext not in ALLOWED_IMAGE_EXTENSIONS:
-        raise HTTPException(
-            status_code=400,
-            detail=f"不支持的文件格式。仅支持: {', '.join(ALLOWED_IMAGE_EXTENSIONS)}"
-        )
-    
-    # 读取文件内容
-    contents = await file.read()
+async def resource_etag(db: AsyncSession, user_id: int, resources: tuple, variant: str = "") -> tuple:
+    """按用户资源版本号生成 (ETag, 最近变更时间)"""
+    versions = await get_versions(db, user_id, resources)
+    etag = make_etag(user_id, "+".join(resources), ".".join(str(v) for v, _ in versions.values()), variant)
+    updated = [t for _, t in versions.values() if t is not None]
+    return etag, max(updated) if updated else None
+
+async def check_not_modified(
+    request: Request, response: Response, db: AsyncSession, user_id: int, resources: tuple, variant: str = ""
+) -> Optional[Response]:
+    """
+    个人资源的条件请求：按用户资源版本号生成 ETag / Last-Modified 并写入响应头
     
-    # 验证文件大小
-    if len(contents) > MAX_IMAGE_SIZE:
-        raise HTTPException(
-            status_code=400,
-            detail=f"文件过大。最大支持 {MAX_IMAGE_SIZE / 1024 / 1024}MB"
+    客户端缓存仍有效时返回 304 响应（只查询版本号，不查询资源表、不序列化），否则返回 None。
+    resources 为响应内容所依赖的资源（如仅VIP可见的列表同时依赖会员状态），variant 区分查询参数等。
+    """
+    etag, last_modified = await resource_etag(db, user_id, resources, variant)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = http_date(last_modified)
+    if is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
+
+async def count_unread_reminders(db: AsyncSession, user_id: int) -> int:
+    """未读提醒数量：调度器就绪时读取内存计数，否则查询数据库"""
+    await write_behind_queue.wait_for_user(user_id)
+    if unread_counters.ready:
+        # 计数由提醒调度器事件增量维护，等待本用户刚提交的提醒变更生效后直接读取内存
+        await reminder_scheduler.wait_for_user(user_id)
+        return unread_counters.get(user_id)
+    
+    window_end = datetime.now() + REMINDER_DUE_WINDOW
+    
+    result = await db.execute(
+        select(func.count()).select_from(Reminder).where(
+            Reminder.user_id == user_id,
+            Reminder.is_read == False,
+            Reminder.is_completed == False,
+            Reminder.scheduled_date <= window_end,  # 执行日期在3天内的都要提醒
+            exclude_watering_overrides()
         )
+    )
+    count = result.scalar_one()
+    watering = await load_watering_reminders(
+        db, MyPlant.user_id == user_id, MyPlant.next_watering_date <= window_end.date()
+    )
+    count += sum(1 for r in watering if not r["is_read"] and not r["is_completed"])
+    return count
+
+def select_fields(model, fields: Optional[str], default_fields: List[str]) -> list:
+    """
+    解析稀疏字段集参数（逗号分隔的列名），返回要查询的列
     
-    # 生成唯一文件名
-    unique_filename = f"{uuid.uuid4()}{file_ext}"
-    file_path = IMAGES_DIR / unique_filename
+    未指定时使用 default_fields；id 始终包含在内。
+    """
+    if fields:
+        names = [name.strip() for name in fields.split(",") if name.strip()]
+    else:
+        names = list(default_fields)
     
-    # 保存文件
-    with open(file_path, "wb") as f:
-        f.write(contents)
+    columns = model.__table__.columns
+    unknown = [name for name in names if name not in columns]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"不支持的字段: {', '.join(unknown)}")
     
-    # 返回可访问的URL路径
-    return f"/images/{unique_filename}"
+    if "id" not in names:
+        names.insert(0, "id")
+    return [getattr(model, name) for name in dict.fromkeys(names)]
+
+async def save_image(file: UploadFile) -> str:
+    """保存上传的图片并返回URL"""
+    # 分块写入临时文件并计算内容哈希；开头先校验格式与尺寸（不解码），超过 MAX_IMAGE_SIZE 时返回 413
+    upload = await receive_upload(file, UPLOAD_IMAGE_FORMATS, MAX_IMAGE_SIZE)
+    
+    # 按内容保存（相同图片只存一份，扩展名取自识别出的格式），缩略图由后台任务生成，返回可访问的URL路径
+    image_url = await store_upload(upload)
+    thumbnail_worker.enqueue(image_url)
+    return image_url
+
+def delete_image_files(image_urls: List[str], unless_touched_since: datetime):
+    """删除图片（在后台任务中执行）；删除检查之后又被上传过的图片保留"""
+    for image_url in image_urls:
+        try:
+            if delete_image(image_url, unless_touched_since):
+                delete_thumbnails(image_url)
+        except Exception as e:
+            print(f"删除图片失败 {image_url}: {e}")
 
 # ==================== 健康检查接口 ====================
 
 @app.get("/health")
-def health_check(db: Session = Depends(get_db)):
+async def health_check(db: AsyncSession = Depends(get_async_db)):
     """
     健康检查接口
     用于监控系统检查应用程序和数据库连接状态
     """
     try:
         # 检查数据库连接（带超时保护）
-        db.execute("SELECT 1")
+        await db.execute(text("SELECT 1"))
         
         return {
             "status": "healthy",
             "service": "AI Plant Health Check API",
             "database": "connected",
+            "image_rejections": dict(rejection_counts),  # 上传图片按原因统计的拒绝次数
             "timestamp": datetime.now(timezone.utc).isoformat()
         }
     except Exception as e:
@@ -168,7 +336,7 @@ def health_check(db: Session = Depends(get_db)):
 
 @app.post("/register", response_model=UserResponse)
 def register(user: UserRegister, db: Session = Depends(get_db)):
-    """用户注册"""
+    """用户注册（bcrypt 哈希为 CPU 密集操作，保持同步路由在线程池中执行）"""
     # 检查用户名是否已存在
     db_user = db.query(User).filter(User.username == user.username).first()
     if db_user:
@@ -224,37 +392,143 @@ async def read_users_me(current_user: User = Depends(get_current_user)):
     """获取当前登录用户信息"""
     return current_user
 
-@app.get("/membership/status", response_model=MembershipResponse)
-async def get_membership_status(
+@app.get("/bootstrap")
+async def bootstrap(
+    request: Request,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db),
+    read_db: AsyncSession = Depends(get_read_db)
 ):
-    """获取用户会员状态和剩余检测次数"""
-    # 获取或创建会员记录
-    membership = get_or_create_membership(db, current_user.id)
-    
-    # 检查并重置月度检测次数
-    membership = reset_monthly_detections_if_needed(db, membership)
+    """
+    应用启动时的聚合数据：用户信息、会员状态、未读提醒数量、商品列表
     
-    # 计算剩余检测次数
-    if membership.is_vip:
-        remaining = UNLIMITED_DETECTIONS  # VIP用户无限检测
+    只解析一次令牌、查询一次用户，各部分并发获取，一次请求代替四次。每部分带有自己的 ETag
+    （与对应独立接口的 ETag 一致）；客户端在 If-None-Match 中列出已缓存的 ETag，
+    匹配的部分只返回 {"etag": ..., "not_modified": true}，不查询、不下发数据。
+    """
+    known = {tag.strip() for tag in request.headers.get("if-none-match", "").split(",") if tag.strip()}
+    user_id = current_user.id
+    
+    def section(etag: str, data=None) -> dict:
+        if etag in known:
+            return {"etag": etag, "not_modified": True}
+        return {"etag": etag, "data": data}
+    
+    async def membership_section():
+        etag, _ = await resource_etag(db, user_id, ("membership",), membership_etag_variant())
+        if etag in known:
+            return section(etag)
+        return section(etag, (await load_membership_status(db, user_id)).model_dump())
+    
+    async def unread_count_section():
+        count = await count_unread_reminders(read_db, user_id)
+        return section(make_etag(user_id, "unread_count", count), {"unread_count": count})
+    
+    async def products_section():
+        await product_catalog.ensure_loaded()
+        return section(product_catalog.etag(f"list:{ALL_CATEGORIES}"), product_catalog.list_dicts())
+    
+    user = UserResponse.model_validate(current_user).model_dump()
+    tasks = [membership_section(), unread_count_section(), products_section()]
+    if read_db is db:
+        # 没有只读副本（或处于读己之写窗口）时两部分共用同一会话，不能并发
+        membership, unread_count, products = [await task for task in tasks]
     else:
-        remaining = max(0, FREE_USER_MONTHLY_LIMIT - membership.monthly_detections)
+        membership, unread_count, products = await asyncio.gather(*tasks)
+    return json_response({
+        "user": section(make_etag(user_id, "user", 0, f"{current_user.username}:{current_user.email}"), user),
+        "membership": membership,
+        "unread_count": unread_count,
+        "products": products,
+    }, headers={"Cache-Control": "private, no-cache"})
+
+@app.delete("/users/me")
+async def delete_account(
+    background_tasks: BackgroundTasks,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    注销账户：用少量集合删除语句移除用户的全部数据，图片文件在后台删除
     
-    return MembershipResponse(
-        is_vip=membership.is_vip,
-        monthly_detections=membership.monthly_detections,
-        remaining_detections=remaining
+    删除语句不加载任何子记录，数据量大的用户也能快速完成。
+    """
+    user_id = current_user.id
+    # 先等待该用户尚未落库的诊断写入，避免删除后再插入
+    await write_behind_queue.wait_for_user(user_id)
+    
+    # 收集该用户诊断时上传的图片（我的植物中的图片来自诊断历史或用户填写的URL，不单独删除）
+    references_checked_at = datetime.now()
+    image_urls = set()
+    for model in (DiagnosisHistory, DiagnosisHistoryArchive):
+        result = await db.execute(
+            select(model.image_url).where(
+                model.user_id == user_id,
+                model.image_url.is_not(None)
+            )
+        )
+        image_urls.update(result.scalars().all())
+    # 图片按内容去重存储，排除仍被其他用户的诊断历史或植物引用的图片
+    candidates = list(image_urls)
+    for model in (MyPlant, DiagnosisHistory, DiagnosisHistoryArchive):
+        for i in range(0, len(candidates), 1000):
+            result = await db.execute(
+                select(model.image_url).where(
+                    model.user_id != user_id,
+                    model.image_url.in_(candidates[i:i + 1000])
+                )
+            )
+            image_urls.difference_update(result.scalars().all())
+    
+    # 按依赖顺序逐表集合删除（未迁移外键级联的旧库同样适用）
+    deleted = {}
+    deleted["reminders"] = (await db.execute(delete(Reminder).where(Reminder.user_id == user_id))).rowcount
+    deleted["reminders"] += (await db.execute(delete(ReminderArchive).where(ReminderArchive.user_id == user_id))).rowcount
+    deleted["my_plants"] = (await db.execute(delete(MyPlant).where(MyPlant.user_id == user_id))).rowcount
+    deleted["diagnosis_histories"] = (await db.execute(delete(DiagnosisHistory).where(DiagnosisHistory.user_id == user_id))).rowcount
+    deleted["diagnosis_histories"] += (await db.execute(delete(DiagnosisHistoryArchive).where(DiagnosisHistoryArchive.user_id == user_id))).rowcount
+    await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(select(Order.id).where(Order.user_id == user_id))))
+    deleted["orders"] = (await db.execute(delete(Order).where(Order.user_id == user_id))).rowcount
+    await db.execute(delete(Membership).where(Membership.user_id == user_id))
+    await db.execute(delete(UserVersion).where(UserVersion.user_id == user_id))
+    await db.execute(delete(User).where(User.id == user_id))
+    await db.commit()
+    
+    background_tasks.add_task(delete_image_files, list(image_urls), references_checked_at)
+    return {"message": "账户已注销", "deleted": deleted, "images_scheduled": len(image_urls)}
+
+@app.get("/membership/status", response_model=MembershipResponse)
+async def get_membership_status(
+    request: Request,
+    response: Response,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """获取用户会员状态和剩余检测次数（支持 ETag 条件请求；月度次数按月重置，ETag 随月份变化）"""
+    not_modified = await check_not_modified(
+        request, response, db, current_user.id, ("membership",), membership_etag_variant()
     )
+    if not_modified:
+        return not_modified
+    return await load_membership_status(db, current_user.id)
 
 @app.post("/membership/purchase", response_model=MembershipPurchaseResponse)
 async def purchase_membership(
     purchase_data: MembershipPurchaseRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """购买会员（通过区块链钱包支付）"""
+    """购买会员（通过区块链钱包支付；支持 Idempotency-Key，重试返回首次的结果）"""
+    return await idempotency_store.run(
+        current_user.id, "membership_purchase", idempotency_key,
+        lambda: activate_membership(purchase_data, current_user, db),
+        response, request_fingerprint(purchase_data.model_dump())
+    )
+
+async def activate_membership(purchase_data: MembershipPurchaseRequest, current_user: User, db: AsyncSession):
+    """校验支付信息并开通会员"""
     import re
     
     # 验证钱包类型
@@ -309,12 +583,12 @@ async def purchase_membership(
     
     try:
         # 获取或创建会员记录
-        membership = get_or_create_membership(db, current_user.id)
+        membership = await get_or_create_membership(db, current_user.id)
         
         # 升级为VIP
         membership.is_vip = True
-        db.commit()
-        db.refresh(membership)
+        await db.commit()
+        await db.refresh(membership)
         
         wallet_type_name = "以太坊" if purchase_data.wallet_type == "eth" else "CKB"
         return MembershipPurchaseResponse(
@@ -323,7 +597,7 @@ async def purchase_membership(
             is_vip=True
         )
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"会员开通失败: {str(e)}")
 
 # ==================== 植物健康检测相关路由 ====================
@@ -576,13 +850,29 @@ def mock_ai_inference(image: Image.Image):
 
 @app.post("/predict", response_model=DetectionResult)
 async def predict_plant_health(
+    response: Response,
     file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
+    """
+    植物健康检测。
+    支持 Idempotency-Key：超时后的重试直接返回首次的结果，不会再次调用模型、占用检测次数或写入诊断历史。
+    """
+    # 指纹取图片内容的哈希：同名、同大小的不同照片（如手机上传的 image.jpg）也能识别为不同的请求
+    fingerprint = await upload_digest(file) if idempotency_key else None
+    return await idempotency_store.run(
+        current_user.id, "predict", idempotency_key,
+        lambda: diagnose_image(file, current_user, db),
+        response, fingerprint
+    )
+
+async def diagnose_image(file: UploadFile, current_user: User, db: AsyncSession) -> DetectionResult:
+    """检测一张植物图片：检查次数限制、保存图片、调用模型，历史与提醒交给 write-behind 队列写入"""
     # 检查用户会员状态和检测次数
-    membership = get_or_create_membership(db, current_user.id)
-    membership = reset_monthly_detections_if_needed(db, membership)
+    membership = await get_or_create_membership(db, current_user.id)
+    membership = await reset_monthly_detections_if_needed(db, membership)
     
     # 检查免费用户的检测次数限制
     if not membership.is_vip and membership.monthly_detections >= FREE_USER_MONTHLY_LIMIT:
@@ -591,26 +881,19 @@ async def predict_plant_health(
             detail=f"本月检测次数已用完。免费用户每月最多可检测{FREE_USER_MONTHLY_LIMIT}次，请升级为VIP获得无限检测次数。"
         )
     
-    # 验证文件类型
-    if file.content_type not in ["image/jpeg", "image/png"]:
-        raise HTTPException(status_code=400, detail="只支持 JPG 或 PNG 图片格式")
-
     try:
-        # 读取图片数据一次，用于保存和AI分析
-        image_data = await file.read()
-        image = Image.open(io.BytesIO(image_data))
+        # 分块读取上传：同时写入临时文件并计算内容哈希；文件头先校验格式（仅 JPG / PNG，按魔数识别）
+        # 与尺寸，通过后才增量解码，解码结果直接用于AI分析
+        upload = await receive_upload(file, PREDICT_IMAGE_FORMATS, MAX_IMAGE_SIZE, decode=True)
+        image = upload.image
         
-        # 保存图片（使用已读取的数据）
-        file_ext = Path(file.filename).suffix.lower()
-        unique_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = IMAGES_DIR / unique_filename
-        with open(file_path, "wb") as f:
-            f.write(image_data)
-        image_url = f"/images/{unique_filename}"
+        # 临时文件原子地移动到内容寻址的存储位置（相同图片只存一份）
+        image_url = await store_upload(upload)
+        thumbnail_worker.enqueue(image_url)
         
-        # 调用 AI 模型
+        # 调用 AI 模型（同步 HTTP 调用，放到线程池中避免阻塞事件循环）
         try:
-            prediction = ai_inference(image)
+            prediction = await run_in_threadpool(ai_inference, image)
         except Exception as api_error:
             # 如果 API 调用失败，使用模拟结果
             print(f"API 调用失败: {api_error}")
@@ -646,92 +929,157 @@ async def predict_plant_health(
             reminder_reason=prediction.get("reminder_reason", ""),
             reminder_days=prediction.get("reminder_days", 0)
         )
+        if result.need_product:
+            # 推荐商品来自商品目录加载时构建的索引，客户端无需再请求 /products 自行匹配
+            await product_catalog.ensure_loaded()
+            result.recommended_products = product_catalog.recommend(result.status)
         
-        # 保存诊断历史
-        diagnosis_history = DiagnosisHistory(
-            user_id=current_user.id,
-            plant_name=result.plant_name,
-            scientific_name=result.scientific_name,
-            status=result.status,
-            problem_judgment=result.problem_judgment,
-            severity=result.severity,
-            severity_value=result.severityValue,
-            handling_suggestions=json.dumps(result.handling_suggestions, ensure_ascii=False),
-            need_product=result.need_product,
-            plant_introduction=result.plant_introduction,
-            image_url=image_url  # 保存图片URL
-        )
-        db.add(diagnosis_history)
-        
-        # 增加检测次数（仅在成功检测后）
-        membership.monthly_detections += 1
-        
-        # 一起提交，确保原子性
-        db.commit()
-        db.refresh(diagnosis_history)  # 刷新以获取生成的ID
-        
-        # 添加诊断ID到结果中
-        result.diagnosis_id = diagnosis_history.id
+        # 预分配诊断历史ID，历史与提醒交给 write-behind 队列批量写入，响应无需等待
+        diagnosis_id = await diagnosis_history_ids.next_id()
+        now = datetime.now()
+        history_row = {
+            "id": diagnosis_id,
+            "user_id": current_user.id,
+            "plant_name": result.plant_name,
+            "scientific_name": result.scientific_name,
+            "status": result.status,
+            "problem_judgment": result.problem_judgment,
+            "severity": result.severity,
+            "severity_value": result.severityValue,
+            "handling_suggestions": json.dumps(result.handling_suggestions, ensure_ascii=False),
+            "need_product": result.need_product,
+            "plant_introduction": result.plant_introduction,
+            "image_url": image_url,  # 保存图片URL
+            "created_at": now
+        }
         
         # 自动创建提醒（如果AI建议需要提醒）
+        reminder_row = None
         if result.reminder_type and result.reminder_type != "无" and result.reminder_days > 0:
-            # 计算提醒日期
-            scheduled_date = datetime.now() + timedelta(days=result.reminder_days)
-            
             # 确定提醒类型映射
             reminder_type_en = REMINDER_TYPE_MAPPING.get(result.reminder_type, "re_examination")
             
-            # 创建提醒标题和消息
-            title = f"{result.reminder_type}: {result.plant_name}"
-            message = result.reminder_reason or f"建议{result.reminder_days}天后{'浇水' if reminder_type_en == 'watering' else '复查'}"
-            
-            # 创建提醒
-            auto_reminder = Reminder(
-                user_id=current_user.id,
-                plant_id=None,  # 暂时不关联具体植物，用户可以后续添加到"我的植物"
-                reminder_type=reminder_type_en,
-                title=title,
-                message=message,
-                reminder_reason=result.reminder_reason,
-                scheduled_date=scheduled_date
+            reminder_row = {
+                "user_id": current_user.id,
+                "plant_id": None,  # 暂时不关联具体植物，用户可以后续添加到"我的植物"
+                "reminder_type": reminder_type_en,
+                "title": f"{result.reminder_type}: {result.plant_name}",
+                "message": result.reminder_reason or f"建议{result.reminder_days}天后{'浇水' if reminder_type_en == 'watering' else '复查'}",
+                "reminder_reason": result.reminder_reason,
+                "scheduled_date": now + timedelta(days=result.reminder_days),
+                "is_completed": False,
+                "is_read": False,
+                "created_at": now
+            }
+        
+        # 增加检测次数（仅在成功检测后，原子自增避免并发请求互相覆盖）
+        await db.execute(
+            update(Membership).where(Membership.id == membership.id).values(
+                monthly_detections=Membership.monthly_detections + 1
             )
-            db.add(auto_reminder)
-            db.commit()
+        )
+        await db.commit()
+        
+        write_behind_queue.enqueue(current_user.id, history_row, reminder_row)
+        
+        # 添加诊断ID到结果中
+        result.diagnosis_id = diagnosis_id
         
         return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"识别失败: {str(e)}")
 
 # ==================== 诊断历史相关路由 ====================
 
-@app.get("/diagnosis-history", response_model=List[DiagnosisHistoryResponse])
+@app.get(
+    "/diagnosis-history",
+    response_model=List[DiagnosisHistorySummary],
+    response_model_exclude_unset=True
+)
 async def get_diagnosis_history(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     skip: int = 0,
-    limit: int = 20
+    limit: int = 20,
+    fields: Optional[str] = None
 ):
-    """获取当前用户的诊断历史（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    """
+    获取当前用户的诊断历史（仅VIP用户）
     
-    histories = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.user_id == current_user.id
-    ).order_by(DiagnosisHistory.created_at.desc()).offset(skip).limit(limit).all()
-    return histories
+    默认只返回摘要字段，problem_judgment / handling_suggestions / plant_introduction
+    等大文本字段需通过 fields 参数（逗号分隔）显式请求，完整内容见详情接口。
+    热表之后接着返回已归档的历史（归档记录均早于热表记录），分页对调用方透明。
+    支持 ETag 条件请求。
+    """
+    columns = select_fields(DiagnosisHistory, fields, HISTORY_LIST_FIELDS)
+    await write_behind_queue.wait_for_user(current_user.id)
+    # 会员状态决定是否可见，一并计入 ETag
+    not_modified = await check_not_modified(
+        request, response, db, current_user.id, ("diagnosis_history", "membership"), request.url.query
+    )
+    if not_modified:
+        return not_modified
+    await check_vip_access(db, current_user.id)
+    
+    # 只查询所需列，直接返回行字典，跳过 ORM 对象构建
+    result = await db.execute(
+        select(*columns).where(
+            DiagnosisHistory.user_id == current_user.id
+        ).order_by(DiagnosisHistory.created_at.desc()).offset(skip).limit(limit)
+    )
+    histories = [dict(row) for row in result.mappings()]
+    if len(histories) >= limit or not current_user.has_archived_histories:
+        return json_response(histories, response)
+    
+    # 热表不足一页：计算归档表中的偏移量后继续读取
+    if histories:
+        hot_total = skip + len(histories)
+    else:
+        result = await db.execute(
+            select(func.count()).select_from(DiagnosisHistory).where(DiagnosisHistory.user_id == current_user.id)
+        )
+        hot_total = result.scalar_one()
+    archive_columns = [getattr(DiagnosisHistoryArchive, column.key) for column in columns]
+    result = await db.execute(
+        select(*archive_columns).where(
+            DiagnosisHistoryArchive.user_id == current_user.id
+        ).order_by(DiagnosisHistoryArchive.created_at.desc())
+        .offset(max(0, skip - hot_total)).limit(limit - len(histories))
+    )
+    histories.extend(dict(row) for row in result.mappings())
+    return json_response(histories, response)
 
 @app.get("/diagnosis-history/{history_id}", response_model=DiagnosisHistoryResponse)
 async def get_diagnosis_history_by_id(
     history_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取指定诊断历史详情（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    await check_vip_access(db, current_user.id)
+    await write_behind_queue.wait_for_user(current_user.id)
+    
+    result = await db.execute(
+        select(DiagnosisHistory).where(
+            DiagnosisHistory.id == history_id,
+            DiagnosisHistory.user_id == current_user.id
+        )
+    )
+    history = result.scalars().first()
     
-    history = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.id == history_id,
-        DiagnosisHistory.user_id == current_user.id
-    ).first()
+    if not history:
+        # 可能已被归档
+        result = await db.execute(
+            select(DiagnosisHistoryArchive).where(
+                DiagnosisHistoryArchive.id == history_id,
+                DiagnosisHistoryArchive.user_id == current_user.id
+            )
+        )
+        history = result.scalars().first()
     
     if not history:
         raise HTTPException(status_code=404, detail="诊断历史不存在")
@@ -742,49 +1090,83 @@ async def get_diagnosis_history_by_id(
 async def delete_diagnosis_history(
     history_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """删除指定诊断历史"""
-    history = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.id == history_id,
-        DiagnosisHistory.user_id == current_user.id
-    ).first()
+    await write_behind_queue.wait_for_user(current_user.id)
+    deleted = 0
+    for model in (DiagnosisHistory, DiagnosisHistoryArchive):
+        result = await db.execute(
+            delete(model).where(
+                model.id == history_id,
+                model.user_id == current_user.id
+            )
+        )
+        deleted += result.rowcount
     
-    if not history:
+    if not deleted:
         raise HTTPException(status_code=404, detail="诊断历史不存在")
     
-    db.delete(history)
-    db.commit()
+    # last_diagnosis_id 为软引用，删除后手动置空
+    await db.execute(
+        update(MyPlant).where(
+            MyPlant.user_id == current_user.id,
+            MyPlant.last_diagnosis_id == history_id
+        ).values(last_diagnosis_id=None)
+    )
+    await db.commit()
     return {"message": "诊断历史已删除"}
 
 # ==================== 我的植物相关路由 ====================
 
-@app.get("/my-plants", response_model=List[MyPlantResponse])
+@app.get(
+    "/my-plants",
+    response_model=List[MyPlantSummary],
+    response_model_exclude_unset=True
+)
 async def get_my_plants(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db),
+    fields: Optional[str] = None
 ):
-    """获取当前用户的所有植物（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    """
+    获取当前用户的所有植物（仅VIP用户）
     
-    plants = db.query(MyPlant).filter(
-        MyPlant.user_id == current_user.id
-    ).order_by(MyPlant.created_at.desc()).all()
-    return plants
+    默认不返回 notes，需通过 fields 参数显式请求，完整内容见详情接口。支持 ETag 条件请求。
+    """
+    columns = select_fields(MyPlant, fields, MY_PLANT_LIST_FIELDS)
+    not_modified = await check_not_modified(
+        request, response, db, current_user.id, ("my_plants", "membership"), request.url.query
+    )
+    if not_modified:
+        return not_modified
+    await check_vip_access(db, current_user.id)
+    
+    result = await db.execute(
+        select(*columns).where(
+            MyPlant.user_id == current_user.id
+        ).order_by(MyPlant.created_at.desc())
+    )
+    return json_response([dict(row) for row in result.mappings()], response)
 
 @app.get("/my-plants/{plant_id}", response_model=MyPlantResponse)
 async def get_my_plant(
     plant_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取指定植物详情（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    await check_vip_access(db, current_user.id)
     
-    plant = db.query(MyPlant).filter(
-        MyPlant.id == plant_id,
-        MyPlant.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(MyPlant).where(
+            MyPlant.id == plant_id,
+            MyPlant.user_id == current_user.id
+        )
+    )
+    plant = result.scalars().first()
     
     if not plant:
         raise HTTPException(status_code=404, detail="植物不存在")
@@ -795,17 +1177,25 @@ async def get_my_plant(
 async def create_my_plant(
     plant: MyPlantCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建新的植物记录（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    await check_vip_access(db, current_user.id)
     
     # 如果提供了diagnosis_id，验证并获取诊断历史信息
     if plant.diagnosis_id:
-        diagnosis = db.query(DiagnosisHistory).filter(
-            DiagnosisHistory.id == plant.diagnosis_id,
-            DiagnosisHistory.user_id == current_user.id
-        ).first()
+        await write_behind_queue.wait_for_user(current_user.id)
+        diagnosis = None
+        for model in (DiagnosisHistory, DiagnosisHistoryArchive):
+            result = await db.execute(
+                select(model).where(
+                    model.id == plant.diagnosis_id,
+                    model.user_id == current_user.id
+                )
+            )
+            diagnosis = result.scalars().first()
+            if diagnosis:
+                break
         
         if not diagnosis:
             raise HTTPException(status_code=404, detail="诊断历史不存在")
@@ -820,10 +1210,8 @@ async def create_my_plant(
         if not plant.image_url:
             plant.image_url = diagnosis.image_url
     
-    # 计算下次浇水日期
-    next_watering_date = None
-    if plant.watering_frequency and plant.last_watered:
-        next_watering_date = plant.last_watered + timedelta(days=plant.watering_frequency)
+    # 计算下次浇水日期（浇水提醒由该规则展开，不再单独插入提醒行）
+    next_watering_date = next_occurrence(plant.last_watered, plant.watering_frequency)
     
     new_plant = MyPlant(
         user_id=current_user.id,
@@ -840,23 +1228,8 @@ async def create_my_plant(
     )
     
     db.add(new_plant)
-    db.commit()
-    db.refresh(new_plant)
-    
-    # 如果设置了浇水频率，创建浇水提醒
-    if next_watering_date:
-        watering_reminder = Reminder(
-            user_id=current_user.id,
-            plant_id=new_plant.id,
-            reminder_type="watering",
-            title=f"浇水提醒: {plant.nickname or plant.plant_name}",
-            message=f"该给 {plant.nickname or plant.plant_name} 浇水了！",
-            reminder_reason=f"根据{plant.watering_frequency}天的浇水周期，需要定期补充水分以保持土壤湿度。",
-            scheduled_date=datetime.combine(next_watering_date, datetime.min.time())
-        )
-        db.add(watering_reminder)
-        db.commit()
-    
+    await db.commit()
+    await db.refresh(new_plant)
     return new_plant
 
 @app.put("/my-plants/{plant_id}", response_model=MyPlantResponse)
@@ -864,15 +1237,18 @@ async def update_my_plant(
     plant_id: int,
     plant_update: MyPlantUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """更新植物信息（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    await check_vip_access(db, current_user.id)
     
-    plant = db.query(MyPlant).filter(
-        MyPlant.id == plant_id,
-        MyPlant.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(MyPlant).where(
+            MyPlant.id == plant_id,
+            MyPlant.user_id == current_user.id
+        )
+    )
+    plant = result.scalars().first()
     
     if not plant:
         raise HTTPException(status_code=404, detail="植物不存在")
@@ -882,147 +1258,114 @@ async def update_my_plant(
     for field, value in update_data.items():
         setattr(plant, field, value)
     
-    # 更新下次浇水日期
-    if plant.watering_frequency and plant.last_watered:
-        plant.next_watering_date = plant.last_watered + timedelta(days=plant.watering_frequency)
-        
-        # 更新或创建浇水提醒
-        existing_reminder = db.query(Reminder).filter(
-            Reminder.plant_id == plant_id,
-            Reminder.reminder_type == "watering",
-            Reminder.is_completed == False
-        ).first()
-        
-        if existing_reminder:
-            existing_reminder.scheduled_date = datetime.combine(plant.next_watering_date, datetime.min.time())
-            existing_reminder.title = f"浇水提醒: {plant.nickname or plant.plant_name}"
-            existing_reminder.message = f"该给 {plant.nickname or plant.plant_name} 浇水了！"
-            existing_reminder.reminder_reason = f"根据{plant.watering_frequency}天的浇水周期，需要定期补充水分以保持土壤湿度。"
-        else:
-            new_reminder = Reminder(
-                user_id=current_user.id,
-                plant_id=plant_id,
-                reminder_type="watering",
-                title=f"浇水提醒: {plant.nickname or plant.plant_name}",
-                message=f"该给 {plant.nickname or plant.plant_name} 浇水了！",
-                reminder_reason=f"根据{plant.watering_frequency}天的浇水周期，需要定期补充水分以保持土壤湿度。",
-                scheduled_date=datetime.combine(plant.next_watering_date, datetime.min.time())
-            )
-            db.add(new_reminder)
+    # 更新浇水规则（浇水提醒随之按新规则展开）
+    plant.next_watering_date = next_occurrence(plant.last_watered, plant.watering_frequency)
     
-    db.commit()
-    db.refresh(plant)
+    await db.commit()
+    await db.refresh(plant)
     return plant
 
 @app.delete("/my-plants/{plant_id}")
 async def delete_my_plant(
     plant_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """删除植物（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    """删除植物（仅VIP用户，关联的提醒由数据库外键级联删除）"""
+    await check_vip_access(db, current_user.id)
     
-    plant = db.query(MyPlant).filter(
-        MyPlant.id == plant_id,
-        MyPlant.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        delete(MyPlant).where(
+            MyPlant.id == plant_id,
+            MyPlant.user_id == current_user.id
+        )
+    )
     
-    if not plant:
+    if result.rowcount == 0:
         raise HTTPException(status_code=404, detail="植物不存在")
     
-    db.delete(plant)
-    db.commit()
+    await db.commit()
     return {"message": "植物已删除"}
 
 @app.post("/my-plants/{plant_id}/water")
 async def water_plant(
     plant_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """记录浇水（仅VIP用户）"""
-    check_vip_access(db, current_user.id)
+    await check_vip_access(db, current_user.id)
     
-    plant = db.query(MyPlant).filter(
-        MyPlant.id == plant_id,
-        MyPlant.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(MyPlant).where(
+            MyPlant.id == plant_id,
+            MyPlant.user_id == current_user.id
+        )
+    )
+    plant = result.scalars().first()
     
     if not plant:
         raise HTTPException(status_code=404, detail="植物不存在")
     
-    # 更新浇水记录
+    # 更新浇水记录：只更新植物这一行，浇水提醒按新的锚点重新展开
     plant.last_watered = date.today()
-    if plant.watering_frequency:
-        plant.next_watering_date = plant.last_watered + timedelta(days=plant.watering_frequency)
-        
-        # 标记当前浇水提醒为已完成
-        db.query(Reminder).filter(
-            Reminder.plant_id == plant_id,
-            Reminder.reminder_type == "watering",
-            Reminder.is_completed == False
-        ).update({"is_completed": True})
-        
-        # 创建下次浇水提醒
-        new_reminder = Reminder(
-            user_id=current_user.id,
-            plant_id=plant_id,
-            reminder_type="watering",
-            title=f"浇水提醒: {plant.nickname or plant.plant_name}",
-            message=f"该给 {plant.nickname or plant.plant_name} 浇水了！",
-            reminder_reason=f"根据{plant.watering_frequency}天的浇水周期，需要定期补充水分以保持土壤湿度。",
-            scheduled_date=datetime.combine(plant.next_watering_date, datetime.min.time())
-        )
-        db.add(new_reminder)
+    plant.next_watering_date = next_occurrence(plant.last_watered, plant.watering_frequency)
     
-    db.commit()
-    db.refresh(plant)
+    await db.commit()
+    await db.refresh(plant)
     return {"message": "浇水记录已更新", "next_watering_date": plant.next_watering_date}
 
 # ==================== 提醒相关路由 ====================
 
 @app.get("/reminders", response_model=List[ReminderResponse])
 async def get_reminders(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_read_db),
     reminder_type: str = None,
     is_completed: bool = None
 ):
-    """获取当前用户的提醒"""
-    query = db.query(Reminder).filter(Reminder.user_id == current_user.id)
+    """获取当前用户的提醒（植物浇水提醒由浇水规则展开，支持 ETag 条件请求）"""
+    await write_behind_queue.wait_for_user(current_user.id)
+    not_modified = await check_not_modified(request, response, db, current_user.id, ("reminders",), request.url.query)
+    if not_modified:
+        return not_modified
+    query = select(*REMINDER_COLUMNS).where(Reminder.user_id == current_user.id, exclude_watering_overrides())
     
     if reminder_type:
-        query = query.filter(Reminder.reminder_type == reminder_type)
+        query = query.where(Reminder.reminder_type == reminder_type)
     
     if is_completed is not None:
-        query = query.filter(Reminder.is_completed == is_completed)
-    
-    reminders = query.order_by(Reminder.scheduled_date).all()
-    return reminders
+        query = query.where(Reminder.is_completed == is_completed)
+    
+    result = await db.execute(query.order_by(Reminder.scheduled_date))
+    reminders = [dict(row) for row in result.mappings()]
+    
+    if reminder_type in (None, "", WATERING):
+        watering = await load_watering_reminders(db, MyPlant.user_id == current_user.id)
+        if is_completed is not None:
+            watering = [r for r in watering if r["is_completed"] == is_completed]
+        if watering:
+            reminders = sorted(
+                reminders + [{column.key: r[column.key] for column in REMINDER_COLUMNS} for r in watering],
+                key=lambda r: r["scheduled_date"]
+            )
+    return json_response(reminders, response)
 
 @app.get("/reminders/unread-count")
 async def get_unread_reminders_count(
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取未读提醒数量（提醒规则：执行日期在3天内的提醒都会显示）"""
-    current_time = datetime.now()
-    three_days_later = current_time + timedelta(days=3)
-    
-    count = db.query(Reminder).filter(
-        Reminder.user_id == current_user.id,
-        Reminder.is_read == False,
-        Reminder.is_completed == False,
-        Reminder.scheduled_date <= three_days_later  # 执行日期在3天内的都要提醒
-    ).count()
-    return {"unread_count": count}
+    return {"unread_count": await count_unread_reminders(db, current_user.id)}
 
 @app.post("/reminders", response_model=ReminderResponse)
 async def create_reminder(
     reminder: ReminderCreate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """创建新提醒"""
     new_reminder = Reminder(
@@ -1036,8 +1379,8 @@ async def create_reminder(
     )
     
     db.add(new_reminder)
-    db.commit()
-    db.refresh(new_reminder)
+    await db.commit()
+    await db.refresh(new_reminder)
     return new_reminder
 
 @app.put("/reminders/{reminder_id}", response_model=ReminderResponse)
@@ -1045,56 +1388,256 @@ async def update_reminder(
     reminder_id: int,
     reminder_update: ReminderUpdate,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """更新提醒状态"""
-    reminder = db.query(Reminder).filter(
-        Reminder.id == reminder_id,
-        Reminder.user_id == current_user.id
-    ).first()
+    """更新提醒状态（浇水规则展开的提醒会写入一条覆盖记录）"""
+    update_data = reminder_update.dict(exclude_unset=True)
+    plant_id = plant_id_of(reminder_id)
+    if plant_id is not None:
+        reminder = await materialize_watering_reminder(db, current_user.id, plant_id, update_data)
+        await db.commit()
+        return reminder
+    
+    result = await db.execute(
+        select(Reminder).where(
+            Reminder.id == reminder_id,
+            Reminder.user_id == current_user.id
+        )
+    )
+    reminder = result.scalars().first()
     
     if not reminder:
         raise HTTPException(status_code=404, detail="提醒不存在")
     
-    update_data = reminder_update.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(reminder, field, value)
     
-    db.commit()
-    db.refresh(reminder)
+    await db.commit()
+    await db.refresh(reminder)
     return reminder
 
 @app.delete("/reminders/{reminder_id}")
 async def delete_reminder(
     reminder_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """删除提醒"""
-    reminder = db.query(Reminder).filter(
-        Reminder.id == reminder_id,
-        Reminder.user_id == current_user.id
-    ).first()
+    """删除提醒（浇水规则展开的提醒只能忽略本次发生，记为已完成）"""
+    plant_id = plant_id_of(reminder_id)
+    if plant_id is not None:
+        await materialize_watering_reminder(db, current_user.id, plant_id, {"is_completed": True})
+        await db.commit()
+        return {"message": "提醒已删除"}
+    
+    result = await db.execute(
+        select(Reminder).where(
+            Reminder.id == reminder_id,
+            Reminder.user_id == current_user.id
+        )
+    )
+    reminder = result.scalars().first()
     
     if not reminder:
         raise HTTPException(status_code=404, detail="提醒不存在")
     
-    db.delete(reminder)
-    db.commit()
+    if reminder.is_watering_override:
+        # 删除覆盖记录会让本次发生重新出现，改为标记完成
+        reminder.is_completed = True
+    else:
+        await db.delete(reminder)
+    await db.commit()
     return {"message": "提醒已删除"}
 
+async def materialize_watering_reminder(db: AsyncSession, user_id: int, plant_id: int, values: dict):
+    """为植物当前一次浇水提醒写入（或更新）覆盖记录，返回该记录"""
+    watering = await load_watering_reminders(db, MyPlant.id == plant_id, MyPlant.user_id == user_id)
+    if not watering:
+        raise HTTPException(status_code=404, detail="提醒不存在")
+    if watering[0]["id"] > 0:
+        result = await db.execute(select(Reminder).where(Reminder.id == watering[0]["id"]))
+        reminder = result.scalars().first()
+        for field, value in values.items():
+            setattr(reminder, field, value)
+    else:
+        reminder = Reminder(
+            **{k: v for k, v in watering[0].items() if k not in ("id", "created_at")}, is_watering_override=True
+        )
+        for field, value in values.items():
+            setattr(reminder, field, value)
+        db.add(reminder)
+    await db.flush()
+    await db.refresh(reminder)
+    return reminder
+
+def reminder_bulk_conditions(user_id: int, request: ReminderBulkRequest) -> list:
+    """批量操作的筛选条件（始终限定在当前用户）；未给出任何筛选条件时返回 None"""
+    conditions = []
+    if request.ids is not None:
+        conditions.append(Reminder.id.in_(request.ids))
+    if request.reminder_type:
+        conditions.append(Reminder.reminder_type == request.reminder_type)
+    if request.plant_id is not None:
+        conditions.append(Reminder.plant_id == request.plant_id)
+    if request.is_completed is not None:
+        conditions.append(Reminder.is_completed == request.is_completed)
+    if request.scheduled_before is not None:
+        conditions.append(Reminder.scheduled_date < request.scheduled_before)
+    if not conditions:
+        return None
+    return [Reminder.user_id == user_id, *conditions]
+
+def watering_bulk_conditions(user_id: int, request: ReminderBulkRequest) -> Optional[list]:
+    """批量操作涉及的浇水规则（植物）筛选条件；不涉及尚未写入覆盖记录的浇水提醒时返回 None"""
+    conditions = [MyPlant.user_id == user_id]
+    if request.ids is not None:
+        plant_ids = [plant_id_of(i) for i in request.ids if i < 0]
+        if not plant_ids:
+            return None
+        conditions.append(MyPlant.id.in_(plant_ids))
+    if request.reminder_type and request.reminder_type != WATERING:
+        return None
+    if request.is_completed:
+        return None
+    if request.plant_id is not None:
+        conditions.append(MyPlant.id == request.plant_id)
+    if request.scheduled_before is not None:
+        # 发生时间为当天零点：零点早于 scheduled_before 即日期不晚于其前一微秒所在日期
+        conditions.append(MyPlant.next_watering_date <= (request.scheduled_before - timedelta(microseconds=1)).date())
+    return conditions
+
+@app.post("/reminders/mark-all-read", response_model=ReminderBulkResponse)
+async def mark_all_reminders_read(
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db),
+    reminder_type: str = None
+):
+    """将当前用户的未读提醒全部标记为已读（单条 UPDATE，浇水规则的当前发生另写入已读覆盖记录）"""
+    await write_behind_queue.wait_for_user(current_user.id)
+    query = update(Reminder).where(Reminder.user_id == current_user.id, Reminder.is_read == False, live_rows())
+    if reminder_type:
+        query = query.where(Reminder.reminder_type == reminder_type)
+    
+    result = await db.execute(query.values(is_read=True))
+    affected = result.rowcount
+    if reminder_type in (None, "", WATERING):
+        affected += await materialize_overrides(db, [MyPlant.user_id == current_user.id], {"is_read": True})
+    await db.commit()
+    return {"affected": affected}
+
+@app.post("/reminders/bulk-complete", response_model=ReminderBulkResponse)
+async def complete_reminders(
+    request: ReminderBulkRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按ID列表或筛选条件批量标记提醒为已完成（单条 UPDATE）"""
+    conditions = reminder_bulk_conditions(current_user.id, request)
+    if conditions is None:
+        raise HTTPException(status_code=400, detail="请提供提醒ID列表或筛选条件")
+    await write_behind_queue.wait_for_user(current_user.id)
+    
+    result = await db.execute(
+        update(Reminder).where(*conditions, Reminder.is_completed == False, live_rows())
+        .values(is_completed=True)
+    )
+    affected = result.rowcount
+    watering_conditions = watering_bulk_conditions(current_user.id, request)
+    if watering_conditions is not None:
+        affected += await materialize_overrides(db, watering_conditions, {"is_completed": True})
+    await db.commit()
+    return {"affected": affected}
+
+@app.post("/reminders/bulk-delete", response_model=ReminderBulkResponse)
+async def delete_reminders(
+    request: ReminderBulkRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """按ID列表或筛选条件批量删除提醒（单条 DELETE；浇水规则的发生只能忽略，记为已完成）"""
+    conditions = reminder_bulk_conditions(current_user.id, request)
+    if conditions is None:
+        raise HTTPException(status_code=400, detail="请提供提醒ID列表或筛选条件")
+    await write_behind_queue.wait_for_user(current_user.id)
+    
+    result = await db.execute(delete(Reminder).where(*conditions, exclude_watering_overrides()))
+    affected = result.rowcount
+    result = await db.execute(
+        update(Reminder).where(*conditions, WATERING_OVERRIDE, Reminder.is_completed == False, live_rows())
+        .values(is_completed=True)
+    )
+    affected += result.rowcount
+    watering_conditions = watering_bulk_conditions(current_user.id, request)
+    if watering_conditions is not None:
+        affected += await materialize_overrides(db, watering_conditions, {"is_completed": True})
+    await db.commit()
+    return {"affected": affected}
+
+@app.get("/reminders/calendar-url")
+async def get_reminder_calendar_url(request: Request, current_user: User = Depends(get_current_user)):
+    """获取提醒的日历订阅地址（可添加到系统日历、Google 日历等）"""
+    path = f"/calendar/{calendar_token(current_user.id, SECRET_KEY)}.ics"
+    return {"url": str(request.base_url).rstrip("/") + path}
+
+async def stream_calendar(user_id: int):
+    """逐条生成日历内容；使用独立会话，按行流式读取提醒，不在内存中拼接整个日历"""
+    yield calendar_header("植物养护提醒")
+    async with AsyncSessionLocal() as db:
+        rows = await db.stream(
+            select(Reminder.id, Reminder.title, Reminder.message, Reminder.scheduled_date).where(
+                Reminder.user_id == user_id,
+                Reminder.is_completed == False,
+                exclude_watering_overrides()
+            ).order_by(Reminder.scheduled_date)
+        )
+        async for reminder in rows:
+            yield reminder_event(reminder)
+        
+        plants = await db.execute(
+            scheduled_plants_query(MyPlant.user_id == user_id).with_only_columns(MyPlant.id, MyPlant.watering_frequency)
+        )
+        frequencies = dict(plants.all())
+        for reminder in await load_watering_reminders(db, MyPlant.user_id == user_id):
+            # 两次查询之间植物的浇水规则可能已被修改（新设置、取消或植物已删除）
+            frequency = frequencies.get(reminder["plant_id"])
+            if frequency:
+                yield watering_event(reminder, frequency)
+    yield calendar_footer()
+
+@app.get("/calendar/{token}.ics")
+async def get_reminder_calendar(token: str, request: Request, db: AsyncSession = Depends(get_async_db)):
+    """
+    提醒的 iCalendar 订阅源（订阅令牌鉴权）
+    
+    日历客户端轮询时带上 If-None-Match / If-Modified-Since，提醒没有变化则只查询一次版本号并返回 304。
+    """
+    user_id = parse_calendar_token(token, SECRET_KEY)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail="日历不存在")
+    version, updated_at = await get_version(db, user_id, "reminders")
+    headers = {"ETag": make_etag(user_id, "reminders", version, "ics"), "Cache-Control": "private, no-cache"}
+    if updated_at is not None:
+        headers["Last-Modified"] = http_date(updated_at)
+    if is_not_modified(request, headers["ETag"], updated_at):
+        return Response(status_code=304, headers=headers)
+    if version == 0 and (await db.execute(select(User.id).where(User.id == user_id))).first() is None:
+        raise HTTPException(status_code=404, detail="日历不存在")
+    return StreamingResponse(stream_calendar(user_id), media_type="text/calendar; charset=utf-8", headers=headers)
+
 @app.post("/reminders/create-reexamination/{plant_id}")
 async def create_reexamination_reminder(
     plant_id: int,
     days: int = 7,  # Default: remind after 7 days
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """为指定植物创建复查提醒"""
-    plant = db.query(MyPlant).filter(
-        MyPlant.id == plant_id,
-        MyPlant.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(MyPlant).where(
+            MyPlant.id == plant_id,
+            MyPlant.user_id == current_user.id
+        )
+    )
+    plant = result.scalars().first()
     
     if not plant:
         raise HTTPException(status_code=404, detail="植物不存在")
@@ -1112,10 +1655,28 @@ async def create_reexamination_reminder(
     )
     
     db.add(new_reminder)
-    db.commit()
-    db.refresh(new_reminder)
+    await db.commit()
+    await db.refresh(new_reminder)
     return new_reminder
 
+# ==================== 服务端推送 ====================
+
+@app.get("/events")
+async def stream_events(request: Request, access_token: str, db: AsyncSession = Depends(get_async_db)):
+    """
+    服务端推送（SSE）：未读提醒数量变化、提醒到期、诊断完成
+    
+    EventSource 无法设置请求头，访问令牌通过 access_token 查询参数传递。
+    """
+    current_user = await get_current_user(access_token, db)
+    # 鉴权后立即释放数据库连接，长连接期间不占用连接池
+    await db.close()
+    return StreamingResponse(
+        event_stream(push_hub, request, current_user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ==================== 图片上传相关路由 ====================
 
 @app.post("/upload-image")
@@ -1127,69 +1688,106 @@ async def upload_image(
     image_url = await save_image(file)
     return {"image_url": image_url, "message": "图片上传成功"}
 
+@app.get("/thumbs/{width}/{key:path}", include_in_schema=False)
+async def get_thumbnail(width: int, key: str, request: Request):
+    """
+    图片缩略图：宽度取不小于请求值的预设宽度，格式按 Accept 协商（见 thumbnails.py）。
+    缩略图尚未生成时当场生成；无法生成时重定向到原图。
+    """
+    image_url = f"/images/{key}"
+    if width <= 0 or key_from_url(image_url) is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    fmt = negotiate_format(request.headers.get("accept"))
+    try:
+        thumb_key = await thumbnail_worker.ensure(key, select_width(width), fmt)
+    except Exception as e:
+        print(f"缩略图生成失败 {key}: {e}")
+        return RedirectResponse(image_url, status_code=307)
+    if thumb_key is None:
+        raise HTTPException(status_code=404, detail="Not Found")
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "Vary": "Accept"}
+    if isinstance(image_store, LocalImageStore):
+        return FileResponse(image_store.path(thumb_key), media_type=FORMATS[fmt][1], headers=headers)
+    url = await run_in_threadpool(image_store.public_url, thumb_key)
+    return RedirectResponse(url, status_code=307, headers={"Cache-Control": "private, max-age=300", "Vary": "Accept"})
+
 # ==================== 产品管理 ====================
 
+def catalog_response(request: Request, body: bytes, etag: str) -> Response:
+    """商品目录响应：带 ETag / Cache-Control，客户端缓存仍有效时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={CATALOG_MAX_AGE_SECONDS}"}
+    if product_catalog.updated_at is not None:
+        headers["Last-Modified"] = http_date(product_catalog.updated_at)
+    if is_not_modified(request, etag, product_catalog.updated_at):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @app.get("/products", response_model=List[ProductResponse])
-def get_products(
-    category: Optional[str] = None,
-    db: Session = Depends(get_db)
-):
-    """获取所有产品列表，可选按分类筛选"""
-    query = db.query(Product)
-    if category and category != "全部商品":
-        query = query.filter(Product.category == category)
-    products = query.all()
-    return products
+async def get_products(request: Request, category: Optional[str] = None):
+    """获取所有产品列表，可选按分类筛选（由内存中的商品目录提供，不查询数据库）"""
+    await product_catalog.ensure_loaded()
+    category = category or ALL_CATEGORIES
+    return catalog_response(request, product_catalog.list_body(category), product_catalog.etag(f"list:{category}"))
 
 @app.get("/products/{product_id}", response_model=ProductResponse)
-def get_product(
-    product_id: int,
-    db: Session = Depends(get_db)
-):
+async def get_product(request: Request, product_id: int):
     """获取单个产品详情"""
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    await product_catalog.ensure_loaded()
+    body = product_catalog.product_body(product_id)
+    if body is None:
         raise HTTPException(status_code=404, detail="产品不存在")
-    return product
+    return catalog_response(request, body, product_catalog.etag(f"product:{product_id}"))
 
 # ==================== 订单管理 ====================
 
+async def load_order(db: AsyncSession, order_id: int) -> Order:
+    """加载订单并预取订单项及产品"""
+    result = await db.execute(
+        select(Order).options(
+            selectinload(Order.items).selectinload(OrderItem.product)
+        ).where(Order.id == order_id).execution_options(populate_existing=True)
+    )
+    return result.scalars().first()
+
 @app.post("/orders", response_model=OrderResponse)
-def create_order(
+async def create_order(
     order_data: OrderCreateRequest,
+    response: Response,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """创建新订单并处理支付"""
-    # 生成唯一订单号（使用UUID保证唯一性）
-    order_number = f"ORD{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-    
-    # 验证订单号唯一性（额外保险）
-    max_retries = 3
-    for _ in range(max_retries):
-        existing = db.query(Order).filter(Order.order_number == order_number).first()
-        if not existing:
-            break
-        order_number = f"ORD{datetime.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-    
-    # 计算总金额
-    total_amount = 0.0
+    """创建新订单并处理支付（支持 Idempotency-Key，重试不会创建重复订单）"""
+    return await idempotency_store.run(
+        current_user.id, "orders", idempotency_key,
+        lambda: place_order(order_data, current_user, db),
+        response, request_fingerprint(order_data.model_dump())
+    )
+
+async def place_order(order_data: OrderCreateRequest, current_user: User, db: AsyncSession) -> OrderResponse:
+    """按内存商品目录计价，写入订单与订单项"""
+    # 生成时间有序的唯一订单号（ULID，进程内单调、跨进程无冲突，无需预先查询；唯一约束兜底）
+    order_number = new_order_number()
+    
+    # 计算总金额（商品与整数分价格来自内存中的商品目录）
+    await product_catalog.ensure_loaded()
+    total_cents = 0
     order_items_data = []
     
     for item in order_data.items:
-        product = db.query(Product).filter(Product.id == item["product_id"]).first()
+        product = product_catalog.get(item["product_id"])
+        if not product and await product_catalog.refresh():
+            # 可能是其他 worker 刚添加的商品，目录刷新后再查一次
+            product = product_catalog.get(item["product_id"])
         if not product:
             raise HTTPException(status_code=404, detail=f"产品ID {item['product_id']} 不存在")
         
-        # 解析价格（去除¥符号并转换为浮点数）
-        price_str = product.price.replace('¥', '').strip()
-        try:
-            price = float(price_str)
-        except ValueError:
+        price_cents = product_catalog.price_cents(product.id)
+        if price_cents is None:
             raise HTTPException(status_code=400, detail=f"产品 {product.name} 的价格格式无效")
         
         quantity = item.get("quantity", 1)
-        total_amount += price * quantity
+        total_cents += price_cents * quantity
         
         order_items_data.append({
             "product_id": product.id,
@@ -1201,15 +1799,15 @@ def create_order(
     order = Order(
         user_id=current_user.id,
         order_number=order_number,
-        total_amount=f"¥{total_amount:.1f}",
+        total_amount=format_price(total_cents),
         payment_method=order_data.payment_method,
         transaction_hash=order_data.transaction_hash,
         wallet_address=order_data.wallet_address,
         status='paid'  # TODO: 在生产环境应验证区块链交易后再设置为paid
     )
     db.add(order)
-    db.commit()
-    db.refresh(order)
+    await db.commit()
+    await db.refresh(order)
     
     # 创建订单项
     for item_data in order_items_data:
@@ -1221,31 +1819,62 @@ def create_order(
         )
         db.add(order_item)
     
-    db.commit()
-    db.refresh(order)
+    await db.commit()
     
-    return order
+    # 重新加载订单及其订单项（异步会话不支持隐式懒加载）；转换为响应模型，重复请求直接返回同一结果
+    return OrderResponse.model_validate(await load_order(db, order.id))
 
 @app.get("/orders", response_model=List[OrderResponse])
-def get_user_orders(
+async def get_user_orders(
+    request: Request,
+    response: Response,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
-    """获取当前用户的所有订单"""
-    orders = db.query(Order).filter(Order.user_id == current_user.id).order_by(Order.created_at.desc()).all()
-    return orders
+    """获取当前用户的所有订单（支持 ETag 条件请求；订单项包含商品信息，ETag 随商品目录版本变化）"""
+    not_modified = await check_not_modified(
+        request, response, db, current_user.id, ("orders",), f"catalog:{product_catalog.version}"
+    )
+    if not_modified:
+        return not_modified
+    # 订单与订单项按响应字段投影为行字典，商品信息取自内存中的商品目录
+    result = await db.execute(
+        select(*ORDER_COLUMNS).where(Order.user_id == current_user.id).order_by(Order.created_at.desc())
+    )
+    orders = [dict(row) for row in result.mappings()]
+    by_id = {}
+    for order in orders:
+        order["items"] = []
+        by_id[order["id"]] = order
+    if by_id:
+        result = await db.execute(
+            select(*ORDER_ITEM_COLUMNS).where(OrderItem.order_id.in_(list(by_id))).order_by(OrderItem.id)
+        )
+        items = [dict(row) for row in result.mappings()]
+        await product_catalog.ensure_loaded()
+        if any(product_catalog.get(item["product_id"]) is None for item in items):
+            await product_catalog.refresh()
+        for item in items:
+            item["product"] = product_catalog.product_dict(item["product_id"])
+            by_id[item["order_id"]]["items"].append(item)
+    return json_response(orders, response)
 
 @app.get("/orders/{order_id}", response_model=OrderResponse)
-def get_order(
+async def get_order(
     order_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_read_db)
 ):
     """获取订单详情"""
-    order = db.query(Order).filter(
-        Order.id == order_id,
-        Order.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Order).options(
+            selectinload(Order.items).selectinload(OrderItem.product)
+        ).where(
+            Order.id == order_id,
+            Order.user_id == current_user.id
+        )
+    )
+    order = result.scalars().first()
     
     if not order:
         raise HTTPException(status_code=404, detail="订单不存在")
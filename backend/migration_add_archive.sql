@@ -0,0 +1,52 @@
+-- Migration script to add archive tables for diagnosis histories and completed reminders
+-- Run this script to update existing database (after migration_add_cascade_fks.sql)
+
+USE plant_health_db;
+
+-- my_plants.last_diagnosis_id 改为软引用（诊断历史归档后仍保留该ID）
+ALTER TABLE my_plants
+    DROP FOREIGN KEY my_plants_ibfk_2;
+
+-- 热表索引：归档任务按时间扫描
+CREATE INDEX ix_diagnosis_histories_created_at ON diagnosis_histories (created_at);
+CREATE INDEX ix_reminders_completed_scheduled ON reminders (is_completed, scheduled_date);
+
+-- Create diagnosis_histories_archive table
+CREATE TABLE IF NOT EXISTS diagnosis_histories_archive (
+    id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    plant_name VARCHAR(100) NOT NULL,
+    scientific_name VARCHAR(100),
+    status VARCHAR(50) NOT NULL,
+    problem_judgment TEXT,
+    severity VARCHAR(20),
+    severity_value INT,
+    handling_suggestions TEXT,
+    need_product BOOLEAN DEFAULT FALSE,
+    plant_introduction TEXT,
+    image_url VARCHAR(500),
+    created_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_diagnosis_histories_archive_user_created (user_id, created_at),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- Create reminders_archive table
+CREATE TABLE IF NOT EXISTS reminders_archive (
+    id INT PRIMARY KEY,
+    user_id INT NOT NULL,
+    plant_id INT,
+    reminder_type VARCHAR(20) NOT NULL,
+    title VARCHAR(200) NOT NULL,
+    message TEXT,
+    reminder_reason TEXT,
+    scheduled_date DATETIME NOT NULL,
+    is_completed BOOLEAN DEFAULT TRUE,
+    is_read BOOLEAN DEFAULT FALSE,
+    created_at DATETIME,
+    archived_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    INDEX ix_reminders_archive_user_id (user_id),
+    FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+SELECT 'Migration completed successfully!' AS status;
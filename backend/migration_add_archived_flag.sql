@@ -0,0 +1,12 @@
+-- Migration script to flag users that have archived diagnosis histories
+-- Run this script to update existing database (after migration_add_archive.sql)
+
+USE plant_health_db;
+
+-- /diagnosis-history 只对有归档记录的用户查询归档表
+ALTER TABLE users
+    ADD COLUMN has_archived_histories BOOLEAN NOT NULL DEFAULT FALSE;
+
+UPDATE users
+SET has_archived_histories = TRUE
+WHERE id IN (SELECT DISTINCT user_id FROM diagnosis_histories_archive);
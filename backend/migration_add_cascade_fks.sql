@@ -0,0 +1,44 @@
+-- Migration script to switch foreign keys to ON DELETE CASCADE / SET NULL
+-- Run this script to update existing database
+-- 外键名为 MySQL 自动生成的 <表名>_ibfk_<序号>，执行前可用 SHOW CREATE TABLE <表名> 确认
+
+USE plant_health_db;
+
+-- 会员、诊断历史：随用户删除
+ALTER TABLE memberships
+    DROP FOREIGN KEY memberships_ibfk_1,
+    ADD CONSTRAINT memberships_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE;
+
+ALTER TABLE diagnosis_histories
+    DROP FOREIGN KEY diagnosis_histories_ibfk_1,
+    ADD CONSTRAINT diagnosis_histories_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE;
+
+-- 我的植物：随用户删除；关联的诊断历史删除后置空
+ALTER TABLE my_plants
+    DROP FOREIGN KEY my_plants_ibfk_1,
+    DROP FOREIGN KEY my_plants_ibfk_2,
+    ADD CONSTRAINT my_plants_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    ADD CONSTRAINT my_plants_ibfk_2 FOREIGN KEY (last_diagnosis_id) REFERENCES diagnosis_histories (id) ON DELETE SET NULL;
+
+-- 提醒：随用户或植物删除（修复删除植物后遗留孤儿提醒的问题）
+ALTER TABLE reminders
+    DROP FOREIGN KEY reminders_ibfk_1,
+    DROP FOREIGN KEY reminders_ibfk_2,
+    ADD CONSTRAINT reminders_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE,
+    ADD CONSTRAINT reminders_ibfk_2 FOREIGN KEY (plant_id) REFERENCES my_plants (id) ON DELETE CASCADE;
+
+-- 订单、订单项：随用户 / 订单删除
+ALTER TABLE orders
+    DROP FOREIGN KEY orders_ibfk_1,
+    ADD CONSTRAINT orders_ibfk_1 FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE;
+
+ALTER TABLE order_items
+    DROP FOREIGN KEY order_items_ibfk_1,
+    ADD CONSTRAINT order_items_ibfk_1 FOREIGN KEY (order_id) REFERENCES orders (id) ON DELETE CASCADE;
+
+-- 清理已存在的孤儿提醒（对应植物已被删除）
+DELETE r FROM reminders r
+LEFT JOIN my_plants p ON r.plant_id = p.id
+WHERE r.plant_id IS NOT NULL AND p.id IS NULL;
+
+SELECT 'Migration completed successfully!' AS status;
@@ -0,0 +1,25 @@
+-- Migration script to add catalog versions (in-memory product catalog refresh)
+-- Run this script to update existing database (after migration_add_shop.sql)
+
+USE plant_health_db;
+
+-- 商品目录版本号，各 worker 定期检查并在变化时重新加载商品缓存
+CREATE TABLE IF NOT EXISTS catalog_versions (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+INSERT IGNORE INTO catalog_versions (name, version, updated_at) VALUES ('products', 1, NOW());
+
+-- 直接修改 products 表（后台、脚本）时同样递增版本号
+DROP TRIGGER IF EXISTS products_catalog_version_insert;
+DROP TRIGGER IF EXISTS products_catalog_version_update;
+DROP TRIGGER IF EXISTS products_catalog_version_delete;
+
+CREATE TRIGGER products_catalog_version_insert AFTER INSERT ON products FOR EACH ROW
+    UPDATE catalog_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
+CREATE TRIGGER products_catalog_version_update AFTER UPDATE ON products FOR EACH ROW
+    UPDATE catalog_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
+CREATE TRIGGER products_catalog_version_delete AFTER DELETE ON products FOR EACH ROW
+    UPDATE catalog_versions SET version = version + 1, updated_at = NOW() WHERE name = 'products';
@@ -0,0 +1,13 @@
+-- Migration script to add per-user resource versions (ETag / conditional GET)
+-- Run this script to update existing database
+
+USE plant_health_db;
+
+-- 按用户、按资源的变更版本号，随写入在同一事务内递增
+CREATE TABLE IF NOT EXISTS user_versions (
+    user_id INT NOT NULL,
+    resource VARCHAR(30) NOT NULL,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME NOT NULL,
+    PRIMARY KEY (user_id, resource)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
@@ -0,0 +1,20 @@
+-- Migration script to mark watering-rule override rows explicitly
+-- Run this script to update existing database (after migration_watering_recurrence.sql)
+
+USE plant_health_db;
+
+-- 浇水规则的覆盖记录改由 is_watering_override 标记，手动创建的关联植物的浇水提醒不再被当作覆盖记录隐藏
+ALTER TABLE reminders
+    ADD COLUMN is_watering_override BOOLEAN NOT NULL DEFAULT FALSE;
+
+ALTER TABLE reminders_archive
+    ADD COLUMN is_watering_override BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- 此前与植物关联的浇水提醒行（覆盖记录及旧版按次插入的提醒）都按覆盖记录处理，保持原有行为
+UPDATE reminders
+SET is_watering_override = TRUE
+WHERE reminder_type = 'watering' AND plant_id IS NOT NULL;
+
+UPDATE reminders_archive
+SET is_watering_override = TRUE
+WHERE reminder_type = 'watering' AND plant_id IS NOT NULL;
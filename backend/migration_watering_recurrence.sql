@@ -0,0 +1,15 @@
+-- Migration script for rule-based watering reminders (see watering.py)
+-- Run this script to update existing database (after migration_add_archived_flag.sql)
+
+USE plant_health_db;
+
+-- 植物浇水提醒改由 my_plants 的浇水规则展开，与植物关联的浇水提醒行只作为覆盖记录。
+-- 旧版每次浇水插入的提醒中，与当前发生时间不一致的未完成行已不再显示，标记为完成以便归档。
+UPDATE reminders r
+JOIN my_plants p ON p.id = r.plant_id
+SET r.is_completed = TRUE
+WHERE r.reminder_type = 'watering'
+  AND r.is_completed = FALSE
+  AND (p.watering_frequency IS NULL
+       OR p.next_watering_date IS NULL
+       OR r.scheduled_date <> TIMESTAMP(p.next_watering_date));
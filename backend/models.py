@@ -1,5 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Date, Text, text
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean, ForeignKey, Date, Text, Index, text
+from sqlalchemy.orm import relationship, backref
 from sqlalchemy.sql import func
 from database import Base
 
@@ -12,18 +12,19 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
     updated_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'), onupdate=text('CURRENT_TIMESTAMP'))
+    has_archived_histories = Column(Boolean, default=False, server_default=text('0'), nullable=False)  # 归档表中是否有该用户的诊断历史
     
-    # Relationships
-    membership = relationship("Membership", back_populates="user", uselist=False)
-    diagnosis_histories = relationship("DiagnosisHistory", back_populates="user", cascade="all, delete-orphan")
-    my_plants = relationship("MyPlant", back_populates="user", cascade="all, delete-orphan")
-    reminders = relationship("Reminder", back_populates="user", cascade="all, delete-orphan")
+    # Relationships（子表通过数据库 ON DELETE CASCADE 删除，passive_deletes 避免 ORM 逐行加载删除）
+    membership = relationship("Membership", back_populates="user", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    diagnosis_histories = relationship("DiagnosisHistory", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    my_plants = relationship("MyPlant", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
+    reminders = relationship("Reminder", back_populates="user", cascade="all, delete-orphan", passive_deletes=True)
 
 class Membership(Base):
     __tablename__ = "memberships"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), unique=True, nullable=False)
     is_vip = Column(Boolean, default=False, nullable=False)
     monthly_detections = Column(Integer, default=0, nullable=False)  # Current month's detection count
     last_reset_date = Column(Date, server_default=text('(CURRENT_DATE)'))  # Last time the count was reset
@@ -37,7 +38,7 @@ class DiagnosisHistory(Base):
     __tablename__ = "diagnosis_histories"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     plant_name = Column(String(100), nullable=False)
     scientific_name = Column(String(100))
     status = Column(String(50), nullable=False)
@@ -48,21 +49,44 @@ class DiagnosisHistory(Base):
     need_product = Column(Boolean, default=False)
     plant_introduction = Column(Text)
     image_url = Column(String(500))  # Store image path or URL
-    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'), index=True)
     
     # Relationship
     user = relationship("User", back_populates="diagnosis_histories")
 
+class DiagnosisHistoryArchive(Base):
+    """已归档的诊断历史（超过保留期的记录从热表批量迁移至此）"""
+    __tablename__ = "diagnosis_histories_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 保留原诊断历史ID
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    plant_name = Column(String(100), nullable=False)
+    scientific_name = Column(String(100))
+    status = Column(String(50), nullable=False)
+    problem_judgment = Column(Text)
+    severity = Column(String(20))
+    severity_value = Column(Integer)
+    handling_suggestions = Column(Text)  # JSON string
+    need_product = Column(Boolean, default=False)
+    plant_introduction = Column(Text)
+    image_url = Column(String(500))
+    created_at = Column(DateTime)
+    archived_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    
+    __table_args__ = (
+        Index("ix_diagnosis_histories_archive_user_created", "user_id", "created_at"),
+    )
+
 class MyPlant(Base):
     __tablename__ = "my_plants"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     plant_name = Column(String(100), nullable=False)
     scientific_name = Column(String(100))
     nickname = Column(String(100))  # User-given nickname
     status = Column(String(50))
-    last_diagnosis_id = Column(Integer, ForeignKey("diagnosis_histories.id"))  # Reference to last diagnosis
+    last_diagnosis_id = Column(Integer)  # Reference to last diagnosis（软引用：诊断历史可能已归档，不加外键）
     image_url = Column(String(500))
     notes = Column(Text)  # User notes
     watering_frequency = Column(Integer)  # Days between watering
@@ -78,8 +102,8 @@ class Reminder(Base):
     __tablename__ = "reminders"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    plant_id = Column(Integer, ForeignKey("my_plants.id"))  # Optional: link to a specific plant
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    plant_id = Column(Integer, ForeignKey("my_plants.id", ondelete="CASCADE"))  # Optional: link to a specific plant
     reminder_type = Column(String(20), nullable=False)  # 'watering', 're_examination'
     title = Column(String(200), nullable=False)
     message = Column(Text)
@@ -88,9 +112,32 @@ class Reminder(Base):
     is_completed = Column(Boolean, default=False)
     is_read = Column(Boolean, default=False)
     created_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
+    is_watering_override = Column(Boolean, default=False, server_default=text('0'), nullable=False)  # 浇水规则某次发生的覆盖记录（见 watering.py）
     
     # Relationship
     user = relationship("User", back_populates="reminders")
+    
+    __table_args__ = (
+        Index("ix_reminders_completed_scheduled", "is_completed", "scheduled_date"),
+    )
+
+class ReminderArchive(Base):
+    """已归档的提醒（已完成且超过保留期的提醒从热表批量迁移至此）"""
+    __tablename__ = "reminders_archive"
+    
+    id = Column(Integer, primary_key=True, autoincrement=False)  # 保留原提醒ID
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    plant_id = Column(Integer)  # 不加外键：植物删除后归档记录仍保留
+    reminder_type = Column(String(20), nullable=False)
+    title = Column(String(200), nullable=False)
+    message = Column(Text)
+    reminder_reason = Column(Text)
+    scheduled_date = Column(DateTime, nullable=False)
+    is_completed = Column(Boolean, default=True)
+    is_read = Column(Boolean, default=False)
+    created_at = Column(DateTime)
+    is_watering_override = Column(Boolean, default=False, server_default=text('0'), nullable=False)
+    archived_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'))
 
 class Product(Base):
     __tablename__ = "products"
@@ -112,7 +159,7 @@ class Order(Base):
     __tablename__ = "orders"
     
     id = Column(Integer, primary_key=True, index=True)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     order_number = Column(String(50), unique=True, nullable=False)
     total_amount = Column(String(20), nullable=False)  # Store as string
     payment_method = Column(String(20))  # 'eth', 'ckb'
@@ -123,14 +170,14 @@ class Order(Base):
     updated_at = Column(DateTime, server_default=text('CURRENT_TIMESTAMP'), onupdate=text('CURRENT_TIMESTAMP'))
     
     # Relationship
-    user = relationship("User", backref="orders")
-    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
+    user = relationship("User", backref=backref("orders", cascade="all, delete-orphan", passive_deletes=True))
+    items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan", passive_deletes=True)
 
 class OrderItem(Base):
     __tablename__ = "order_items"
     
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"), nullable=False)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
     quantity = Column(Integer, nullable=False, default=1)
     price = Column(String(20), nullable=False)  # Price at time of order
@@ -138,3 +185,33 @@ class OrderItem(Base):
     # Relationship
     order = relationship("Order", back_populates="items")
     product = relationship("Product", back_populates="order_items")
+
+class IdSequence(Base):
+    __tablename__ = "id_sequences"
+    
+    name = Column(String(50), primary_key=True)  # 序列名称，通常为表名
+    next_value = Column(BigInteger, nullable=False)  # 下一个可分配的ID块起点
+
+class SchedulerCheckpoint(Base):
+    """后台调度器的处理进度（重启后据此补发停机期间的事件）"""
+    __tablename__ = "scheduler_checkpoints"
+    
+    name = Column(String(50), primary_key=True)  # 调度器名称
+    processed_until = Column(DateTime, nullable=False)  # 已处理到的时间点
+
+class UserVersion(Base):
+    """按用户、按资源的变更版本号（每次写入递增），用于 ETag / 条件请求"""
+    __tablename__ = "user_versions"
+    
+    user_id = Column(Integer, primary_key=True, autoincrement=False)  # 不加外键：注销账户时随用户数据一起删除
+    resource = Column(String(30), primary_key=True)  # reminders / my_plants / ...
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)  # 最近一次变更时间（Last-Modified）
+
+class CatalogVersion(Base):
+    """全局目录数据（如商品）的版本号，数据变更时递增，各 worker 据此刷新内存缓存"""
+    __tablename__ = "catalog_versions"
+    
+    name = Column(String(50), primary_key=True)  # 目录名称，通常为表名
+    version = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False)
@@ -0,0 +1,295 @@
+"""
+服务端推送（Server-Sent Events）
+
+前端以 EventSource 连接 GET /events，服务端在以下情况推送事件，取代每次操作后轮询
+/reminders 与 /reminders/unread-count：
+  - unread_count：未读提醒数量变化（来自 reminder_counters 的增量计数）
+  - reminder_due：提醒进入提醒窗口（来自提醒调度器的 "due" 事件）
+  - diagnosis_completed：诊断历史已落库（write-behind 写入或重放提交后）
+
+进程内按用户维护连接（每个连接一个有界队列，队列满时丢弃最旧的事件），空闲连接只有定期的心跳注释，
+不产生任何请求或数据库访问。
+
+多 worker 部署时，各 worker 通过消息代理互相转发消息（PUSH_BROKER_URL=tcp://host:port，
+代理为 push_broker.py，作为 Redis Pub/Sub 等正式代理的本地替代）；未配置时使用进程内代理。
+  - 诊断完成事件由提交写入的 worker 经代理发布，由持有该用户连接的 worker 推送
+  - 提醒相关事件由各 worker 自己的调度器产生、只推送给本 worker 的连接；为避免其他 worker 要等到
+    下一次全量刷新才能看到变化，提交了提醒写入的 worker 经代理广播涉及的用户，其他 worker 收到后
+    让本地调度器增量刷新这些用户
+"""
+import asyncio
+import json
+import os
+import uuid
+from datetime import datetime
+from typing import Optional
+from urllib.parse import urlparse
+
+from sqlalchemy import event
+
+from database import PrimarySession
+from models import DiagnosisHistory
+from reminder_scheduler import reminder_scheduler
+from reminder_counters import unread_counters
+
+PUSH_BROKER_URL = os.getenv("PUSH_BROKER_URL", "")  # 为空时使用进程内代理
+PUSH_KEEPALIVE_SECONDS = float(os.getenv("PUSH_KEEPALIVE_SECONDS", "15"))  # 心跳间隔
+PUSH_CLIENT_QUEUE_SIZE = int(os.getenv("PUSH_CLIENT_QUEUE_SIZE", "100"))  # 每个连接最多缓存的事件数
+PUSH_RECONNECT_SECONDS = float(os.getenv("PUSH_RECONNECT_SECONDS", "1"))  # 与代理断开后的首次重连间隔
+# 单个连接的最长时间，到期后由客户端自动重连（重新分散到各 worker，也避免长连接阻塞进程退出）
+PUSH_MAX_CONNECTION_SECONDS = float(os.getenv("PUSH_MAX_CONNECTION_SECONDS", "300"))
+PUSH_CLIENT_RETRY_MS = 3000  # 客户端断线重连间隔（SSE retry 字段）
+
+# 提醒快照中推送给前端的字段
+REMINDER_PUSH_FIELDS = ("id", "plant_id", "reminder_type", "title", "scheduled_date")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化 {type(value).__name__}")
+
+
+def dumps(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, default=_json_default)
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    return f"event: {event_type}\ndata: {dumps(data)}\n\n"
+
+
+class LocalBroker:
+    """进程内代理：发布的消息直接交给本进程处理（单 worker）"""
+
+    def __init__(self):
+        self._handler = None
+
+    async def start(self, handler):
+        self._handler = handler
+
+    async def stop(self):
+        self._handler = None
+
+    def publish(self, message: dict):
+        if self._handler is not None:
+            self._handler(message)
+
+
+class TcpBroker:
+    """
+    连接 push_broker.py 的代理客户端：每条消息为一行 JSON，代理转发给所有连接（包括发布者自己）。
+    与代理断开期间发布的消息只在本进程处理，后台按指数退避重连。
+    """
+
+    def __init__(self, host: str, port: int, reconnect_interval: float = PUSH_RECONNECT_SECONDS):
+        self.host = host
+        self.port = port
+        self.reconnect_interval = reconnect_interval
+        self._handler = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler):
+        self._handler = handler
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._close()
+
+    def _close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def publish(self, message: dict):
+        if self._writer is None or self._writer.is_closing():
+            self._handler(message)
+            return
+        self._writer.write((dumps(message) + "\n").encode("utf-8"))
+
+    async def _run(self):
+        delay = self.reconnect_interval
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                delay = self.reconnect_interval
+                while line := await reader.readline():
+                    try:
+                        self._handler(json.loads(line))
+                    except Exception as e:
+                        print(f"推送消息处理失败: {e}")
+                print("推送代理连接已断开，稍后重连")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"连接推送代理失败，{delay:.0f} 秒后重试: {e}")
+            self._close()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
+
+
+def create_broker(url: str = PUSH_BROKER_URL):
+    if not url:
+        return LocalBroker()
+    parsed = urlparse(url)
+    if parsed.scheme != "tcp" or not parsed.hostname or not parsed.port:
+        raise ValueError(f"不支持的 PUSH_BROKER_URL: {url}（应为 tcp://host:port）")
+    return TcpBroker(parsed.hostname, parsed.port)
+
+
+class PushHub:
+    """按用户维护 SSE 连接并分发事件"""
+
+    def __init__(self, broker=None, queue_size: int = PUSH_CLIENT_QUEUE_SIZE):
+        self.broker = broker or create_broker()
+        self.queue_size = queue_size
+        self.node_id = uuid.uuid4().hex  # 区分消息来源的 worker
+        self._clients = {}  # user_id -> 连接队列集合
+        self._started = False
+
+    @property
+    def connections(self) -> int:
+        return sum(len(queues) for queues in self._clients.values())
+
+    async def start(self):
+        await self.broker.start(self._on_message)
+        self._started = True
+
+    async def stop(self):
+        self._started = False
+        await self.broker.stop()
+        # 通知所有连接结束
+        for queues in self._clients.values():
+            for queue in queues:
+                self._put(queue, None)
+
+    # ---------- 连接 ----------
+
+    def connect(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._clients.setdefault(user_id, set()).add(queue)
+        return queue
+
+    def disconnect(self, user_id: int, queue: asyncio.Queue):
+        queues = self._clients.get(user_id)
+        if queues is not None:
+            queues.discard(queue)
+            if not queues:
+                self._clients.pop(user_id, None)
+
+    def has_clients(self, user_id: int) -> bool:
+        return user_id in self._clients
+
+    @staticmethod
+    def _put(queue: asyncio.Queue, item):
+        if queue.full():
+            # 慢连接：丢弃最旧的事件（计数等事件携带的是最新状态，丢弃旧值无妨）
+            queue.get_nowait()
+        queue.put_nowait(item)
+
+    def send(self, user_id: int, event_type: str, data: dict):
+        """推送给本进程内该用户的所有连接"""
+        for queue in self._clients.get(user_id, ()):
+            self._put(queue, format_sse(event_type, data))
+
+    # ---------- 跨 worker ----------
+
+    def publish(self, user_id: int, event_type: str, data: dict):
+        """经代理推送给该用户在任一 worker 上的连接"""
+        if self._started:
+            self.broker.publish({"kind": "event", "user_id": user_id, "event": event_type, "data": data})
+
+    def _on_message(self, message: dict):
+        if message["kind"] == "event":
+            self.send(message["user_id"], message["event"], message["data"])
+        elif message["kind"] == "reminder_users" and message["origin"] != self.node_id:
+            user_ids = message["user_ids"]
+            reminder_scheduler.mark_dirty(None if user_ids is None else set(user_ids))
+
+    def _on_reminder_commit(self, user_ids: Optional[set]):
+        if self._started and not isinstance(self.broker, LocalBroker):
+            self.broker.publish({
+                "kind": "reminder_users",
+                "origin": self.node_id,
+                "user_ids": None if user_ids is None else sorted(user_ids),
+            })
+
+    # ---------- 本地事件来源 ----------
+
+    def _on_unread_count(self, user_id: int, count: int):
+        self.send(user_id, "unread_count", {"unread_count": count})
+
+    def _on_scheduler_event(self, payload: dict):
+        if payload["type"] != "due":
+            return
+        reminder = payload["reminder"]
+        if self.has_clients(reminder["user_id"]):
+            self.send(reminder["user_id"], "reminder_due", {k: reminder.get(k) for k in REMINDER_PUSH_FIELDS})
+
+    def attach(self):
+        """订阅提醒调度器、未读计数器与提交提醒写入的通知"""
+        reminder_scheduler.subscribe(self._on_scheduler_event)
+        reminder_scheduler.on_commit(self._on_reminder_commit)
+        unread_counters.on_change(self._on_unread_count)
+
+
+async def event_stream(hub: PushHub, request, user_id: int, max_duration: float = PUSH_MAX_CONNECTION_SECONDS):
+    """单个 SSE 连接的事件流：先发送当前未读数量，之后转发推送事件，空闲时发送心跳注释"""
+    queue = hub.connect(user_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_duration
+    try:
+        yield f"retry: {PUSH_CLIENT_RETRY_MS}\n\n"
+        if unread_counters.ready:
+            yield format_sse("unread_count", {"unread_count": unread_counters.get(user_id)})
+        while loop.time() < deadline:
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=min(PUSH_KEEPALIVE_SECONDS, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                break
+            yield message
+    finally:
+        hub.disconnect(user_id, queue)
+
+
+push_hub = PushHub()
+push_hub.attach()
+
+
+# ==================== 诊断完成事件 ====================
+# write-behind 以多行 INSERT 写入诊断历史，提交后按行推送（重放落盘批次时同样适用）。
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _track_diagnosis_inserts(orm_execute_state):
+    if not orm_execute_state.is_insert or not orm_execute_state.parameters:
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.local_table.name != DiagnosisHistory.__tablename__:
+        return
+    params = orm_execute_state.parameters
+    completed = orm_execute_state.session.info.setdefault("completed_diagnoses", [])
+    for row in params if isinstance(params, list) else [params]:
+        completed.append({
+            "user_id": row["user_id"],
+            "data": {"id": row.get("id"), "plant_name": row.get("plant_name"), "status": row.get("status")},
+        })
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _publish_completed_diagnoses(session):
+    for item in session.info.pop("completed_diagnoses", ()):
+        push_hub.publish(item["user_id"], "diagnosis_completed", item["data"])
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_completed_diagnoses(session):
+    session.info.pop("completed_diagnoses", None)
@@ -0,0 +1,50 @@
+"""
+推送消息代理（本地替代 Redis Pub/Sub）
+
+多 worker 部署时各 worker 通过 PUSH_BROKER_URL=tcp://host:port 连接本代理。
+协议为每行一条 JSON 消息，代理把收到的每条消息原样转发给所有连接（包括发布者）。
+代理不保存消息，没有连接时消息直接丢弃。
+
+运行：
+    python push_broker.py [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import asyncio
+
+PUSH_BROKER_MAX_LINE = 1024 * 1024  # 单条消息上限
+
+
+class Broker:
+    def __init__(self):
+        self._writers = set()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while line := await reader.readline():
+                for target in list(self._writers):
+                    if target.is_closing():
+                        self._writers.discard(target)
+                        continue
+                    target.write(line)
+        except (ConnectionError, asyncio.LimitOverrunError, ValueError) as e:
+            print(f"推送代理连接异常: {e}")
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+
+async def serve(host: str, port: int):
+    broker = Broker()
+    server = await asyncio.start_server(broker.handle, host, port, limit=PUSH_BROKER_MAX_LINE)
+    print(f"推送代理已启动: tcp://{host}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="推送消息代理")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port))
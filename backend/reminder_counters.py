@@ -0,0 +1,121 @@
+"""
+未读提醒计数器
+
+/reminders/unread-count 在页面加载和每次提醒操作后都会被轮询。计数器在内存中按用户维护
+"已进入提醒窗口、未完成、未读"的提醒数量，由提醒调度器的事件增量更新：
+  - due：提醒进入窗口（到时或新建/修改后已在窗口内），未读则 +1
+  - updated：窗口内的提醒被修改（如标记已读），按前后未读状态增减
+  - cleared：提醒离开窗口（完成、删除、改期），原先未读则 -1
+  - reset：调度器初始加载完成，从调度器状态整体重建
+
+create_reminder / update_reminder / delete_reminder / water_plant / update_my_plant 以及 /predict
+的自动提醒都经由主库会话提交，提交后调度器增量刷新对应用户并发出上述事件，计数器随之更新。
+另有后台任务每隔 UNREAD_COUNTER_RECONCILE_SECONDS 让调度器从数据库全量重新加载，再以加载结果
+核对并修正计数偏差（重新加载与核对之间没有让出事件循环，期间不会有事件插入）。
+"""
+import asyncio
+import os
+
+from reminder_scheduler import reminder_scheduler
+
+UNREAD_COUNTER_RECONCILE_SECONDS = float(os.getenv("UNREAD_COUNTER_RECONCILE_SECONDS", "300"))  # 与数据库核对的间隔
+
+
+def _is_unread(reminder) -> bool:
+    return reminder is not None and reminder.get("due", True) and not reminder.get("is_read")
+
+
+class UnreadReminderCounters:
+    """按用户维护的未读提醒计数（只保存计数大于 0 的用户）"""
+
+    def __init__(self, scheduler=reminder_scheduler, reconcile_interval: float = UNREAD_COUNTER_RECONCILE_SECONDS):
+        self.scheduler = scheduler
+        self.reconcile_interval = reconcile_interval
+        self._counts = {}
+        self._ready = False
+        self._listeners = []
+        scheduler.subscribe(self._on_event)
+
+    @property
+    def ready(self) -> bool:
+        return self._ready and self.scheduler.ready
+
+    def get(self, user_id: int) -> int:
+        return self._counts.get(user_id, 0)
+
+    def on_change(self, callback):
+        """用户的计数发生变化时调用 callback(user_id, count)（整体重建时不调用）"""
+        self._listeners.append(callback)
+
+    def _notify(self, user_id: int):
+        for callback in list(self._listeners):
+            try:
+                callback(user_id, self.get(user_id))
+            except Exception as e:
+                print(f"未读提醒计数变化通知失败: {e}")
+
+    def _add(self, user_id: int, delta: int):
+        count = self._counts.get(user_id, 0) + delta
+        if count > 0:
+            self._counts[user_id] = count
+        else:
+            self._counts.pop(user_id, None)
+        self._notify(user_id)
+
+    def _on_event(self, event: dict):
+        if event["type"] == "reset":
+            self.rebuild()
+            return
+        if event["replayed"]:
+            # 补发事件对应的提醒已计入 reset 时的重建结果
+            return
+        reminder, previous = event["reminder"], event["previous"]
+        if event["type"] == "due":
+            delta = int(_is_unread(reminder))
+        elif event["type"] == "updated":
+            delta = int(_is_unread(reminder)) - int(_is_unread(previous))
+        else:
+            delta = -int(_is_unread(previous))
+        if delta:
+            self._add(reminder["user_id"], delta)
+
+    def _expected_counts(self) -> dict:
+        counts = {}
+        for user_id in self.scheduler.due_users():
+            count = sum(1 for r in self.scheduler.due_reminders(user_id) if not r["is_read"])
+            if count:
+                counts[user_id] = count
+        return counts
+
+    def rebuild(self):
+        """从调度器的到期状态整体重建计数"""
+        self._counts = self._expected_counts()
+        self._ready = True
+
+    async def reconcile(self) -> int:
+        """从数据库重新加载后核对计数，返回修正的用户数"""
+        await self.scheduler.reload()
+        expected = self._expected_counts()
+        fixed = [
+            user_id for user_id in set(expected) | set(self._counts)
+            if expected.get(user_id, 0) != self._counts.get(user_id, 0)
+        ]
+        self._counts = expected
+        for user_id in fixed:
+            self._notify(user_id)
+        return len(fixed)
+
+    async def reconcile_loop(self):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            if not self.ready:
+                continue
+            try:
+                fixed = await self.reconcile()
+                if fixed:
+                    print(f"未读提醒计数核对：修正了 {fixed} 个用户")
+            except Exception as e:
+                print(f"未读提醒计数核对失败，稍后重试: {e}")
+
+
+unread_counters = UnreadReminderCounters()
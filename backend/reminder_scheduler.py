@@ -0,0 +1,402 @@
+"""
+提醒到期调度器
+
+提醒在执行日期前 REMINDER_DUE_WINDOW_DAYS 天进入"到期"状态（即前端显示为未读提醒的时间窗口）。
+调度器在后台维护这一状态，而不是在每次请求时重新计算：
+  1. 启动时从 reminders 表（及植物浇水规则，见 watering.py）加载未完成、且将在预读范围（窗口 + REMINDER_SCHEDULER_LOOKAHEAD_HOURS）内
+     到期的提醒；已进入窗口的直接置为到期，其余按窗口开启时间放入最小堆
+  2. 后台任务在堆顶提醒的窗口开启时将其移入到期状态，并向订阅者发出 "due" 事件
+  3. 主库会话提交了涉及提醒的写入后（ORM 对象、批量 update/delete/insert、删除植物的级联删除），
+     对应用户被标记为待刷新，由后台任务增量重新加载该用户的提醒并发出相应事件
+  4. 每隔 REMINDER_SCHEDULER_REFRESH_SECONDS 全量重新加载一次并推进预读范围，
+     用于覆盖其他 worker 进程的写入
+
+事件为字典：{"type": "due" | "updated" | "cleared", "reminder": 提醒快照, "previous": 变化前快照,
+"replayed": 是否为重启后补发}；初始加载完成时发出 {"type": "reset"}，订阅者据此从调度器状态重建。
+到期状态在进程内维护，重启后从数据库重建。已处理到的时间点定期写入 scheduler_checkpoints 表，
+重启时对窗口在该时间点之后（停机期间）开启的提醒补发 "due" 事件，更早的直接置为到期；
+检查点写入间隔内发出的事件在崩溃重启后可能重复（至少一次）。
+"""
+import asyncio
+import heapq
+import inspect
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from sqlalchemy import event, select
+
+from database import AsyncSessionLocal, PrimarySession
+from models import Reminder, MyPlant, User, SchedulerCheckpoint
+from watering import exclude_watering_overrides, load_watering_reminders
+
+REMINDER_DUE_WINDOW_DAYS = int(os.getenv("REMINDER_DUE_WINDOW_DAYS", "3"))  # 执行日期前多少天开始提醒
+REMINDER_SCHEDULER_ENABLED = os.getenv("REMINDER_SCHEDULER_ENABLED", "true").lower() == "true"
+REMINDER_SCHEDULER_LOOKAHEAD_HOURS = float(os.getenv("REMINDER_SCHEDULER_LOOKAHEAD_HOURS", "24"))  # 预读范围
+REMINDER_SCHEDULER_REFRESH_SECONDS = float(os.getenv("REMINDER_SCHEDULER_REFRESH_SECONDS", "60"))  # 全量刷新间隔
+REMINDER_SCHEDULER_RETRY_SECONDS = float(os.getenv("REMINDER_SCHEDULER_RETRY_SECONDS", "1"))  # 刷新失败后的首次重试间隔
+
+CHECKPOINT_NAME = "reminder_scheduler"
+
+REMINDER_DUE_WINDOW = timedelta(days=REMINDER_DUE_WINDOW_DAYS)
+
+# 调度器关心的提醒字段
+REMINDER_FIELDS = ("id", "user_id", "plant_id", "reminder_type", "title", "scheduled_date", "is_read")
+
+# 写入这些表可能改变提醒（删除植物/用户会级联删除提醒）
+REMINDER_AFFECTING_TABLES = {Reminder.__tablename__, MyPlant.__tablename__, User.__tablename__}
+
+
+class ReminderScheduler:
+    """基于最小堆的提醒到期调度器"""
+
+    def __init__(
+        self,
+        window: timedelta = REMINDER_DUE_WINDOW,
+        lookahead: timedelta = timedelta(hours=REMINDER_SCHEDULER_LOOKAHEAD_HOURS),
+        refresh_interval: float = REMINDER_SCHEDULER_REFRESH_SECONDS,
+        retry_interval: float = REMINDER_SCHEDULER_RETRY_SECONDS,
+    ):
+        self.window = window
+        self.lookahead = lookahead
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._entries = {}  # reminder_id -> 提醒快照
+        self._heap = []  # (窗口开启时间, reminder_id)，惰性删除
+        self._due_by_user = {}  # user_id -> 已到期的 reminder_id 集合
+        self._loaded_until: Optional[datetime] = None  # 已加载的执行日期上限
+        self._last_reload = 0.0
+        self._failures = 0
+        self._initialized = False
+        self._dirty_users = set()
+        self._reload_requested = False
+        self._subscribers = []
+        self._commit_listeners = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    @property
+    def ready(self) -> bool:
+        """到期状态已从数据库加载完成，可以代替查询直接使用"""
+        return self.running and self._initialized
+
+    # ---------- 订阅 ----------
+
+    def subscribe(self, callback: Callable) -> Callable:
+        """订阅到期事件，callback(event) 可以是普通函数或协程函数；返回取消订阅函数"""
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback) if callback in self._subscribers else None
+
+    def on_commit(self, callback: Callable):
+        """本进程提交了提醒写入时调用 callback(user_ids)（None 表示无法确定涉及的用户），如用于通知其他 worker"""
+        self._commit_listeners.append(callback)
+
+    def notify_committed(self, user_ids: Optional[set]):
+        self.mark_dirty(user_ids)
+        for callback in list(self._commit_listeners):
+            try:
+                callback(user_ids)
+            except Exception as e:
+                print(f"提醒写入通知处理失败: {e}")
+
+    def _emit(self, event_type: str, reminder: dict, previous: Optional[dict] = None, replayed: bool = False):
+        payload = {"type": event_type, "reminder": dict(reminder), "previous": previous, "replayed": replayed}
+        for callback in list(self._subscribers):
+            try:
+                result = callback(payload)
+                if inspect.isawaitable(result):
+                    asyncio.ensure_future(result)
+            except Exception as e:
+                print(f"提醒事件订阅者处理失败: {e}")
+
+    # ---------- 查询 ----------
+
+    def is_due(self, reminder_id: int) -> bool:
+        entry = self._entries.get(reminder_id)
+        return entry is not None and entry["due"]
+
+    def due_users(self) -> list:
+        """当前有到期提醒的用户"""
+        self._advance(datetime.now())
+        return list(self._due_by_user)
+
+    def due_reminders(self, user_id: int) -> list:
+        """该用户当前处于提醒窗口内的未完成提醒（按执行日期排序）"""
+        self._advance(datetime.now())
+        ids = self._due_by_user.get(user_id, ())
+        return sorted((dict(self._entries[i]) for i in ids), key=lambda r: r["scheduled_date"])
+
+    # ---------- 生命周期 ----------
+
+    async def start(self):
+        self._wakeup = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._initialized = False
+        try:
+            await self._initial_load()
+        except Exception as e:
+            # 数据库暂不可用时不阻塞应用启动，由后台任务重试
+            print(f"提醒调度器初始加载失败，稍后重试: {e}")
+        self._task = asyncio.create_task(self._run())
+
+    async def _initial_load(self):
+        """从数据库重建到期状态，并补发停机期间进入窗口的提醒"""
+        checkpoint = await self._load_checkpoint()
+        await self.reload(emit=False)
+        self._initialized = True
+        self._emit("reset", {})
+        if checkpoint is not None:
+            for entry in sorted(self._entries.values(), key=lambda e: e["opens_at"]):
+                if entry["due"] and entry["opens_at"] > checkpoint:
+                    self._emit("due", entry, replayed=True)
+        await self._save_checkpoint()
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            if not self._initialized:
+                return
+            try:
+                self._advance(datetime.now())
+                await self._save_checkpoint()
+            except Exception as e:
+                print(f"提醒调度器保存检查点失败: {e}")
+
+    async def _load_checkpoint(self) -> Optional[datetime]:
+        async with AsyncSessionLocal() as db:
+            checkpoint = await db.get(SchedulerCheckpoint, CHECKPOINT_NAME)
+            return checkpoint.processed_until if checkpoint else None
+
+    async def _save_checkpoint(self):
+        """记录已处理到的时间点：窗口在此之前开启的提醒都已发出过事件"""
+        processed_until = datetime.now()
+        async with AsyncSessionLocal() as db:
+            checkpoint = await db.get(SchedulerCheckpoint, CHECKPOINT_NAME)
+            if checkpoint is None:
+                db.add(SchedulerCheckpoint(name=CHECKPOINT_NAME, processed_until=processed_until))
+            else:
+                checkpoint.processed_until = processed_until
+            await db.commit()
+
+    def mark_dirty(self, user_ids=None):
+        """标记需要重新加载的用户（None 表示全量重新加载），由后台任务合并处理"""
+        if not self.running:
+            return
+        if user_ids is None:
+            self._reload_requested = True
+        else:
+            self._dirty_users.update(user_ids)
+        self._wakeup.set()
+
+    async def wait_for_user(self, user_id: int):
+        """若该用户有待处理或进行中的刷新则等待其完成，保证随后读取到自己刚提交的提醒变更"""
+        if not self.running:
+            return
+        if user_id in self._dirty_users or self._reload_requested or self._lock.locked():
+            # 后台任务可能已取走该用户的刷新请求，先等待进行中的加载结束
+            async with self._lock:
+                pass
+            if user_id in self._dirty_users or self._reload_requested:
+                await self._process_dirty()
+
+    # ---------- 加载 ----------
+
+    async def _load(self, user_ids: Optional[set] = None) -> dict:
+        """加载预读范围内的未完成提醒：普通提醒行 + 按植物浇水规则展开的浇水提醒"""
+        query = select(*(getattr(Reminder, f) for f in REMINDER_FIELDS)).where(
+            Reminder.is_completed == False,
+            Reminder.scheduled_date <= self._loaded_until,
+            exclude_watering_overrides(),
+        )
+        plant_conditions = [MyPlant.next_watering_date <= self._loaded_until.date()]
+        if user_ids is not None:
+            query = query.where(Reminder.user_id.in_(user_ids))
+            plant_conditions.append(MyPlant.user_id.in_(user_ids))
+        async with AsyncSessionLocal() as db:
+            rows = [dict(row) for row in (await db.execute(query)).mappings()]
+            rows += [r for r in await load_watering_reminders(db, *plant_conditions) if not r["is_completed"]]
+        return {row["id"]: row for row in rows}
+
+    async def reload(self, emit: bool = True):
+        """全量重新加载预读范围内的未完成提醒，并推进预读范围"""
+        async with self._lock:
+            self._loaded_until = datetime.now() + self.window + self.lookahead
+            pending_users, self._dirty_users = self._dirty_users, set()
+            self._reload_requested = False
+            try:
+                loaded = await self._load()
+            except Exception:
+                # 加载失败时保留刷新请求，下次重试
+                self._dirty_users |= pending_users
+                self._reload_requested = True
+                raise
+            self._apply(loaded, set(self._entries), emit)
+            self._last_reload = time.monotonic()
+
+    async def reload_users(self, user_ids: set):
+        """增量重新加载指定用户的提醒"""
+        async with self._lock:
+            user_ids = set(user_ids)
+            self._dirty_users -= user_ids
+            try:
+                loaded = await self._load(user_ids)
+            except Exception:
+                self._dirty_users |= user_ids
+                raise
+            scope = {i for i, entry in self._entries.items() if entry["user_id"] in user_ids}
+            self._apply(loaded, scope, emit=True)
+
+    async def _process_dirty(self):
+        if not self._initialized:
+            return
+        if self._reload_requested:
+            await self.reload()
+        elif self._dirty_users:
+            await self.reload_users(set(self._dirty_users))
+
+    def _apply(self, loaded: dict, scope: set, emit: bool):
+        """用加载结果替换 scope 内的提醒：scope 中未出现在结果里的提醒视为已完成或已删除"""
+        for reminder_id in scope - loaded.keys():
+            self._remove(reminder_id, emit)
+        now = datetime.now()
+        for reminder_id, row in loaded.items():
+            self._upsert(row, now, emit)
+
+    def _upsert(self, row: dict, now: datetime, emit: bool):
+        previous = self._entries.get(row["id"])
+        entry = {f: row[f] for f in REMINDER_FIELDS}
+        entry["opens_at"] = row["scheduled_date"] - self.window
+        entry["due"] = entry["opens_at"] <= now
+        if previous is not None and {f: previous[f] for f in REMINDER_FIELDS} == {f: entry[f] for f in REMINDER_FIELDS}:
+            return
+        self._entries[entry["id"]] = entry
+        if entry["due"]:
+            self._due_by_user.setdefault(entry["user_id"], set()).add(entry["id"])
+        else:
+            self._discard_due(previous or entry)
+            heapq.heappush(self._heap, (entry["opens_at"], entry["id"]))
+        if not emit:
+            return
+        was_due = previous is not None and previous["due"]
+        if entry["due"] and not was_due:
+            self._emit("due", entry, previous)
+        elif entry["due"]:
+            self._emit("updated", entry, previous)
+        elif was_due:
+            self._emit("cleared", entry, previous)
+
+    def _remove(self, reminder_id: int, emit: bool):
+        entry = self._entries.pop(reminder_id, None)
+        if entry is None:
+            return
+        self._discard_due(entry)
+        if emit and entry["due"]:
+            self._emit("cleared", entry, entry)
+
+    def _discard_due(self, entry: dict):
+        ids = self._due_by_user.get(entry["user_id"])
+        if ids is not None:
+            ids.discard(entry["id"])
+            if not ids:
+                del self._due_by_user[entry["user_id"]]
+
+    def _advance(self, now: datetime):
+        """把窗口已开启的提醒从堆中移入到期状态"""
+        while self._heap and self._heap[0][0] <= now:
+            opens_at, reminder_id = heapq.heappop(self._heap)
+            entry = self._entries.get(reminder_id)
+            # 惰性删除：已删除、已到期或执行日期被修改过的堆项直接丢弃
+            if entry is None or entry["due"] or entry["opens_at"] != opens_at:
+                continue
+            entry["due"] = True
+            self._due_by_user.setdefault(entry["user_id"], set()).add(reminder_id)
+            self._emit("due", entry)
+
+    async def _run(self):
+        while True:
+            try:
+                if not self._initialized:
+                    await self._initial_load()
+                elif time.monotonic() - self._last_reload >= self.refresh_interval:
+                    await self.reload()
+                    self._advance(datetime.now())
+                    await self._save_checkpoint()
+                await self._process_dirty()
+                self._advance(datetime.now())
+                self._failures = 0
+            except Exception as e:
+                # 数据库不可用时指数退避，避免刷新过期后每轮都立即重试
+                self._failures += 1
+                delay = min(self.retry_interval * 2 ** (self._failures - 1), self.refresh_interval)
+                print(f"提醒调度器刷新失败，{delay:.0f}秒后重试: {e}")
+                await asyncio.sleep(delay)
+                continue
+
+            timeout = self.refresh_interval - (time.monotonic() - self._last_reload)
+            if self._heap:
+                timeout = min(timeout, (self._heap[0][0] - datetime.now()).total_seconds())
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+
+reminder_scheduler = ReminderScheduler()
+
+
+# ==================== 写入跟踪 ====================
+# 主库会话提交了涉及提醒的写入后，通知调度器增量重新加载对应用户的提醒。
+
+def _touched_users(session) -> set:
+    return session.info.setdefault("reminder_users", set())
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _track_flushed_reminders(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, (Reminder, MyPlant)):
+            _touched_users(session).add(obj.user_id)
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _track_reminder_statements(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None or mapper.local_table.name not in REMINDER_AFFECTING_TABLES:
+        return
+    session = orm_execute_state.session
+    users = _touched_users(session)
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and params:
+        # 多行 INSERT（如 write-behind 写入自动提醒）按行中的 user_id 标记
+        users.update(row.get("user_id") for row in (params if isinstance(params, list) else [params]))
+    elif session.info.get("user_id") is not None:
+        users.add(session.info["user_id"])
+    else:
+        # 无法确定涉及的用户（如后台批量任务），全量重新加载
+        session.info["reminder_reload"] = True
+
+
+@event.listens_for(PrimarySession, "after_commit")
+def _notify_reminder_scheduler(session):
+    users = session.info.pop("reminder_users", None)
+    if session.info.pop("reminder_reload", False):
+        reminder_scheduler.notify_committed(None)
+    elif users:
+        reminder_scheduler.notify_committed(users - {None})
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_reminder_tracking(session):
+    session.info.pop("reminder_users", None)
+    session.info.pop("reminder_reload", None)
@@ -47,6 +47,7 @@ class DetectionResult(BaseModel):
     reminder_type: str = None  # 提醒类型：浇水提醒/复查提醒/无
     reminder_reason: str = None  # 提醒原因说明
     reminder_days: int = None  # 建议多少天后提醒
+    recommended_products: List["ProductResponse"] = []  # 需要产品时按匹配程度排序的推荐商品
 
 # 会员状态响应
 class MembershipResponse(BaseModel):
@@ -89,6 +90,22 @@ class DiagnosisHistoryResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# 诊断历史列表响应（稀疏字段集：仅包含请求的字段）
+class DiagnosisHistorySummary(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    plant_name: Optional[str] = None
+    scientific_name: Optional[str] = None
+    status: Optional[str] = None
+    problem_judgment: Optional[str] = None
+    severity: Optional[str] = None
+    severity_value: Optional[int] = None
+    handling_suggestions: Optional[str] = None  # JSON string
+    need_product: Optional[bool] = None
+    plant_introduction: Optional[str] = None
+    image_url: Optional[str] = None
+    created_at: Optional[datetime] = None
+
 # 我的植物创建请求
 class MyPlantCreate(BaseModel):
     plant_name: str = Field(..., min_length=1, max_length=100)
@@ -132,6 +149,23 @@ class MyPlantResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# 我的植物列表响应（稀疏字段集：仅包含请求的字段）
+class MyPlantSummary(BaseModel):
+    id: int
+    user_id: Optional[int] = None
+    plant_name: Optional[str] = None
+    scientific_name: Optional[str] = None
+    nickname: Optional[str] = None
+    status: Optional[str] = None
+    last_diagnosis_id: Optional[int] = None
+    image_url: Optional[str] = None
+    notes: Optional[str] = None
+    watering_frequency: Optional[int] = None
+    last_watered: Optional[date] = None
+    next_watering_date: Optional[date] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
 # 提醒创建请求
 class ReminderCreate(BaseModel):
     plant_id: Optional[int] = None
@@ -146,6 +180,18 @@ class ReminderUpdate(BaseModel):
     is_completed: Optional[bool] = None
     is_read: Optional[bool] = None
 
+# 批量提醒操作请求：ids 与筛选条件同时给出时取交集
+class ReminderBulkRequest(BaseModel):
+    ids: Optional[List[int]] = Field(None, max_length=1000, description="提醒ID列表")
+    reminder_type: Optional[str] = None
+    plant_id: Optional[int] = None
+    is_completed: Optional[bool] = None
+    scheduled_before: Optional[datetime] = None  # 执行日期早于该时间
+
+# 批量提醒操作响应
+class ReminderBulkResponse(BaseModel):
+    affected: int
+
 # 提醒响应
 class ReminderResponse(BaseModel):
     id: int
@@ -178,6 +224,9 @@ class ProductResponse(BaseModel):
     class Config:
         from_attributes = True
 
+# DetectionResult.recommended_products 引用了在其后定义的 ProductResponse
+DetectionResult.model_rebuild()
+
 # 订单项响应
 class OrderItemResponse(BaseModel):
     id: int
@@ -0,0 +1,169 @@
+"""
+图片缩略图（派生图）
+
+列表页（我的植物、诊断历史）只需要小图，原图最大 10MB。上传后由后台任务生成几种宽度的缩略图，
+与原图存放在同一个图片存储中（键为 thumbs/<宽度>/<原图键去掉扩展名>.<格式>）：
+  - 宽度：THUMBNAIL_WIDTHS（默认 160 / 320 / 640），不放大小于该宽度的原图
+  - 格式：WebP；安装了 pillow-avif-plugin 时同时生成 AVIF；不支持二者的客户端按需生成 JPEG
+
+客户端通过 /thumbs/<宽度>/<原图键> 访问（如 /thumbs/320/3f/a2/3fa2…c9.jpg）：
+请求的宽度取不小于它的最小预设宽度，格式按 Accept 协商（avif > webp > jpeg），响应带 Vary: Accept。
+缩略图不存在（后台任务尚未处理、队列已满被丢弃、其他 worker 上传的图片）时当场生成并保存，
+同一缩略图的并发请求只生成一次。后台队列在各 worker 进程内，进程退出时未处理的项由按需生成兜底。
+"""
+import asyncio
+import io
+import os
+from pathlib import Path
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps
+
+from image_store import image_store, key_from_url
+
+try:
+    import pillow_avif  # noqa: F401  注册 AVIF 编码器
+except ImportError:
+    pass
+
+THUMBNAIL_WIDTHS = tuple(sorted(int(w) for w in os.getenv("THUMBNAIL_WIDTHS", "160,320,640").split(",")))
+THUMBNAIL_QUALITY = int(os.getenv("THUMBNAIL_QUALITY", "75"))
+THUMBNAIL_QUEUE_SIZE = int(os.getenv("THUMBNAIL_QUEUE_SIZE", "1000"))  # 后台队列长度，满时丢弃（按需生成兜底）
+
+THUMBNAIL_PREFIX = "thumbs"
+AVIF_ENABLED = "AVIF" in Image.SAVE
+
+# 格式 -> (扩展名, Content-Type, Pillow 格式名)
+FORMATS = {
+    "avif": (".avif", "image/avif", "AVIF"),
+    "webp": (".webp", "image/webp", "WEBP"),
+    "jpeg": (".jpg", "image/jpeg", "JPEG"),
+}
+
+# 上传后预先生成的格式
+PREGENERATED_FORMATS = ("avif", "webp") if AVIF_ENABLED else ("webp",)
+
+
+def select_width(requested: int) -> int:
+    """不小于请求宽度的最小预设宽度（超过最大值时取最大值）"""
+    for width in THUMBNAIL_WIDTHS:
+        if width >= requested:
+            return width
+    return THUMBNAIL_WIDTHS[-1]
+
+
+def negotiate_format(accept: str) -> str:
+    accept = accept or ""
+    if AVIF_ENABLED and "image/avif" in accept:
+        return "avif"
+    if "image/webp" in accept:
+        return "webp"
+    return "jpeg"
+
+
+def thumbnail_key(key: str, width: int, fmt: str) -> str:
+    return f"{THUMBNAIL_PREFIX}/{width}/{Path(key).with_suffix('')}{FORMATS[fmt][0]}"
+
+
+def derivative_keys(key: str) -> list:
+    """原图所有可能存在的缩略图键（删除原图时一并删除）"""
+    return [thumbnail_key(key, width, fmt) for width in THUMBNAIL_WIDTHS for fmt in FORMATS]
+
+
+def render_thumbnail(image: Image.Image, width: int, fmt: str) -> bytes:
+    """按宽度等比缩小（不放大）并编码"""
+    thumb = image
+    if image.width > width:
+        thumb = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS, reducing_gap=3.0)
+    has_alpha = thumb.mode in ("RGBA", "LA", "PA") or "transparency" in thumb.info
+    mode = "RGBA" if has_alpha and fmt != "jpeg" else "RGB"
+    if thumb.mode != mode:
+        thumb = thumb.convert(mode)
+    buf = io.BytesIO()
+    thumb.save(buf, FORMATS[fmt][2], quality=THUMBNAIL_QUALITY)
+    return buf.getvalue()
+
+
+def open_original(data: bytes, width: int) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    # JPEG 按目标尺寸以缩小比例解码，大图只需解码一小部分像素（两边都不小于目标宽度，EXIF 旋转后仍够用）
+    image.draft("RGB", (width, width))
+    return ImageOps.exif_transpose(image)
+
+
+def generate_thumbnails(key: str, widths=THUMBNAIL_WIDTHS, formats=PREGENERATED_FORMATS) -> int:
+    """生成原图尚不存在的缩略图，返回生成的数量。会阻塞，在线程池中调用"""
+    missing = [(w, f) for w in widths for f in formats if not image_store.exists(thumbnail_key(key, w, f))]
+    if not missing:
+        return 0
+    data = image_store.read(key)
+    if data is None:
+        return 0
+    image = open_original(data, max(w for w, _ in missing))
+    for width, fmt in missing:
+        image_store.put(thumbnail_key(key, width, fmt), render_thumbnail(image, width, fmt))
+    return len(missing)
+
+
+class ThumbnailWorker:
+    """上传后的缩略图生成队列（一个后台任务逐个处理，不占用请求路径）"""
+
+    def __init__(self, queue_size: int = THUMBNAIL_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._queue = None
+        self._task = None
+        self._inflight = {}  # 缩略图键 -> 按需生成任务
+        self.dropped = 0
+
+    def enqueue(self, image_url: str):
+        key = key_from_url(image_url)
+        if key is None or self._queue is None:
+            return
+        try:
+            self._queue.put_nowait(key)
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def ensure(self, key: str, width: int, fmt: str) -> Optional[str]:
+        """确保缩略图存在（不存在时生成），返回缩略图键；原图不存在返回 None"""
+        thumb_key = thumbnail_key(key, width, fmt)
+        if await run_in_threadpool(image_store.exists, thumb_key):
+            return thumb_key
+        task = self._inflight.get(thumb_key)
+        if task is None:
+            task = asyncio.ensure_future(run_in_threadpool(generate_thumbnails, key, (width,), (fmt,)))
+            self._inflight[thumb_key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(thumb_key, None))
+        generated = await asyncio.shield(task)
+        return thumb_key if generated or await run_in_threadpool(image_store.exists, thumb_key) else None
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        while True:
+            key = await self._queue.get()
+            try:
+                await run_in_threadpool(generate_thumbnails, key)
+            except Exception as e:
+                print(f"缩略图生成失败 {key}: {e}")
+
+
+thumbnail_worker = ThumbnailWorker()
+
+
+def delete_thumbnails(image_url: str):
+    """删除原图的全部缩略图。会阻塞，在后台任务中调用"""
+    key = key_from_url(image_url)
+    if key is None:
+        return
+    for thumb_key in derivative_keys(key):
+        image_store.delete(thumb_key)
@@ -0,0 +1,178 @@
+"""
+图片上传的流式接收
+
+上传不再整体读入内存（await file.read()）再检查大小、再写出：
+  - UploadSizeLimitMiddleware 在解析请求体之前按 Content-Length 拒绝超限的上传，
+    未声明长度（分块传输）时边接收边计数，一旦超过上限立即返回 413，不再接收剩余数据
+  - 接口中按 UPLOAD_CHUNK_SIZE 分块读取上传文件，同时写入临时文件、计算 SHA-256，
+    开头的数据先经过头部校验（格式、尺寸，见 image_validation.py），通过后才送入增量解码器
+    （/predict 直接得到解码后的图片，不再从内存字节重新解析）
+  - 读取完成后临时文件原子地移动到内容寻址的存储位置（见 image_store.py）
+每个上传占用的内存只有一个分块（加上需要时的解码结果），与文件大小无关。
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Optional
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageFile
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+from image_store import image_store, content_key, image_url_for
+from image_validation import ImageHeader, probe_header, reject, rejection_counts, TOO_LARGE, CORRUPT_DATA
+
+MAX_IMAGE_SIZE = int(os.getenv("MAX_IMAGE_SIZE", str(10 * 1024 * 1024)))  # 单张图片上限（字节），默认 10MB
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+MULTIPART_OVERHEAD = 64 * 1024  # multipart 边界与表单头部的余量
+UPLOAD_PATHS = ("/predict", "/upload-image")
+
+
+def too_large_detail() -> str:
+    return f"文件过大。最大支持 {MAX_IMAGE_SIZE / 1024 / 1024}MB"
+
+
+class UploadSizeLimitMiddleware:
+    """限制上传接口的请求体大小，超限时尽早返回 413"""
+
+    def __init__(self, app, paths=UPLOAD_PATHS, max_body_size: int = MAX_IMAGE_SIZE + MULTIPART_OVERHEAD):
+        self.app = app
+        self.paths = set(paths)
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        content_length = Headers(scope=scope).get("content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_size:
+            rejection_counts[TOO_LARGE] += 1
+            response = JSONResponse({"detail": too_large_detail()}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # 在表单解析中抛出，由异常处理返回 413
+                    reject(TOO_LARGE, too_large_detail(), 413)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class ReceivedUpload:
+    """已写入临时文件的上传"""
+
+    def __init__(self, path: Path, digest: str, size: int, header: ImageHeader, image: Optional[Image.Image] = None):
+        self.path = path
+        self.digest = digest
+        self.size = size
+        self.header = header  # 头部校验得到的格式与宽高
+        self.image = image  # decode=True 时为解码后的图片
+
+    def discard(self):
+        self.path.unlink(missing_ok=True)
+
+
+def _feed(parser: ImageFile.Parser, data: bytes):
+    try:
+        parser.feed(data)
+    except Exception:
+        reject(CORRUPT_DATA)
+
+
+def _receive(src, max_size: int, allowed_formats, decode: bool) -> ReceivedUpload:
+    digest = hashlib.sha256()
+    parser = ImageFile.Parser() if decode else None
+    header = None
+    prefix = b""  # 头部校验通过前缓存的开头数据
+    size = 0
+    incoming = image_store.incoming_dir()
+    fd, tmp = tempfile.mkstemp(dir=incoming, prefix=".upload-")
+    path = Path(tmp)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_size:
+                    reject(TOO_LARGE, too_large_detail(), 413)
+                out.write(chunk)
+                digest.update(chunk)
+                if header is None:
+                    prefix += chunk
+                    header = probe_header(prefix, allowed_formats)
+                    if header is None:
+                        continue
+                    chunk, prefix = prefix, b""
+                if parser is not None:
+                    _feed(parser, chunk)
+        if header is None:
+            header = probe_header(prefix, allowed_formats, final=True)
+            if parser is not None:
+                _feed(parser, prefix)
+        image = None
+        if parser is not None:
+            try:
+                image = parser.close()
+            except Exception:
+                reject(CORRUPT_DATA)
+    except BaseException:
+        path.unlink(missing_ok=True)
+        raise
+    return ReceivedUpload(path, digest.hexdigest(), size, header, image)
+
+
+def _digest(src) -> str:
+    digest = hashlib.sha256()
+    while True:
+        chunk = src.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return digest.hexdigest()
+        digest.update(chunk)
+
+
+async def upload_digest(file: UploadFile) -> str:
+    """分块计算上传内容的 SHA-256（不写临时文件、不解码），用作幂等请求的指纹"""
+    await file.seek(0)
+    try:
+        return await run_in_threadpool(_digest, file.file)
+    finally:
+        await file.seek(0)
+
+
+async def receive_upload(
+    file: UploadFile, allowed_formats, max_size: int = MAX_IMAGE_SIZE, decode: bool = False
+) -> ReceivedUpload:
+    """
+    分块读取上传文件到临时文件，同时计算内容哈希；头部校验通过后，decode=True 时同时增量解码。
+    超过 max_size 时返回 413，格式不在 allowed_formats 中、头部损坏、尺寸超限或无法解码时返回 400。
+    """
+    await file.seek(0)
+    return await run_in_threadpool(_receive, file.file, max_size, allowed_formats, decode)
+
+
+def _store(upload: ReceivedUpload) -> str:
+    # 扩展名取自识别出的格式，与上传的文件名无关
+    key = content_key(upload.digest, upload.header.extension)
+    try:
+        image_store.put_file(key, upload.path)
+    finally:
+        upload.discard()
+    return image_url_for(key)
+
+
+async def store_upload(upload: ReceivedUpload) -> str:
+    """把临时文件移动到内容寻址的存储位置（已存在相同内容时复用），返回 image_url"""
+    return await run_in_threadpool(_store, upload)
@@ -0,0 +1,170 @@
+"""
+按用户、按资源的变更版本号
+
+主库会话在提交前检查本事务写入了哪些表、涉及哪些用户，并在同一事务内把对应资源的版本号加一
+（user_versions 表，MySQL 用 INSERT ... ON DUPLICATE KEY UPDATE，SQLite 用 ON CONFLICT）。
+版本号随数据一起提交，不会出现数据已变而版本号未变的窗口，多个 worker 之间也保持一致。
+读取接口用版本号生成 ETag / Last-Modified，客户端带着匹配的 If-None-Match 请求时只需一次主键查询即可返回 304。
+
+涉及的用户取自会话的 session.info["user_id"]（由 get_current_user 设置），或批量 INSERT 各行的 user_id
+（write-behind）。无法确定用户的写入（归档任务的 INSERT ... SELECT 与集合删除）不递增版本号：
+归档不改变接口返回的内容。会话中删除了用户（注销账户）时也不再递增。
+"""
+import hashlib
+import hmac
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from sqlalchemy import event, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import PrimarySession
+from models import (
+    User, Membership, DiagnosisHistory, DiagnosisHistoryArchive, MyPlant, Reminder, Order, OrderItem, UserVersion
+)
+
+# 表 -> 受影响的资源
+TABLE_RESOURCES = {
+    Reminder.__tablename__: ("reminders",),
+    MyPlant.__tablename__: ("my_plants", "reminders"),  # 浇水规则展开为浇水提醒
+    DiagnosisHistory.__tablename__: ("diagnosis_history",),
+    DiagnosisHistoryArchive.__tablename__: ("diagnosis_history",),
+    Order.__tablename__: ("orders",),
+    OrderItem.__tablename__: ("orders",),
+    Membership.__tablename__: ("membership",),
+}
+
+
+async def get_version(db, user_id: int, resource: str) -> tuple:
+    """返回 (版本号, 最近变更时间)；从未写入过的资源为 (0, None)"""
+    result = await db.execute(
+        select(UserVersion.version, UserVersion.updated_at).where(
+            UserVersion.user_id == user_id,
+            UserVersion.resource == resource
+        )
+    )
+    row = result.first()
+    return (row.version, row.updated_at) if row else (0, None)
+
+
+async def get_versions(db, user_id: int, resources) -> dict:
+    """一次查询多个资源的 (版本号, 最近变更时间)，用于响应内容同时取决于多个资源的接口"""
+    result = await db.execute(
+        select(UserVersion.resource, UserVersion.version, UserVersion.updated_at).where(
+            UserVersion.user_id == user_id,
+            UserVersion.resource.in_(resources)
+        )
+    )
+    found = {row.resource: (row.version, row.updated_at) for row in result}
+    return {resource: found.get(resource, (0, None)) for resource in resources}
+
+
+def make_etag(user_id: int, resource: str, version, variant: str = "") -> str:
+    """ETag 由用户、资源、版本号（及查询参数等变体）派生"""
+    digest = hashlib.sha1(f"{user_id}:{resource}:{version}:{variant}".encode()).hexdigest()[:16]
+    return f'W/"{digest}"'
+
+
+def http_date(value: datetime) -> str:
+    """数据库时间为服务器本地时间，转换为 HTTP 日期（GMT）"""
+    return format_datetime(value.astimezone().astimezone(timezone.utc), usegmt=True)
+
+
+def is_not_modified(request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    """按 If-None-Match（优先）或 If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*"
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return int(last_modified.astimezone().timestamp()) <= int(since.timestamp())
+    return False
+
+
+def sign(value: str, secret: str) -> str:
+    return hmac.new(secret.encode(), value.encode(), hashlib.sha256).hexdigest()[:32]
+
+
+# ==================== 写入跟踪 ====================
+
+def _touched(session) -> dict:
+    return session.info.setdefault("version_touched", {})
+
+
+def _mark(session, user_id, resources):
+    if user_id is None:
+        return
+    _touched(session).setdefault(user_id, set()).update(resources)
+
+
+@event.listens_for(PrimarySession, "after_flush")
+def _track_flushed_objects(session, flush_context):
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        resources = TABLE_RESOURCES.get(getattr(obj, "__tablename__", None))
+        if resources:
+            _mark(session, getattr(obj, "user_id", None) or session.info.get("user_id"), resources)
+
+
+@event.listens_for(PrimarySession, "do_orm_execute")
+def _track_statements(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    session = orm_execute_state.session
+    table = mapper.local_table.name
+    if table == User.__tablename__ and orm_execute_state.is_delete:
+        # 注销账户：该用户的版本行随之删除，不再递增
+        session.info["version_skip"] = True
+        return
+    resources = TABLE_RESOURCES.get(table)
+    if not resources:
+        return
+    params = orm_execute_state.parameters
+    if orm_execute_state.is_insert and params:
+        for row in params if isinstance(params, list) else [params]:
+            _mark(session, row.get("user_id") or session.info.get("user_id"), resources)
+    else:
+        _mark(session, session.info.get("user_id"), resources)
+
+
+@event.listens_for(PrimarySession, "before_commit")
+def _bump_versions(session):
+    # before_commit 在提交前的最后一次 flush 之前触发，先 flush 以记录尚未写入的对象
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    touched = session.info.pop("version_touched", None)
+    if not touched or session.info.pop("version_skip", False):
+        return
+    now = datetime.now()
+    rows = [
+        {"user_id": user_id, "resource": resource, "version": 1, "updated_at": now}
+        for user_id, resources in touched.items() for resource in sorted(resources)
+    ]
+    dialect = session.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql_insert(UserVersion).values(rows)
+        stmt = stmt.on_duplicate_key_update(version=UserVersion.version + 1, updated_at=stmt.inserted.updated_at)
+    elif dialect == "sqlite":
+        stmt = sqlite_insert(UserVersion).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[UserVersion.user_id, UserVersion.resource],
+            set_={"version": UserVersion.version + 1, "updated_at": stmt.excluded.updated_at}
+        )
+    else:
+        raise RuntimeError(f"不支持的数据库类型: {dialect}")
+    # 提交前在同一事务内执行（异步会话中事件处理函数运行于 greenlet，可直接使用同步接口）
+    session.execute(stmt)
+
+
+@event.listens_for(PrimarySession, "after_rollback")
+def _clear_version_tracking(session):
+    session.info.pop("version_touched", None)
+    session.info.pop("version_skip", None)
@@ -0,0 +1,134 @@
+"""
+浇水提醒的重复规则
+
+浇水提醒不再每次浇水都插入一行 Reminder，而是由 MyPlant 上的规则描述：
+以 last_watered 为锚点、每 watering_frequency 天一次，下一次发生时间即 next_watering_date。
+查询提醒时按规则惰性展开出"虚拟提醒"，只有用户对某次发生做过操作（标记已读、完成、删除）
+才写入一行覆盖记录（is_watering_override = TRUE、plant_id 指向植物、scheduled_date 为该次发生时间）。
+
+  - 虚拟提醒的 ID 为植物ID取负（-plant_id），对其 PUT/DELETE 时写入覆盖记录
+  - 浇水只更新植物的 last_watered / next_watering_date；旧发生时间的覆盖记录自然失效，不再显示
+  - 覆盖记录由 is_watering_override 标记，普通提醒查询需用 exclude_watering_overrides() 排除；
+    用户通过 POST /reminders 手动创建的浇水提醒即使关联了植物也是普通提醒
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import select, and_, or_, not_, insert
+
+from models import MyPlant, Reminder
+
+WATERING = "watering"
+
+# 覆盖记录（旧版按次插入的浇水提醒行由迁移脚本一并标记）
+WATERING_OVERRIDE = Reminder.is_watering_override == True
+
+
+def exclude_watering_overrides():
+    """普通提醒查询的条件：排除由重复规则展开的浇水提醒"""
+    return not_(WATERING_OVERRIDE)
+
+
+def live_rows():
+    """排除已失效的覆盖记录（针对旧发生时间，或植物已取消浇水规则），用于批量更新提醒行"""
+    current = select(MyPlant.next_watering_date).where(MyPlant.id == Reminder.plant_id).scalar_subquery()
+    return not_(and_(WATERING_OVERRIDE, or_(current.is_(None), Reminder.scheduled_date < current)))
+
+
+def occurrence_id(plant_id: int) -> int:
+    """虚拟提醒ID"""
+    return -plant_id
+
+
+def plant_id_of(reminder_id: int) -> Optional[int]:
+    """虚拟提醒ID对应的植物ID；普通提醒返回 None"""
+    return -reminder_id if reminder_id < 0 else None
+
+
+def occurrence_at(next_watering_date: date) -> datetime:
+    return datetime.combine(next_watering_date, datetime.min.time())
+
+
+def next_occurrence(last_watered: Optional[date], watering_frequency: Optional[int]) -> Optional[date]:
+    if not (last_watered and watering_frequency):
+        return None
+    return last_watered + timedelta(days=watering_frequency)
+
+
+def reminder_texts(plant_name: str, watering_frequency: int) -> dict:
+    return {
+        "title": f"浇水提醒: {plant_name}",
+        "message": f"该给 {plant_name} 浇水了！",
+        "reminder_reason": f"根据{watering_frequency}天的浇水周期，需要定期补充水分以保持土壤湿度。",
+    }
+
+
+# 展开规则所需的植物列
+PLANT_COLUMNS = (
+    MyPlant.id, MyPlant.user_id, MyPlant.plant_name, MyPlant.nickname,
+    MyPlant.watering_frequency, MyPlant.next_watering_date, MyPlant.updated_at,
+)
+
+
+def virtual_reminder(plant) -> dict:
+    """按植物的浇水规则生成当前一次发生的虚拟提醒"""
+    return {
+        "id": occurrence_id(plant.id),
+        "user_id": plant.user_id,
+        "plant_id": plant.id,
+        "reminder_type": WATERING,
+        **reminder_texts(plant.nickname or plant.plant_name, plant.watering_frequency),
+        "scheduled_date": occurrence_at(plant.next_watering_date),
+        "is_completed": False,
+        "is_read": False,
+        "created_at": plant.updated_at,
+    }
+
+
+def scheduled_plants_query(*conditions):
+    """设置了浇水规则的植物"""
+    return select(*PLANT_COLUMNS).where(
+        MyPlant.watering_frequency.isnot(None),
+        MyPlant.next_watering_date.isnot(None),
+        *conditions
+    )
+
+
+async def load_watering_reminders(db, *plant_conditions) -> list:
+    """
+    展开植物浇水规则：每株植物返回当前一次发生的提醒字典，有覆盖记录时使用覆盖记录。
+    plant_conditions 用于筛选植物（如 MyPlant.user_id == x）。
+    """
+    plants = (await db.execute(scheduled_plants_query(*plant_conditions))).all()
+    if not plants:
+        return []
+    # 覆盖记录只可能针对当前或更早的发生时间；按日期下限过滤掉已失效的旧记录
+    result = await db.execute(
+        select(*Reminder.__table__.columns).join(MyPlant, MyPlant.id == Reminder.plant_id).where(
+            WATERING_OVERRIDE,
+            Reminder.scheduled_date >= MyPlant.next_watering_date,
+            MyPlant.watering_frequency.isnot(None),
+            *plant_conditions
+        )
+    )
+    overrides = {(row["plant_id"], row["scheduled_date"]): dict(row) for row in result.mappings()}
+    reminders = []
+    for plant in plants:
+        override = overrides.get((plant.id, occurrence_at(plant.next_watering_date)))
+        reminders.append(override if override is not None else virtual_reminder(plant))
+    return reminders
+
+
+async def materialize_overrides(db, plant_conditions: list, values: dict) -> int:
+    """
+    为尚无覆盖记录的当前发生时间写入覆盖记录（一条多行 INSERT），返回写入的行数。
+    values 为覆盖记录的状态字段（is_read / is_completed）。
+    """
+    rows = [
+        {**{k: v for k, v in reminder.items() if k not in ("id", "created_at")}, "is_watering_override": True, **values}
+        for reminder in await load_watering_reminders(db, *plant_conditions)
+        if reminder["id"] < 0
+    ]
+    if rows:
+        await db.execute(insert(Reminder), rows)
+    return len(rows)
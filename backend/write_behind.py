@@ -0,0 +1,291 @@
+"""
+诊断历史与自动提醒的 write-behind 持久化队列
+
+/predict 在模型返回后不再同步写入 DiagnosisHistory / Reminder，而是：
+  1. 通过 IdBlockAllocator 预分配诊断历史 ID（按块向 id_sequences 表申请，多进程安全）
+  2. 将待写入的行放入进程内队列后立即返回响应
+  3. 后台任务把多个请求的写入合并为少量多行 INSERT 事务
+  4. 写入失败的批次落盘到 spool 目录，后台定期重试，直到成功
+
+同一批次内的诊断历史与提醒在同一事务中提交，重试时以诊断历史 ID 是否已存在判断该项
+是否已写入，保证重放幂等。批量写入失败时逐项重写，只有仍然失败的项才会落盘；因数据本身
+无效（约束冲突、字段超长等）而失败的项移入 spool/dead 目录等待人工处理，不再阻塞其他用户的写入。
+进程崩溃时尚未刷盘的队列内容（最多一个刷新间隔）会丢失。
+"""
+import asyncio
+import json
+import os
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy import insert, select, func
+from sqlalchemy.exc import IntegrityError, DataError
+
+from database import AsyncSessionLocal, mark_user_write
+from models import User, DiagnosisHistory, DiagnosisHistoryArchive, Reminder, IdSequence
+
+# 队列配置
+WRITE_BEHIND_BATCH_SIZE = int(os.getenv("WRITE_BEHIND_BATCH_SIZE", "200"))  # 单个事务最多写入的项数
+WRITE_BEHIND_FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.05"))  # 攒批等待时间（秒）
+WRITE_BEHIND_RETRY_INTERVAL = float(os.getenv("WRITE_BEHIND_RETRY_INTERVAL", "5"))  # 失败批次重试间隔（秒）
+WRITE_BEHIND_WAIT_TIMEOUT = float(os.getenv("WRITE_BEHIND_WAIT_TIMEOUT", "2"))  # 读请求等待本用户待写入项的最长时间
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "100"))  # 每次预分配的ID数量
+
+SPOOL_DIR = Path(os.getenv("WRITE_BEHIND_SPOOL_DIR", str(Path(__file__).parent / "spool")))  # 落盘目录（容器中挂载为卷）
+DEAD_LETTER_DIRNAME = "dead"  # 无法写入的项（位于 spool 目录下）
+
+# 数据本身无效导致的错误，重试也不会成功
+PERMANENT_ERRORS = (IntegrityError, DataError)
+
+# 需要在落盘/重放时转换的日期时间字段
+DATETIME_FIELDS = ("created_at", "scheduled_date")
+
+
+class IdBlockAllocator:
+    """按块预分配主键（hi/lo），每 block_size 个 ID 只需一次数据库往返"""
+
+    def __init__(self, name: str, model, block_size: int = ID_BLOCK_SIZE, archive_model=None):
+        self.name = name
+        self.model = model
+        self.archive_model = archive_model  # 保留原ID的归档表，初始化序列时一并考虑
+        self.block_size = block_size
+        self._next = 0
+        self._limit = 0
+        self._lock = asyncio.Lock()
+
+    async def next_id(self) -> int:
+        async with self._lock:
+            if self._next >= self._limit:
+                self._next = await self._reserve_block()
+                self._limit = self._next + self.block_size
+            value = self._next
+            self._next += 1
+            return value
+
+    async def _reserve_block(self) -> int:
+        for _ in range(3):
+            async with AsyncSessionLocal() as db:
+                try:
+                    result = await db.execute(
+                        select(IdSequence).where(IdSequence.name == self.name).with_for_update()
+                    )
+                    sequence = result.scalars().first()
+                    if sequence is None:
+                        # 首次使用：从热表与归档表中现有最大ID之后开始分配
+                        max_id = (await db.execute(select(func.max(self.model.id)))).scalar() or 0
+                        if self.archive_model is not None:
+                            archived_max = (await db.execute(select(func.max(self.archive_model.id)))).scalar() or 0
+                            max_id = max(max_id, archived_max)
+                        sequence = IdSequence(name=self.name, next_value=max_id + 1)
+                        db.add(sequence)
+                    start = sequence.next_value
+                    sequence.next_value = start + self.block_size
+                    await db.commit()
+                    return start
+                except IntegrityError:
+                    # 其他进程同时初始化了该序列，重试
+                    await db.rollback()
+        raise RuntimeError(f"无法为 {self.name} 分配ID")
+
+
+def _serialize_item(item: dict) -> dict:
+    def convert(row):
+        if row is None:
+            return None
+        return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+    return {"user_id": item["user_id"], "history": convert(item["history"]), "reminder": convert(item["reminder"])}
+
+
+def _deserialize_item(item: dict) -> dict:
+    def convert(row):
+        if row is None:
+            return None
+        return {
+            k: datetime.fromisoformat(v) if k in DATETIME_FIELDS and isinstance(v, str) else v
+            for k, v in row.items()
+        }
+    return {"user_id": item["user_id"], "history": convert(item["history"]), "reminder": convert(item["reminder"])}
+
+
+class WriteBehindQueue:
+    """进程内 write-behind 队列：合并多个请求的插入为多行事务"""
+
+    def __init__(
+        self,
+        batch_size: int = WRITE_BEHIND_BATCH_SIZE,
+        flush_interval: float = WRITE_BEHIND_FLUSH_INTERVAL,
+        retry_interval: float = WRITE_BEHIND_RETRY_INTERVAL,
+        spool_dir: Path = SPOOL_DIR,
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_interval = retry_interval
+        self.spool_dir = spool_dir
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending = {}  # user_id -> 未完成写入的 future 集合
+        self._tasks = []
+        self._collecting = []  # 已出队、正在攒批等待写入的项
+        self._flushing: Optional[asyncio.Future] = None  # 正在进行的批量写入
+
+    async def start(self):
+        (self.spool_dir / DEAD_LETTER_DIRNAME).mkdir(parents=True, exist_ok=True)
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run()),
+            asyncio.create_task(self._retry_spooled()),
+        ]
+
+    async def stop(self):
+        """停止后台任务并把队列中剩余的项写入数据库（失败则落盘）"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # 等待进行中的批量写入完成（写入受 shield 保护，不随任务取消而中断）
+        if self._flushing is not None:
+            await asyncio.gather(self._flushing, return_exceptions=True)
+            self._flushing = None
+        if self._queue is not None:
+            # 攒批中已出队但尚未写入的项同样需要写出
+            batch, self._collecting = self._collecting, []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            if batch:
+                await self._flush(batch)
+
+    def enqueue(self, user_id: int, history: dict, reminder: Optional[dict] = None):
+        """加入一条诊断历史（及可选的自动提醒）待写入项，立即返回"""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault(user_id, set()).add(future)
+        self._queue.put_nowait({"user_id": user_id, "history": history, "reminder": reminder, "future": future})
+        # 待写入期间该用户的读请求应走主库
+        mark_user_write(user_id)
+
+    def has_pending(self, user_id: int) -> bool:
+        return bool(self._pending.get(user_id))
+
+    async def wait_for_user(self, user_id: int, timeout: float = WRITE_BEHIND_WAIT_TIMEOUT):
+        """等待该用户已入队的写入完成（读己之写），无待写入项时立即返回"""
+        futures = self._pending.get(user_id)
+        if futures:
+            await asyncio.wait(list(futures), timeout=timeout)
+
+    async def _run(self):
+        while True:
+            self._collecting.append(await self._queue.get())
+            # 等待一个刷新间隔以便合并更多请求的写入
+            await asyncio.sleep(self.flush_interval)
+            while len(self._collecting) < self.batch_size and not self._queue.empty():
+                self._collecting.append(self._queue.get_nowait())
+            batch, self._collecting = self._collecting, []
+            self._flushing = asyncio.ensure_future(self._flush(batch))
+            await asyncio.shield(self._flushing)
+            self._flushing = None
+
+    async def _flush(self, batch: list):
+        items = [{k: item[k] for k in ("user_id", "history", "reminder")} for item in batch]
+        try:
+            retry = await self._write_resilient(items)
+            if retry:
+                print(f"write-behind 写入失败，{len(retry)} 项已落盘待重试")
+                self._spool(retry)
+        except Exception as e:
+            print(f"write-behind 批量写入失败，已落盘待重试: {e}")
+            self._spool(items)
+        finally:
+            for item in batch:
+                futures = self._pending.get(item["user_id"])
+                if futures is not None:
+                    futures.discard(item["future"])
+                    if not futures:
+                        self._pending.pop(item["user_id"], None)
+                if not item["future"].done():
+                    item["future"].set_result(None)
+                mark_user_write(item["user_id"])
+
+    async def _write(self, items: list):
+        """在一个事务中写入一批诊断历史与提醒（多行 INSERT）"""
+        async with AsyncSessionLocal() as db:
+            histories = [item["history"] for item in items]
+            reminders = [item["reminder"] for item in items if item["reminder"] is not None]
+            if histories:
+                await db.execute(insert(DiagnosisHistory), histories)
+            if reminders:
+                await db.execute(insert(Reminder), reminders)
+            await db.commit()
+
+    async def _write_resilient(self, items: list) -> list:
+        """先整批写入；失败时逐项写入，返回需要稍后重试的项（数据无效的项移入死信目录）"""
+        try:
+            await self._write(items)
+            return []
+        except Exception as e:
+            if len(items) == 1 and not isinstance(e, PERMANENT_ERRORS):
+                return items
+        retry, dead = [], []
+        for item in items:
+            try:
+                await self._write([item])
+            except PERMANENT_ERRORS as e:
+                dead.append({**_serialize_item(item), "error": str(e)})
+            except Exception:
+                retry.append(item)
+        if dead:
+            print(f"write-behind 有 {len(dead)} 项数据无效，已移入死信目录")
+            self._dump(self.spool_dir / DEAD_LETTER_DIRNAME, dead)
+        return retry
+
+    def _spool(self, items: list, path: Optional[Path] = None):
+        self._dump(self.spool_dir, [_serialize_item(item) for item in items], path)
+
+    def _dump(self, directory: Path, rows: list, path: Optional[Path] = None):
+        directory.mkdir(parents=True, exist_ok=True)
+        path = path or directory / f"{time.time_ns()}-{uuid.uuid4().hex[:8]}.json"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(rows, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    async def _retry_spooled(self):
+        while True:
+            await self.replay_spooled()
+            await asyncio.sleep(self.retry_interval)
+
+    async def replay_spooled(self):
+        """重放落盘的失败批次；已写入的项（诊断历史ID已存在）及已注销用户的项会被跳过。
+        单个文件重放失败不影响后续文件。"""
+        for path in sorted(self.spool_dir.glob("*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    items = [_deserialize_item(item) for item in json.load(f)]
+                ids = [item["history"]["id"] for item in items]
+                user_ids = {item["user_id"] for item in items}
+                async with AsyncSessionLocal() as db:
+                    result = await db.execute(select(DiagnosisHistory.id).where(DiagnosisHistory.id.in_(ids)))
+                    existing = set(result.scalars().all())
+                    result = await db.execute(select(User.id).where(User.id.in_(user_ids)))
+                    live_users = set(result.scalars().all())
+                remaining = [
+                    item for item in items
+                    if item["history"]["id"] not in existing and item["user_id"] in live_users
+                ]
+                retry = await self._write_resilient(remaining) if remaining else []
+                if retry:
+                    # 仅保留仍需重试的项
+                    self._spool(retry, path)
+                else:
+                    path.unlink()
+                for item in remaining:
+                    mark_user_write(item["user_id"])
+            except Exception as e:
+                print(f"write-behind 重放 {path.name} 失败，稍后重试: {e}")
+                continue
+
+
+diagnosis_history_ids = IdBlockAllocator("diagnosis_histories", DiagnosisHistory, archive_model=DiagnosisHistoryArchive)
+write_behind_queue = WriteBehindQueue()
@@ -15,6 +15,33 @@ const CNY_TO_WEI_RATE = 1000000000000000; // 1 CNY ≈ 0.001 ETH (简化测试
 const CNY_TO_CKB_SHANNONS_RATE = 100000000; // 1 CNY ≈ 1 CKB in shannons (简化测试汇率)
 const MIN_CKB_CAPACITY = 6100000000n; // 最小 CKB 容量: 61 CKB (in shannons)
 
+// 列表和详情页使用服务端生成的缩略图（/thumbs/<宽度>/<图片键>），不加载原图
+const thumbUrl = (imageUrl, width) => (
+  imageUrl && imageUrl.startsWith('/images/')
+    ? `${BASE_URL}/thumbs/${width}/${imageUrl.slice('/images/'.length)}`
+    : `${BASE_URL}${imageUrl}`
+);
+
+// 有副作用的请求（检测、下单、开通会员）超时或网络错误时自动重试，
+// 所有重试使用同一个 Idempotency-Key，服务端只执行一次并返回首次的结果
+const IDEMPOTENT_RETRIES = 2;
+
+const postIdempotent = async (url, data, config = {}) => {
+  const key = crypto.randomUUID();
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await axios.post(url, data, {
+        ...config,
+        headers: { ...config.headers, 'Idempotency-Key': key }
+      });
+    } catch (error) {
+      // 只重试没有收到响应的请求（超时、网络中断）
+      if (error.response || attempt >= IDEMPOTENT_RETRIES) throw error;
+      await new Promise(resolve => setTimeout(resolve, 1000 * (attempt + 1)));
+    }
+  }
+};
+
 function App() {
   // CCC hooks for wallet connection
   const { open: openConnector, disconnect, client, wallet, signerInfo } = ccc.useCcc();
@@ -79,6 +106,11 @@ function App() {
   const captureFileInputRef = useRef(null);
   const galleryInputRef = useRef(null); // For gallery selection in capture page
 
+  // 服务端推送：连接建立并收到未读数量后，不再在每次操作后轮询未读数量
+  const pushActiveRef = useRef(false);
+  const showRemindersPageRef = useRef(false);
+  const showHistoryPageRef = useRef(false);
+
   // 同步CCC钱包连接状态
   useEffect(() => {
     const syncWalletStatus = async () => {
@@ -109,13 +141,44 @@ function App() {
     }
   }, []);
 
-  // 当用户在"我的"页面时，刷新未读提醒数量
+  // 当用户在"我的"页面时，刷新未读提醒数量（推送连接正常时由推送更新）
   useEffect(() => {
-    if (isAuthenticated && currentPage === 'profile') {
+    if (isAuthenticated && currentPage === 'profile' && !pushActiveRef.current) {
       fetchUnreadRemindersCount();
     }
   }, [isAuthenticated, currentPage]);
 
+  useEffect(() => {
+    showRemindersPageRef.current = showRemindersPage;
+    showHistoryPageRef.current = showHistoryPage;
+  }, [showRemindersPage, showHistoryPage]);
+
+  // 订阅服务端推送（未读数量变化、提醒到期、诊断完成），断线后 EventSource 自动重连
+  useEffect(() => {
+    const token = localStorage.getItem('token');
+    if (!isAuthenticated || !token || typeof EventSource === 'undefined') return;
+
+    const source = new EventSource(`${BASE_URL}/events?access_token=${encodeURIComponent(token)}`);
+    source.addEventListener('unread_count', (event) => {
+      pushActiveRef.current = true;
+      setUnreadRemindersCount(JSON.parse(event.data).unread_count);
+    });
+    source.addEventListener('reminder_due', () => {
+      if (showRemindersPageRef.current) fetchReminders();
+    });
+    source.addEventListener('diagnosis_completed', () => {
+      if (showHistoryPageRef.current) fetchDiagnosisHistory();
+    });
+    source.onerror = () => {
+      // 断线期间回退为操作后轮询
+      pushActiveRef.current = false;
+    };
+    return () => {
+      source.close();
+      pushActiveRef.current = false;
+    };
+  }, [isAuthenticated]);
+
   // 当用户进入商城页面时，获取产品列表
   useEffect(() => {
     if (currentPage === 'shop') {
@@ -123,20 +186,31 @@ function App() {
     }
   }, [currentPage]);
 
-  // 获取当前用户信息
+  // 获取当前用户信息、会员状态、未读提醒数量和商品列表（一次 /bootstrap 请求）
+  // 各部分的 ETag 与数据缓存在 localStorage，未变化的部分服务端只返回 not_modified
   const fetchCurrentUser = async (token) => {
     try {
-      const response = await axios.get(`${BASE_URL}/users/me`, {
-        headers: { 'Authorization': `Bearer ${token}` }
+      const cache = JSON.parse(localStorage.getItem('bootstrapCache') || '{}');
+      const etags = Object.values(cache).map((section) => section.etag).filter(Boolean);
+      const response = await axios.get(`${BASE_URL}/bootstrap`, {
+        headers: {
+          'Authorization': `Bearer ${token}`,
+          ...(etags.length ? { 'If-None-Match': etags.join(', ') } : {})
+        }
+      });
+      const sections = {};
+      Object.entries(response.data).forEach(([name, section]) => {
+        sections[name] = section.not_modified && cache[name] ? cache[name] : section;
       });
-      setCurrentUser(response.data);
+      localStorage.setItem('bootstrapCache', JSON.stringify(sections));
+      setCurrentUser(sections.user.data);
       setIsAuthenticated(true);
-      // 获取会员状态
-      await fetchMembershipStatus(token);
-      // 获取未读提醒数量
-      await fetchUnreadRemindersCount();
+      setMembershipStatus(sections.membership.data);
+      setUnreadRemindersCount(sections.unread_count.data.unread_count);
+      setProducts(sections.products.data);
     } catch (error) {
       localStorage.removeItem('token');
+      localStorage.removeItem('bootstrapCache');
       setIsAuthenticated(false);
     }
   };
@@ -160,7 +234,8 @@ function App() {
     if (!token) return;
     
     try {
-      const response = await axios.get(`${BASE_URL}/diagnosis-history`, {
+      // 列表只需摘要字段，大文本字段（处理建议、植物简介）不下发
+      const response = await axios.get(`${BASE_URL}/diagnosis-history?fields=plant_name,scientific_name,status,problem_judgment,created_at`, {
         headers: { 'Authorization': `Bearer ${token}` }
       });
       setDiagnosisHistory(response.data);
@@ -184,6 +259,21 @@ function App() {
     }
   };
 
+  // 获取植物详情（列表接口不包含备注等大字段）
+  const fetchPlantDetail = async (plantId) => {
+    const token = localStorage.getItem('token');
+    if (!token) return;
+    
+    try {
+      const response = await axios.get(`${BASE_URL}/my-plants/${plantId}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+      });
+      setSelectedPlant(response.data);
+    } catch (error) {
+      console.error('获取植物详情失败:', error);
+    }
+  };
+
   // 获取提醒消息
   const fetchReminders = async () => {
     const token = localStorage.getItem('token');
@@ -387,7 +477,7 @@ function App() {
         quantity: item.quantity
       }));
 
-      const response = await axios.post(`${BASE_URL}/orders`, {
+      const response = await postIdempotent(`${BASE_URL}/orders`, {
         items: orderItems,
         payment_method: selectedWalletType,
         transaction_hash: txHash,
@@ -461,6 +551,7 @@ function App() {
   // 用户登出
   const handleLogout = () => {
     localStorage.removeItem('token');
+    localStorage.removeItem('bootstrapCache');
     setIsAuthenticated(false);
     setCurrentUser(null);
     setMembershipStatus(null);
@@ -642,7 +733,7 @@ function App() {
 
       // 调用后端API确认购买
       const token = localStorage.getItem('token');
-      const response = await axios.post(`${BASE_URL}/membership/purchase`, {
+      const response = await postIdempotent(`${BASE_URL}/membership/purchase`, {
         transaction_hash: txHash,
         wallet_address: address,
         plan: selectedPlan,
@@ -698,7 +789,7 @@ function App() {
 
     setLoading(true);
     try {
-      const response = await axios.post(`${BASE_URL}/predict`, formData, {
+      const response = await postIdempotent(`${BASE_URL}/predict`, formData, {
         headers: { 
           'Content-Type': 'multipart/form-data',
           'Authorization': `Bearer ${token}`
@@ -1025,6 +1116,35 @@ function App() {
             </div>
           </div>
           
+          {/* 推荐产品（随诊断结果返回） */}
+          {result.need_product && (result.recommended_products || []).length > 0 && (
+            <div className="bg-white rounded-lg p-4 mb-4 card-shadow">
+              <h3 className="font-semibold text-dark mb-3">
+                <i className="fas fa-shopping-bag mr-2 text-primary"></i>
+                推荐产品
+              </h3>
+              {result.recommended_products.map((product) => (
+                <div key={product.id} className="flex items-center justify-between py-2 border-b last:border-b-0">
+                  <div className="flex items-center">
+                    <div className={`w-10 h-10 rounded-lg bg-gradient-to-br ${product.bg_gradient} flex items-center justify-center mr-3`}>
+                      <i className={`fas ${product.icon_class} text-white`}></i>
+                    </div>
+                    <div>
+                      <p className="text-sm font-medium text-dark">{product.name}</p>
+                      <p className="text-xs text-medium">{product.tag}</p>
+                    </div>
+                  </div>
+                  <button
+                    onClick={() => addToCart(product)}
+                    className="text-sm text-primary border border-primary px-3 py-1 rounded-lg hover:bg-primary/5"
+                  >
+                    {product.price}
+                  </button>
+                </div>
+              ))}
+            </div>
+          )}
+
           {/* 免责声明 */}
           <div className="text-xs text-medium text-center bg-white p-3 rounded-lg card-shadow mb-4">
             <p>免责声明：AI 建议仅供参考，不等同于专业医疗建议。</p>
@@ -1271,7 +1391,7 @@ function App() {
           <button onClick={() => { 
             if (isAuthenticated) { 
               fetchReminders(); 
-              fetchUnreadRemindersCount();
+              if (!pushActiveRef.current) fetchUnreadRemindersCount();
               setShowRemindersPage(true); 
             } else { 
               alert('请先登录'); 
@@ -1461,13 +1581,14 @@ function App() {
                 setSelectedPlant(plant);
                 setShowMyPlantsPage(false);
                 setShowPlantDetailPage(true);
+                fetchPlantDetail(plant.id);
               }}
               className="bg-white rounded-lg overflow-hidden card-shadow cursor-pointer"
             >
               <div className="w-full h-32 bg-gradient-to-br from-green-400 to-green-600 flex items-center justify-center">
                 {plant.image_url ? (
                   <img 
-                    src={`${BASE_URL}${plant.image_url}`} 
+                    src={thumbUrl(plant.image_url, 320)} 
                     alt={plant.plant_name}
                     className="w-full h-full object-cover"
                   />
@@ -1502,7 +1623,29 @@ function App() {
           <i className="fas fa-arrow-left"></i>
         </button>
         <h2 className="text-xl font-bold text-dark">提醒消息</h2>
-        <div className="w-8"></div>
+        {reminders.length > 0 ? (
+          <button
+            onClick={async () => {
+              const token = localStorage.getItem('token');
+              try {
+                // 一次请求完成当前列表中的全部提醒
+                await axios.post(`${BASE_URL}/reminders/bulk-complete`,
+                  { ids: reminders.map((reminder) => reminder.id) },
+                  { headers: { 'Authorization': `Bearer ${token}` } }
+                );
+                fetchReminders();
+                if (!pushActiveRef.current) fetchUnreadRemindersCount();
+              } catch (error) {
+                console.error('批量完成提醒失败:', error);
+              }
+            }}
+            className="text-green-500 text-sm p-2"
+          >
+            全部完成
+          </button>
+        ) : (
+          <div className="w-8"></div>
+        )}
       </div>
       
       {reminders.length === 0 ? (
@@ -1543,7 +1686,7 @@ function App() {
                         { headers: { 'Authorization': `Bearer ${token}` } }
                       );
                       fetchReminders();
-                      fetchUnreadRemindersCount();
+                      if (!pushActiveRef.current) fetchUnreadRemindersCount();
                     } catch (error) {
                       console.error('标记提醒失败:', error);
                     }
@@ -1582,7 +1725,7 @@ function App() {
           <div className="w-full h-48 bg-gradient-to-br from-green-400 to-green-600 flex items-center justify-center rounded-lg mb-4 overflow-hidden">
             {selectedPlant.image_url ? (
               <img 
-                src={`${BASE_URL}${selectedPlant.image_url}`} 
+                src={thumbUrl(selectedPlant.image_url, 640)} 
                 alt={selectedPlant.plant_name}
                 className="w-full h-full object-cover"
               />